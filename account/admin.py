@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User, Group
 
-from .models import Profile
+from .models import Profile, OutgoingEmail
 
 
 # Profile Admin
@@ -10,6 +10,7 @@ from .models import Profile
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'role', 'verified_status')
+    list_select_related = ('user',)
     list_filter = ('role', 'is_verified')
     search_fields = ('user__username',)
 
@@ -43,6 +44,17 @@ class ProfileAdmin(admin.ModelAdmin):
 
 
 
+# Outgoing Email Admin
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipients', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('recipients', 'subject')
+    readonly_fields = ('last_error',)
+
+
+
 # Profile Inline in User Admin
 
 class ProfileInline(admin.StackedInline):
@@ -60,6 +72,8 @@ class ProfileInline(admin.StackedInline):
 class CustomUserAdmin(UserAdmin):
     inlines = (ProfileInline,)
     list_display = ('username', 'email', 'first_name', 'last_name', 'user_role', 'provider_verified')
+    # user_role and provider_verified read the profile of every row
+    list_select_related = ('profile',)
 
     def user_role(self, obj):
         if hasattr(obj, 'profile'):
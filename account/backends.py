@@ -1,12 +1,55 @@
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+# ==============================
+# SESSION USER LOADING
+# ==============================
+# The session user is loaded together with its profile in one joined
+# query, so request.user.profile costs nothing more. AuthenticationMiddleware
+# memoizes request.user for the rest of the request. With
+# AUTH_USER_CACHE_TIMEOUT set, the pair is also cached across requests;
+# signals forget the entry whenever the user or profile is saved.
+#
+# Signals only reach the cache of the process that saved the change. With
+# a per-process cache (the default LocMemCache), another worker keeps
+# using a deactivated user or an old password hash until its entry
+# expires, so the timeout must stay short unless CACHES['default'] is
+# shared by every worker.
+
+def _cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def _cache_timeout():
+    return getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 0)
+
+
+def load_user(user_id):
+    """User with its profile preloaded, or None."""
+    timeout = _cache_timeout()
+    if timeout:
+        user = cache.get(_cache_key(user_id))
+        if user is not None:
+            return user
+
+    user = User.objects.select_related("profile").filter(pk=user_id).first()
+    if user is not None and timeout:
+        cache.set(_cache_key(user_id), user, timeout)
+    return user
+
+
+def forget_user(user_id):
+    cache.delete(_cache_key(user_id))
 
 
 class EmailBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
         try:
             # Use username field instead of email to avoid MultipleObjectsReturned
-            user = User.objects.get(username=username)
+            user = User.objects.select_related("profile").get(username=username)
         except User.DoesNotExist:
             return None
         except User.MultipleObjectsReturned:
@@ -16,3 +59,9 @@ class EmailBackend(ModelBackend):
         if user.check_password(password):
             return user
         return None
+
+    def get_user(self, user_id):
+        user = load_user(user_id)
+        if user is not None and self.user_can_authenticate(user):
+            return user
+        return None
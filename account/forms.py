@@ -1,5 +1,4 @@
 from django import forms
-from django.contrib.auth.models import User
 from django.core.validators import RegexValidator, EmailValidator
 from django.core.exceptions import ValidationError
 import re
@@ -60,20 +59,14 @@ class CustomerRegistrationForm(forms.Form):
     )
     
     def clean_email(self):
-        """Validate email uniqueness and format"""
+        """Normalize email"""
         email = self.cleaned_data.get('email')
         
         if email:
             # Convert to lowercase for consistency
             email = email.lower().strip()
-            
-            # Check if email already exists
-            if User.objects.filter(username=email).exists():
-                raise ValidationError(
-                    "🔴 This email is already registered. Please use a different email or try logging in.",
-                    code='email_exists'
-                )
-            
+
+        # Uniqueness is enforced when the account is created
         return email
     
     # Phone validation temporarily disabled until migration is run
@@ -208,18 +201,13 @@ class ProviderRegistrationForm(forms.Form):
     )
     
     def clean_email(self):
-        """Validate email uniqueness and format"""
+        """Normalize email"""
         email = self.cleaned_data.get('email')
         
         if email:
             email = email.lower().strip()
-            
-            if User.objects.filter(username=email).exists():
-                raise ValidationError(
-                    "🔴 This email is already registered. Please use a different email or try logging in.",
-                    code='email_exists'
-                )
-        
+
+        # Uniqueness is enforced when the account is created
         return email
     
     # Phone validation temporarily disabled until migration is run
@@ -0,0 +1,192 @@
+"""
+Geohash based spatial index for provider locations.
+
+Every profile with coordinates stores its geohash. A "within R km"
+lookup picks the geohash precision whose cells roughly match the search
+box, reads only the profiles whose geohash starts with one of the
+covering cells (index range scans), then ranks those candidates by
+great-circle distance.
+"""
+import math
+
+from django.db.models import Q
+
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+DEFAULT_RADIUS_KM = 10.0
+MAX_RADIUS_KM = 200.0
+
+# Upper bound on the number of covering cells (prefix range scans) per lookup
+MAX_COVER_CELLS = 16
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash of a point, or "" when the coordinates are missing or invalid."""
+    try:
+        latitude = float(latitude)
+        longitude = float(longitude)
+    except (TypeError, ValueError):
+        return ""
+    if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+        return ""
+
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """(height, width) of a geohash cell in degrees."""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(min_lat, max_lat, min_lng, max_lng) around a point; longitudes may wrap."""
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    lng_delta = min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+    return (
+        max(latitude - lat_delta, -90.0),
+        min(latitude + lat_delta, 90.0),
+        longitude - lng_delta,
+        longitude + lng_delta,
+    )
+
+
+def _wrap_longitude(longitude):
+    return (longitude + 180.0) % 360.0 - 180.0
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """Smallest set of geohash prefixes (at one precision) covering the search box."""
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.floor(max_lat / height) - math.floor(min_lat / height) + 1
+        cols = math.floor(max_lng / width) - math.floor(min_lng / width) + 1
+        if rows * cols <= MAX_COVER_CELLS:
+            break
+
+    cells = set()
+    lat = math.floor(min_lat / height) * height
+    while lat <= max_lat:
+        lng = math.floor(min_lng / width) * width
+        while lng <= max_lng:
+            cells.add(encode(
+                min(lat + height / 2, 90.0),
+                _wrap_longitude(lng + width / 2),
+                precision,
+            ))
+            lng += width
+        lat += height
+    cells.discard("")
+    return sorted(cells)
+
+
+def parse_near(near, radius=None):
+    """
+    Parse the `near=lat,lng` and `radius=` query parameters.
+    Returns (lat, lng, radius_km), or None when `near` is missing or invalid.
+    """
+    if not near:
+        return None
+    try:
+        latitude, longitude = (float(part) for part in near.split(","))
+    except ValueError:
+        return None
+    if not encode(latitude, longitude):
+        return None
+
+    try:
+        radius_km = float(radius) if radius else DEFAULT_RADIUS_KM
+    except ValueError:
+        radius_km = DEFAULT_RADIUS_KM
+    if not math.isfinite(radius_km) or radius_km <= 0:
+        radius_km = DEFAULT_RADIUS_KM
+    return latitude, longitude, min(radius_km, MAX_RADIUS_KM)
+
+
+def providers_near(latitude, longitude, radius_km, queryset=None):
+    """
+    Return [(profile_id, distance_km), ...] for verified providers within
+    radius_km of the point, nearest first.
+    """
+    from .models import Profile
+
+    if queryset is None:
+        queryset = Profile.objects.all()
+
+    cells = covering_cells(latitude, longitude, radius_km)
+    if not cells:
+        return []
+
+    in_cells = Q()
+    for cell in cells:
+        # "~" sorts after every geohash character
+        in_cells |= Q(geohash__gte=cell, geohash__lt=cell + "~")
+
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    candidates = queryset.filter(
+        in_cells,
+        role="provider",
+        is_verified=True,
+        latitude__range=(min_lat, max_lat),
+    )
+    if -180.0 <= min_lng and max_lng <= 180.0:
+        candidates = candidates.filter(longitude__range=(min_lng, max_lng))
+
+    nearby = []
+    for profile_id, lat, lng in candidates.values_list("id", "latitude", "longitude"):
+        distance = haversine_km(latitude, longitude, lat, lng)
+        if distance <= radius_km:
+            nearby.append((profile_id, distance))
+
+    nearby.sort(key=lambda item: (item[1], item[0]))
+    return nearby
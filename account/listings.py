@@ -0,0 +1,66 @@
+"""
+Maintenance of the CategoryListing read model.
+
+A provider is listed under each of its categories while it is verified;
+every listing row copies the display fields shown on the category page.
+"""
+from django.db import transaction
+
+from .models import CategoryListing, Profile
+
+
+LISTING_FIELDS = ['first_name', 'email', 'location']
+
+
+def build_listings(profile, categories):
+    return [
+        CategoryListing(
+            category=category,
+            provider=profile,
+            first_name=profile.user.first_name,
+            email=profile.user.email,
+            location=profile.location,
+        )
+        for category in categories
+    ]
+
+
+@transaction.atomic
+def sync_provider(profile):
+    """Bring the listing rows of one provider in line with its profile and categories."""
+    if profile.role != 'provider' or not profile.is_verified:
+        CategoryListing.objects.filter(provider=profile).delete()
+        return
+
+    categories = list(profile.service_categories.values_list('category', flat=True))
+    CategoryListing.objects.filter(provider=profile).exclude(category__in=categories).delete()
+    CategoryListing.objects.bulk_create(
+        build_listings(profile, categories),
+        update_conflicts=True,
+        unique_fields=['category', 'provider'],
+        update_fields=LISTING_FIELDS,
+    )
+
+
+@transaction.atomic
+def rebuild_listings(batch_size=1000):
+    """Rebuild every listing row. Returns the number of rows written."""
+    CategoryListing.objects.all().delete()
+
+    providers = Profile.objects.filter(
+        role='provider',
+        is_verified=True
+    ).select_related('user').prefetch_related('service_categories').order_by('id')
+
+    rows = []
+    written = 0
+    for profile in providers.iterator(chunk_size=batch_size):
+        categories = [pc.category for pc in profile.service_categories.all()]
+        rows.extend(build_listings(profile, categories))
+        if len(rows) >= batch_size:
+            CategoryListing.objects.bulk_create(rows)
+            written += len(rows)
+            rows = []
+
+    CategoryListing.objects.bulk_create(rows)
+    return written + len(rows)
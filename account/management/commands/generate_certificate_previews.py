@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from account.models import ProviderCertificate
+from account.previews import preview_name, render_preview
+
+
+class Command(BaseCommand):
+    help = "Render missing reviewer previews for all provider certificates"
+
+    def handle(self, *args, **options):
+        rendered = skipped = 0
+        for certificate in ProviderCertificate.objects.iterator():
+            field = certificate.certificate
+            try:
+                if render_preview(field.path, field.storage.path(preview_name(field.name))):
+                    rendered += 1
+                else:
+                    skipped += 1
+                    self.stderr.write(f"{field.name}: PDF previews need PyMuPDF")
+            except Exception as e:
+                skipped += 1
+                self.stderr.write(f"{field.name}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(f"{rendered} previews ready, {skipped} skipped."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from account.sessions import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired sessions in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Sessions deleted per transaction",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.05,
+            help="Seconds to wait between batches, letting other writers in",
+        )
+
+    def handle(self, *args, **options):
+        deleted = purge_expired(batch_size=options["batch_size"], pause=options["pause"])
+        self.stdout.write(f"Deleted {deleted} expired session(s).")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from account import listings
+
+
+class Command(BaseCommand):
+    help = "Rebuild the category → provider listings from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of listing rows written per INSERT",
+        )
+
+    def handle(self, *args, **options):
+        written = listings.rebuild_listings(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} category listings."))
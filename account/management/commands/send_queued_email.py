@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from account import outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbox email (once, or continuously with --loop)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Maximum messages sent per connection",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running and poll the outbox",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="Seconds to wait between polls when the outbox is empty",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            outbox.requeue_stale()
+            try:
+                sent, failed = outbox.deliver_pending(batch_size=options["batch_size"])
+            except Exception as e:
+                # e.g. the SMTP server is unreachable: nothing was claimed
+                self.stderr.write(f"Email delivery error: {e}")
+                sent = failed = 0
+
+            if sent or failed:
+                self.stdout.write(f"Sent {sent} email(s), {failed} failed.")
+
+            if not options["loop"]:
+                break
+            if not (sent or failed):
+                time.sleep(options["interval"])
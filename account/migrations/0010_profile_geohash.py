@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:18
+
+from django.db import migrations, models
+
+
+def fill_geohash(apps, schema_editor):
+    from account import geo
+
+    Profile = apps.get_model('account', 'Profile')
+    profiles = Profile.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    for profile in profiles.iterator():
+        profile.geohash = geo.encode(profile.latitude, profile.longitude)
+        profile.save(update_fields=['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0009_alter_profile_email_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=12),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+    ]
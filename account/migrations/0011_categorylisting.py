@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_listings(apps, schema_editor):
+    ProviderCategory = apps.get_model('account', 'ProviderCategory')
+    CategoryListing = apps.get_model('account', 'CategoryListing')
+
+    memberships = ProviderCategory.objects.filter(
+        provider__role='provider',
+        provider__is_verified=True,
+    ).select_related('provider__user')
+
+    CategoryListing.objects.bulk_create([
+        CategoryListing(
+            category=pc.category,
+            provider=pc.provider,
+            first_name=pc.provider.user.first_name,
+            email=pc.provider.user.email,
+            location=pc.provider.location,
+        )
+        for pc in memberships
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0010_profile_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryListing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('painting', 'Painting'), ('plumbing', 'Plumbing'), ('electrical', 'Electrical'), ('cleaning', 'Cleaning'), ('carpentry', 'Carpentry'), ('ac_repair', 'AC Repair')], max_length=50)),
+                ('first_name', models.CharField(blank=True, max_length=150)),
+                ('email', models.EmailField(blank=True, max_length=254)),
+                ('location', models.CharField(blank=True, max_length=255, null=True)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_listings', to='account.profile')),
+            ],
+            options={
+                'unique_together': {('category', 'provider')},
+            },
+        ),
+        migrations.RunPython(fill_listings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:27
+
+import account.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0012_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='providercertificate',
+            name='certificate',
+            field=models.ImageField(storage=account.storage.ContentHashStorage(), upload_to='certificates/'),
+        ),
+    ]
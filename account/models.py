@@ -1,6 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+from . import geo
+from .storage import certificate_storage
+
 
 class Profile(models.Model):
     ROLE_CHOICES = (
@@ -54,6 +57,14 @@ class Profile(models.Model):
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
 
+    # Geohash of latitude/longitude, used for nearest-provider lookups
+    geohash = models.CharField(
+        max_length=12,
+        blank=True,
+        default="",
+        db_index=True
+    )
+
     # Admin verification (for providers)
     is_verified = models.BooleanField(default=False)
     
@@ -69,6 +80,13 @@ class Profile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def save(self, *args, **kwargs):
+        self.geohash = geo.encode(self.latitude, self.longitude)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitude", "longitude"} & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"geohash"}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.user.username
 
@@ -117,9 +135,94 @@ class ProviderCertificate(models.Model):
         related_name='certificates'
     )
 
-    certificate = models.ImageField(upload_to='certificates/')
+    # Stored under its content hash, so identical uploads share one file
+    certificate = models.ImageField(upload_to='certificates/', storage=certificate_storage)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    @property
+    def preview_url(self):
+        """URL of the reviewer preview, or None until it has been rendered."""
+        from .previews import preview_name
+
+        name = preview_name(self.certificate.name)
+        storage = self.certificate.storage
+        return storage.url(name) if storage.exists(name) else None
+
     def __str__(self):
         return f"Certificate - {self.provider.user.username}"
 
+
+
+# ==============================
+# CATEGORY LISTING MODEL
+# ==============================
+class CategoryListing(models.Model):
+    """
+    Denormalized category → provider membership for the public category
+    pages. Holds one row per category of each verified provider, with the
+    display fields the page needs, kept current by account.signals.
+    """
+    category = models.CharField(
+        max_length=50,
+        choices=ProviderCategory.CATEGORY_CHOICES
+    )
+
+    provider = models.ForeignKey(
+        Profile,
+        on_delete=models.CASCADE,
+        related_name='category_listings'
+    )
+
+    first_name = models.CharField(max_length=150, blank=True)
+    email = models.EmailField(blank=True)
+    location = models.CharField(max_length=255, null=True, blank=True)
+
+    class Meta:
+        unique_together = ('category', 'provider')
+
+    def __str__(self):
+        return f"{self.get_category_display()} - {self.first_name}"
+
+
+# ==============================
+# OUTGOING EMAIL MODEL
+# ==============================
+class OutgoingEmail(models.Model):
+    """
+    Persistent outbox. Views queue mail here and return immediately;
+    the send_queued_email command delivers it in the background.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+
+    # Comma-separated recipient addresses
+    recipients = models.TextField()
+
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(auto_now_add=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {self.recipients} ({self.status})"
@@ -0,0 +1,113 @@
+"""
+Email outbox: queue mail in the request, deliver it from a worker.
+
+deliver_pending() claims due messages, sends them over one SMTP
+connection and records the outcome. Failed sends are retried with
+exponential backoff until MAX_ATTEMPTS, then marked failed.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30
+
+
+def queue_email(subject, message, recipient_list, from_email=None):
+    """Store an email for background delivery and return the outbox row."""
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=",".join(recipient_list),
+    )
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+
+def _claim(email):
+    # Only one worker may move a message from pending to sending; the
+    # claim time is kept in next_attempt_at so stale claims can be found
+    return OutgoingEmail.objects.filter(id=email.id, status='pending').update(
+        status='sending',
+        next_attempt_at=timezone.now()
+    ) == 1
+
+
+def deliver_pending(batch_size=100, connection=None):
+    """
+    Send up to batch_size due messages over a single connection.
+    Returns (sent, failed) counts for this run.
+    """
+    due = list(OutgoingEmail.objects.filter(
+        status='pending',
+        next_attempt_at__lte=timezone.now()
+    ).order_by('next_attempt_at', 'id')[:batch_size])
+    if not due:
+        return 0, 0
+
+    connection = connection or get_connection()
+    sent = failed = 0
+
+    connection.open()
+    try:
+        for email in due:
+            if not _claim(email):
+                continue
+
+            email.attempts += 1
+            try:
+                EmailMessage(
+                    subject=email.subject,
+                    body=email.body,
+                    from_email=email.from_email,
+                    to=email.recipients.split(","),
+                    connection=connection,
+                ).send()
+            except Exception as e:
+                failed += 1
+                email.last_error = str(e)
+                if email.attempts >= MAX_ATTEMPTS:
+                    email.status = 'failed'
+                else:
+                    email.status = 'pending'
+                    email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+            else:
+                sent += 1
+                email.status = 'sent'
+                email.sent_at = timezone.now()
+                email.last_error = ''
+
+            email.save(update_fields=['status', 'attempts', 'last_error', 'next_attempt_at', 'sent_at'])
+    finally:
+        connection.close()
+
+    return sent, failed
+
+
+def requeue_stale(older_than=timedelta(minutes=10)):
+    """
+    Return messages left in 'sending' by a crashed worker to the queue.
+    The interrupted send counts as an attempt, so a message that keeps
+    crashing the worker is marked failed after MAX_ATTEMPTS. Returns the
+    number of messages requeued.
+    """
+    stale = OutgoingEmail.objects.filter(
+        status='sending',
+        next_attempt_at__lt=timezone.now() - older_than
+    )
+    error = "Worker stopped while sending"
+    stale.filter(attempts__gte=MAX_ATTEMPTS - 1).update(
+        status='failed',
+        attempts=F('attempts') + 1,
+        last_error=error,
+    )
+    return stale.update(status='pending', attempts=F('attempts') + 1, last_error=error)
@@ -0,0 +1,123 @@
+"""
+Reviewer previews for provider certificates.
+
+Each certificate gets a small JPEG preview (a thumbnail for images, the
+first page for PDFs) stored next to it under previews/. Rendering runs
+in a process pool after the upload is committed, so requests never wait
+for it. PDF previews need the optional PyMuPDF package; without it PDFs
+have no preview and each skipped one is logged as a warning.
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from PIL import Image
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+
+PREVIEW_SIZE = (400, 400)
+PREVIEW_QUALITY = 80
+
+_executor = None
+
+logger = logging.getLogger(__name__)
+
+
+def preview_name(name):
+    """Storage name of the preview for a stored certificate name."""
+    # certificates/3f/<sha>.pdf -> previews/certificates/3f/<sha>.jpg
+    return os.path.join("previews", os.path.splitext(name)[0] + ".jpg")
+
+
+def render_preview(source_path, preview_path):
+    """
+    Render one preview file. Plain paths in, no Django access, so it can
+    run in a worker process. Returns True if a preview was written.
+    """
+    if os.path.exists(preview_path):
+        return True
+
+    extension = os.path.splitext(source_path)[1].lower()
+    if extension == ".pdf":
+        if fitz is None:
+            return False
+        with fitz.open(source_path) as document:
+            pixmap = document[0].get_pixmap(dpi=72)
+            image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    else:
+        image = Image.open(source_path)
+
+    image = image.convert("RGB")
+    image.thumbnail(PREVIEW_SIZE)
+
+    os.makedirs(os.path.dirname(preview_path), exist_ok=True)
+    tmp_path = f"{preview_path}.tmp"
+    image.save(tmp_path, "JPEG", quality=PREVIEW_QUALITY, optimize=True)
+    os.replace(tmp_path, preview_path)
+    return True
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.CERTIFICATE_PREVIEW_WORKERS)
+    return _executor
+
+
+def _log_skipped(source_path):
+    logger.warning(
+        "No certificate preview for %s: PDF previews need PyMuPDF (pip install pymupdf)",
+        source_path,
+    )
+
+
+def _log_result(source_path):
+    """Done callback for a pool job: log a failed or skipped render."""
+    def callback(future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            logger.error(
+                "Could not render certificate preview for %s", source_path, exc_info=error
+            )
+        elif not future.result():
+            _log_skipped(source_path)
+    return callback
+
+
+def _jobs(certificates):
+    for certificate in certificates:
+        field = certificate.certificate
+        yield field.path, field.storage.path(preview_name(field.name))
+
+
+def schedule_previews(certificates):
+    """
+    Render previews for the given certificates once the current
+    transaction commits: in the process pool, or inline when
+    CERTIFICATE_PREVIEW_WORKERS is 0.
+    """
+    jobs = list(_jobs(certificates))
+
+    def submit():
+        if settings.CERTIFICATE_PREVIEW_WORKERS:
+            executor = _get_executor()
+            for job in jobs:
+                future = executor.submit(render_preview, *job)
+                future.add_done_callback(_log_result(job[0]))
+        else:
+            for job in jobs:
+                try:
+                    if not render_preview(*job):
+                        _log_skipped(job[0])
+                except Exception:
+                    logger.exception("Could not render certificate preview for %s", job[0])
+
+    transaction.on_commit(submit)
@@ -0,0 +1,83 @@
+"""
+Account creation for the signup views.
+
+A signup is written in one transaction: user, profile, and for
+providers their categories and certificates (one bulk insert each).
+Duplicate emails and phone numbers are caught by the unique username and
+phone constraints instead of pre-check queries, so concurrent signups for
+the same address or number cannot both succeed.
+"""
+import random
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+
+from .models import Profile, ProviderCategory, ProviderCertificate
+
+
+EMAIL_TAKEN_MESSAGE = (
+    "🔴 This email is already registered. "
+    "Please use a different email or try logging in."
+)
+
+PHONE_TAKEN_MESSAGE = (
+    "🔴 This phone number is already registered. "
+    "Please use a different number."
+)
+
+
+class EmailTaken(Exception):
+    """Raised when the email is already used as a username."""
+
+
+class PhoneTaken(Exception):
+    """Raised when the phone number already belongs to another profile."""
+
+
+def verification_code():
+    return f"{random.randint(100000, 999999)}"
+
+
+@transaction.atomic(savepoint=False)
+def create_account(full_name, email, phone, password, role, email_token,
+                   categories=(), certificates=()):
+    """
+    Create the user and profile, plus provider categories and certificate
+    rows (certificates are already stored file names). Returns
+    (profile, certificate_rows). Raises EmailTaken on a duplicate email
+    and PhoneTaken on a duplicate phone number, rolling back the whole
+    signup.
+    """
+    try:
+        user = User.objects.create_user(
+            username=email,
+            email=email,
+            password=password,
+            first_name=full_name
+        )
+    except IntegrityError:
+        raise EmailTaken(email)
+
+    try:
+        # The user is new, so phone is the only unique column that can clash
+        profile = Profile.objects.create(
+            user=user,
+            role=role,
+            is_verified=False,
+            phone=phone,
+            email_token=email_token,
+        )
+    except IntegrityError:
+        raise PhoneTaken(phone)
+
+    ProviderCategory.objects.bulk_create([
+        ProviderCategory(provider=profile, category=category, is_verified=False)
+        for category in categories
+    ])
+
+    certificate_rows = ProviderCertificate.objects.bulk_create([
+        ProviderCertificate(provider=profile, certificate=name)
+        for name in certificates
+    ])
+
+    return profile, certificate_rows
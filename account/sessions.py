@@ -0,0 +1,243 @@
+"""
+Session engine with an in-process LRU in front of the database table.
+
+Reads are answered from the LRU whenever possible. Modified sessions are
+written to the LRU immediately and to django_session by a background
+thread in batches (write-behind), so requests stop queueing on SQLite's
+writer lock for session writes. Set SESSION_WRITE_BEHIND_INTERVAL to 0
+to write through instead. Deletions (logout, and the old key on login)
+are always written at once.
+
+The LRU belongs to one process, like the InProcessBackend message
+broker. With several workers SESSION_CACHE_TTL bounds how long another
+worker trusts its cached copy of a session that was changed or deleted
+elsewhere.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.backends.db import SessionStore as DBSessionStore
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+# Marks a session deleted but not yet removed from the table
+DELETED = object()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class SessionCache:
+    """
+    LRU of session_key -> (session_data, expire_date, cached_at), plus the
+    writes not yet flushed to the table.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._wake = threading.Event()
+        self._flusher = None
+
+    def get(self, key):
+        """(session_data, expire_date), DELETED, or None on a miss."""
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[2] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[:2]
+
+    def put(self, key, data, expire_date):
+        with self._lock:
+            self._put(key, data, expire_date)
+
+    def _put(self, key, data, expire_date):
+        self._entries[key] = (data, expire_date, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def write(self, key, data, expire_date):
+        with self._lock:
+            self._put(key, data, expire_date)
+            self._pending[key] = (data, expire_date)
+        self._schedule()
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._pending[key] = DELETED
+        # A logged-out session must stop working now, not after the next batch
+        self.flush()
+
+    def _schedule(self):
+        if not _setting("SESSION_WRITE_BEHIND_INTERVAL", 1.0):
+            self.flush()
+            return
+        if len(self._pending) >= _setting("SESSION_WRITE_BATCH_SIZE", 500):
+            self._wake.set()
+        if self._flusher is None:
+            with self._lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(
+                        target=self._run, name="session-flusher", daemon=True
+                    )
+                    self._flusher.start()
+                    atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(_setting("SESSION_WRITE_BEHIND_INTERVAL", 1.0))
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Could not flush sessions")
+
+    def flush(self):
+        """Write every pending session change in one transaction."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        Session = DBSessionStore.get_model_class()
+        deleted = [key for key, entry in pending.items() if entry is DELETED]
+        rows = [
+            Session(session_key=key, session_data=entry[0], expire_date=entry[1])
+            for key, entry in pending.items()
+            if entry is not DELETED
+        ]
+        try:
+            with transaction.atomic():
+                if deleted:
+                    Session.objects.filter(session_key__in=deleted).delete()
+                Session.objects.bulk_create(
+                    rows,
+                    update_conflicts=True,
+                    unique_fields=["session_key"],
+                    update_fields=["session_data", "expire_date"],
+                )
+        except Exception:
+            # Put the batch back, unless a newer change has been queued
+            with self._lock:
+                for key, entry in pending.items():
+                    self._pending.setdefault(key, entry)
+            raise
+
+
+@lru_cache(maxsize=None)
+def get_session_cache():
+    return SessionCache(
+        size=_setting("SESSION_CACHE_SIZE", 10000),
+        ttl=_setting("SESSION_CACHE_TTL", 60),
+    )
+
+
+def purge_expired(batch_size=1000, pause=0):
+    """
+    Delete expired sessions batch_size rows at a time, each batch in its
+    own short transaction. Returns the number of sessions deleted.
+    """
+    Session = DBSessionStore.get_model_class()
+    now = timezone.now()
+    deleted = 0
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=now)
+            .values_list("session_key", flat=True)[:batch_size]
+        )
+        if not keys:
+            return deleted
+        with transaction.atomic():
+            Session.objects.filter(session_key__in=keys).delete()
+        deleted += len(keys)
+        if pause:
+            time.sleep(pause)
+
+
+class SessionStore(DBSessionStore):
+
+    @property
+    def cache(self):
+        return get_session_cache()
+
+    def load(self):
+        entry = self.cache.get(self.session_key)
+        if entry is None:
+            session = self._get_session_from_db()
+            if session is None:
+                return {}
+            entry = (session.session_data, session.expire_date)
+            self.cache.put(self.session_key, *entry)
+
+        if entry is DELETED or entry[1] <= timezone.now():
+            self._session_key = None
+            return {}
+        return self.decode(entry[0])
+
+    def exists(self, session_key):
+        entry = self.cache.get(session_key)
+        if entry is not None:
+            return entry is not DELETED
+        return super().exists(session_key)
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        # New keys were checked for uniqueness by _get_new_session_key()
+        if not must_create and not self.exists(self.session_key):
+            # Deleted meanwhile, e.g. by a logout in another tab
+            raise UpdateError
+
+        data = self._get_session(no_load=must_create)
+        self.cache.write(self.session_key, self.encode(data), self.get_expiry_date())
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self.cache.delete(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        purge_expired()
+
+    # The cache is in memory; only misses and flushes reach the database
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def aexists(self, session_key):
+        return await sync_to_async(self.exists)(session_key)
+
+    async def asave(self, must_create=False):
+        return await sync_to_async(self.save)(must_create)
+
+    async def adelete(self, session_key=None):
+        return await sync_to_async(self.delete)(session_key)
+
+    @classmethod
+    async def aclear_expired(cls):
+        await sync_to_async(purge_expired)()
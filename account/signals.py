@@ -0,0 +1,50 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Profile, ProviderCategory
+from . import listings
+from .backends import forget_user
+
+
+# Keep CategoryListing in sync with providers, their categories and names.
+# Deleting a profile removes its listing rows by cascade.
+
+@receiver(post_save, sender=Profile)
+def sync_profile_listings(sender, instance, created, **kwargs):
+    # A new unverified profile has no listing rows to remove
+    if created and not instance.is_verified:
+        return
+    listings.sync_provider(instance)
+
+
+@receiver([post_save, post_delete], sender=ProviderCategory)
+def sync_category_listings(sender, instance, **kwargs):
+    profile = Profile.objects.select_related('user').filter(id=instance.provider_id).first()
+    if profile:
+        listings.sync_provider(profile)
+
+
+@receiver(post_save, sender=User)
+def sync_user_listings(sender, instance, created, update_fields=None, **kwargs):
+    # A new user has no profile yet; logins only touch last_login,
+    # which listings do not copy
+    if created:
+        return
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    profile = Profile.objects.filter(user=instance, role='provider', is_verified=True).first()
+    if profile:
+        listings.sync_provider(profile)
+
+
+# Drop the cached session user whenever the user or its profile changes.
+
+@receiver([post_save, post_delete], sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def forget_cached_profile_user(sender, instance, **kwargs):
+    forget_user(instance.user_id)
@@ -0,0 +1,55 @@
+"""
+Content-addressed file storage for provider certificates.
+
+Uploaded files are named by the SHA-256 of their content, e.g.
+certificates/3f/3fa4...c1.pdf, so uploading the same file again reuses
+the stored copy instead of writing another one.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+
+    def content_name(self, name, content):
+        """Storage name derived from the file's content hash, keeping its extension."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        extension = os.path.splitext(name)[1].lower()
+        return self.hashed_name(os.path.dirname(name), digest.hexdigest(), extension)
+
+    def hashed_name(self, directory, sha, extension):
+        return os.path.join(directory, sha[:2], f"{sha}{extension}")
+
+    def store_file(self, temp_path, name):
+        """
+        Move an already written temporary file (on the same filesystem)
+        to `name`, or discard it if that content is already stored.
+        """
+        if self.exists(name):
+            os.remove(temp_path)
+            return name
+
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+        return name
+
+    def save(self, name, content, max_length=None):
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # Same content already stored: deduplicate
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+certificate_storage = ContentHashStorage()
@@ -1,3 +1,556 @@
-from django.test import TestCase
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import geo, listings, outbox, previews, sessions
+from .models import (
+    CategoryListing,
+    OutgoingEmail,
+    Profile,
+    ProviderCategory,
+    ProviderCertificate,
+)
+from .registration import EMAIL_TAKEN_MESSAGE, PHONE_TAKEN_MESSAGE
+from .storage import certificate_storage
+from .uploads import MAX_REQUEST_SIZE, CertificateUploadHandler, StagedUpload, store_uploads
+
+
+# ==============================
+# REGISTRATION
+# ==============================
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class RegistrationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="taken@example.com", email="taken@example.com", password="pw")
+        Profile.objects.create(user=user, role="customer", is_verified=True, phone="9800000001")
+
+    def register(self, email, phone):
+        return self.client.post(reverse("register"), {
+            "full_name": "Cara Customer",
+            "email": email,
+            "phone": phone,
+            "password": "Secret#123",
+            "confirm_password": "Secret#123",
+        })
+
+    def assert_rejected(self, response, message):
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(message, [str(m) for m in response.context["messages"]])
+        # The whole signup rolled back, verification email included
+        self.assertEqual(User.objects.count(), 1)
+        self.assertFalse(OutgoingEmail.objects.exists())
+
+    def test_register(self):
+        response = self.register("new@example.com", "9800000002")
+        self.assertRedirects(response, reverse("verify_email"))
+        self.assertEqual(Profile.objects.get(user__username="new@example.com").phone, "9800000002")
+        self.assertEqual(OutgoingEmail.objects.get().recipients, "new@example.com")
+
+    def test_duplicate_email(self):
+        self.assert_rejected(self.register("taken@example.com", "9800000002"), EMAIL_TAKEN_MESSAGE)
+
+    def test_duplicate_phone(self):
+        self.assert_rejected(self.register("new@example.com", "9800000001"), PHONE_TAKEN_MESSAGE)
+
+
+# ==============================
+# SESSION USER CACHE
+# ==============================
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class SessionUserCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="cara@example.com", password="pw")
+        Profile.objects.create(user=self.user, role="customer", is_verified=True)
+        self.client.force_login(self.user)
+
+    def assert_logged_in(self, expected):
+        response = self.client.get(reverse("profile"))
+        if expected:
+            self.assertEqual(response.status_code, 200)
+        else:
+            self.assertRedirects(response, f"{reverse('login')}?next={reverse('profile')}")
+
+    def test_deactivation_takes_effect(self):
+        self.assert_logged_in(True)
+        self.user.is_active = False
+        self.user.save()
+        self.assert_logged_in(False)
+
+    def test_password_change_takes_effect(self):
+        self.assert_logged_in(True)
+        self.user.set_password("new")
+        self.user.save()
+        self.assert_logged_in(False)
+
+    @override_settings(AUTH_USER_CACHE_TIMEOUT=1)
+    def test_change_saved_by_another_worker_expires(self):
+        self.assert_logged_in(True)
+        # update() sends no signals, like a save in another process
+        # whose forget_user() cannot reach this process's cache
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        time.sleep(1.1)
+        self.assert_logged_in(False)
+
+
+# ==============================
+# CERTIFICATE UPLOADS
+# ==============================
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    CERTIFICATE_PREVIEW_WORKERS=0,
+)
+class CertificateUploadTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+
+    def register(self, email="pat@example.com", content=PNG, filename="licence.png", **fields):
+        data = {
+            "full_name": "Pat Provider",
+            "email": email,
+            "phone": "9800000009",
+            "password": "Secret#123",
+            "confirm_password": "Secret#123",
+            "experience": "Ten years of plumbing",
+            "service_categories": ["plumbing"],
+            "certificates": SimpleUploadedFile(filename, content),
+        }
+        data.update(fields)
+        return self.client.post(reverse("provider_register"), data)
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), self.media_root)
+            for directory, _, names in os.walk(self.media_root)
+            for name in names
+        )
+
+    def assert_error(self, response, text):
+        self.assertEqual(response.status_code, 200)
+        errors = [str(m) for m in response.context["messages"]]
+        self.assertTrue(any(text in error for error in errors), errors)
+
+    def test_signup_stores_certificate(self):
+        response = self.register()
+        self.assertRedirects(response, reverse("verify_email"))
+        certificate = ProviderCertificate.objects.get()
+        self.assertEqual(self.stored_files(), [certificate.certificate.name])
+        self.assertTrue(certificate.certificate.name.endswith(".png"))
+
+    def test_rejected_signups_leave_no_files(self):
+        User.objects.create_user(username="taken@example.com", password="pw")
+        self.assert_error(self.register(email="taken@example.com"), "already registered")
+        self.assert_error(self.register(full_name=""), "Full name is required")
+        self.assert_error(self.register(service_categories=["plumbing", "painting"]), "must match")
+        self.assertEqual(self.stored_files(), [])
+        self.assertFalse(ProviderCertificate.objects.exists())
+
+    def test_wrong_file_type(self):
+        response = self.register(content=b"not really a picture", filename="licence.png")
+        self.assert_error(response, "licence.png: only")
+        self.assertEqual(self.stored_files(), [])
+
+    def test_empty_file(self):
+        self.assert_error(self.register(content=b""), "must match")
+        self.assertEqual(self.stored_files(), [])
+
+    @mock.patch("account.uploads.MAX_FILE_SIZE", 1024)
+    def test_oversized_file(self):
+        response = self.register(content=PNG + b"\x00" * 2048)
+        self.assert_error(response, "licence.png: file size must not exceed 5MB.")
+        self.assertEqual(self.stored_files(), [])
+
+    @mock.patch("account.uploads.MAX_REQUEST_SIZE", 1024)
+    def test_oversized_request(self):
+        response = self.register(content=PNG + b"\x00" * 2048)
+        self.assert_error(response, "Upload is too large.")
+        self.assertEqual(self.stored_files(), [])
+
+    def test_failed_signup_keeps_a_file_another_signup_recorded(self):
+        name = certificate_storage.hashed_name("certificates", "ab" * 32, ".png")
+        temp_path = os.path.join(self.media_root, "staged.png")
+        with open(temp_path, "wb") as f:
+            f.write(PNG)
+        upload = StagedUpload(temp_path, name, "licence.png", "image/png", len(PNG))
+        user = User.objects.create_user(username="other@example.com", password="pw")
+        profile = Profile.objects.create(user=user, role="provider", phone="9800000010")
+
+        with self.assertRaises(RuntimeError), store_uploads([upload]):
+            # A concurrent signup with the same file commits meanwhile
+            ProviderCertificate.objects.create(provider=profile, certificate=name)
+            raise RuntimeError("signup failed")
+        self.assertEqual(self.stored_files(), [name])
+
+    def test_oversized_request_body_is_not_read(self):
+        request = RequestFactory().post("/")
+        handler = CertificateUploadHandler(request)
+        body = mock.Mock()
+        post, files = handler.handle_raw_input(body, {}, MAX_REQUEST_SIZE + 1, b"boundary")
+        body.read.assert_not_called()
+        self.assertEqual((dict(post), dict(files)), ({}, {}))
+        self.assertEqual(len(request.upload_errors), 1)
+
+
+# ==============================
+# EMAIL OUTBOX
+# ==============================
+
+class FailingBackend(BaseEmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionError("SMTP is down")
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class OutboxTests(TestCase):
+
+    def queue(self):
+        return outbox.queue_email("Your code", "123456", ["cara@example.com"])
+
+    def make_due(self):
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+
+    def test_deliver_pending(self):
+        email = self.queue()
+        self.assertEqual(outbox.deliver_pending(), (1, 0))
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "Your code")
+        self.assertEqual(mail.outbox[0].to, ["cara@example.com"])
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ("sent", 1))
+        # Sent messages are not sent again
+        self.assertEqual(outbox.deliver_pending(), (0, 0))
+
+    def test_file_backend(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with override_settings(
+                EMAIL_BACKEND="django.core.mail.backends.filebased.EmailBackend",
+                EMAIL_FILE_PATH=tmp,
+            ):
+                self.queue()
+                self.assertEqual(outbox.deliver_pending(), (1, 0))
+            [name] = os.listdir(tmp)
+            with open(os.path.join(tmp, name)) as f:
+                self.assertIn("Subject: Your code", f.read())
+
+    def test_failed_sends_stop_at_max_attempts(self):
+        email = self.queue()
+        for attempt in range(1, outbox.MAX_ATTEMPTS + 1):
+            self.make_due()
+            self.assertEqual(outbox.deliver_pending(connection=FailingBackend()), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual(email.attempts, attempt)
+            self.assertEqual(email.last_error, "SMTP is down")
+
+        self.assertEqual(email.status, "failed")
+        self.make_due()
+        self.assertEqual(outbox.deliver_pending(), (0, 0))
+        self.assertEqual(mail.outbox, [])
+
+    def test_stale_claims_count_as_attempts(self):
+        crashed = self.queue()
+        crashed_again = self.queue()
+        OutgoingEmail.objects.update(status="sending", next_attempt_at=timezone.now() - timedelta(hours=1))
+        OutgoingEmail.objects.filter(pk=crashed_again.pk).update(attempts=outbox.MAX_ATTEMPTS - 1)
+
+        self.assertEqual(outbox.requeue_stale(), 1)
+
+        crashed.refresh_from_db()
+        crashed_again.refresh_from_db()
+        self.assertEqual((crashed.status, crashed.attempts), ("pending", 1))
+        self.assertEqual((crashed_again.status, crashed_again.attempts), ("failed", outbox.MAX_ATTEMPTS))
+
+
+# ==============================
+# CERTIFICATE PREVIEWS
+# ==============================
+
+class PreviewTests(TestCase):
+
+    @override_settings(CERTIFICATE_PREVIEW_WORKERS=1)
+    def test_failed_render_is_logged(self):
+        certificate = ProviderCertificate(certificate="certificates/ab/missing.png")
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with mock.patch.object(previews, "_get_executor", return_value=executor):
+                with self.assertLogs("account.previews", "ERROR") as logs:
+                    with self.captureOnCommitCallbacks(execute=True):
+                        previews.schedule_previews([certificate])
+                    executor.shutdown(wait=True)
+
+        self.assertIn("missing.png", logs.output[0])
+        self.assertIn("FileNotFoundError", logs.output[0])
+
+    def skipped_pdf(self, workers):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "certificate.pdf")
+            with open(source, "wb") as f:
+                f.write(b"%PDF-1.4")
+            certificate = mock.Mock()
+            certificate.certificate.path = source
+            certificate.certificate.name = "certificates/ab/certificate.pdf"
+            certificate.certificate.storage.path = lambda name: os.path.join(tmp, name)
+
+            with (
+                override_settings(CERTIFICATE_PREVIEW_WORKERS=workers),
+                mock.patch.object(previews, "fitz", None),
+                ThreadPoolExecutor(max_workers=1) as executor,
+                mock.patch.object(previews, "_get_executor", return_value=executor),
+                self.assertLogs("account.previews", "WARNING") as logs,
+            ):
+                with self.captureOnCommitCallbacks(execute=True):
+                    previews.schedule_previews([certificate])
+                executor.shutdown(wait=True)
+            self.assertFalse(os.path.exists(os.path.join(tmp, "previews")))
+        return logs.output
+
+    def test_pdf_without_pymupdf_is_logged(self):
+        for workers in (0, 1):
+            (output,) = self.skipped_pdf(workers)
+            self.assertIn("WARNING", output)
+            self.assertIn("certificate.pdf", output)
+            self.assertIn("PyMuPDF", output)
+
+
+# ==============================
+# NEAREST PROVIDERS
+# ==============================
+
+class GeoTests(TestCase):
+
+    def make_profile(self, name, latitude, longitude, role="provider", is_verified=True):
+        user = User.objects.create_user(username=f"{name}@example.com", password="pw")
+        return Profile.objects.create(
+            user=user, role=role, is_verified=is_verified, latitude=latitude, longitude=longitude
+        )
+
+    def test_encode(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744), "u4pruydqq")
+        self.assertEqual(geo.encode(None, 10), "")
+        self.assertEqual(geo.encode(91, 10), "")
+
+    def test_profile_stores_geohash(self):
+        profile = self.make_profile("pat", 27.7172, 85.3240)
+        self.assertEqual(profile.geohash, geo.encode(27.7172, 85.3240))
+
+        profile.latitude, profile.longitude = 27.6710, 85.4298
+        profile.save(update_fields=["latitude", "longitude"])
+        profile.refresh_from_db()
+        self.assertEqual(profile.geohash, geo.encode(27.6710, 85.4298))
+
+    def test_providers_within_radius_nearest_first(self):
+        thamel = self.make_profile("thamel", 27.7154, 85.3123)
+        patan = self.make_profile("patan", 27.6710, 85.3240)
+        self.make_profile("pokhara", 28.2096, 83.9856)
+        self.make_profile("customer", 27.7172, 85.3240, role="customer")
+        self.make_profile("unverified", 27.7172, 85.3240, is_verified=False)
+
+        nearby = geo.providers_near(27.7172, 85.3240, 10)
+        self.assertEqual([pk for pk, _ in nearby], [thamel.id, patan.id])
+        self.assertLess(nearby[0][1], 1.5)
+        self.assertLess(nearby[1][1], 10)
+
+        self.assertEqual([pk for pk, _ in geo.providers_near(27.7172, 85.3240, 2)], [thamel.id])
+
+    def test_neighbours_across_cell_boundaries(self):
+        # Either side of the equator and the prime meridian share no prefix
+        south_west = self.make_profile("sw", -0.001, -0.001)
+        north_east = self.make_profile("ne", 0.001, 0.001)
+        self.assertNotEqual(south_west.geohash[0], north_east.geohash[0])
+
+        nearby = geo.providers_near(0.0005, 0.0005, 1)
+        self.assertEqual([pk for pk, _ in nearby], [north_east.id, south_west.id])
+
+    def test_parse_near(self):
+        self.assertEqual(geo.parse_near("27.7,85.3", "5"), (27.7, 85.3, 5.0))
+        self.assertEqual(geo.parse_near("27.7,85.3"), (27.7, 85.3, geo.DEFAULT_RADIUS_KM))
+        self.assertEqual(geo.parse_near("27.7,85.3", "99999")[2], geo.MAX_RADIUS_KM)
+        self.assertEqual(geo.parse_near("27.7,85.3", "-1")[2], geo.DEFAULT_RADIUS_KM)
+        self.assertIsNone(geo.parse_near("nowhere"))
+        self.assertIsNone(geo.parse_near("95,85.3"))
+
+
+# ==============================
+# CATEGORY LISTINGS
+# ==============================
+
+class CategoryListingTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="pat@example.com", email="pat@example.com", password="pw", first_name="Pat"
+        )
+        self.provider = Profile.objects.create(user=self.user, role="provider", location="Kathmandu")
+        ProviderCategory.objects.create(provider=self.provider, category="plumbing")
+
+    def listed(self):
+        return sorted(
+            CategoryListing.objects.filter(provider=self.provider).values_list("category", flat=True)
+        )
+
+    def verify(self, is_verified=True):
+        self.provider.is_verified = is_verified
+        self.provider.save()
+
+    def test_only_verified_providers_are_listed(self):
+        self.assertEqual(self.listed(), [])
+        self.verify()
+        self.assertEqual(self.listed(), ["plumbing"])
+        self.verify(False)
+        self.assertEqual(self.listed(), [])
+
+    def test_listings_follow_categories(self):
+        self.verify()
+        electrical = ProviderCategory.objects.create(provider=self.provider, category="electrical")
+        self.assertEqual(self.listed(), ["electrical", "plumbing"])
+        electrical.delete()
+        self.assertEqual(self.listed(), ["plumbing"])
+
+    def test_listings_copy_display_fields(self):
+        self.verify()
+        self.user.first_name = "Patricia"
+        self.user.save()
+        self.provider.location = "Lalitpur"
+        self.provider.save()
+
+        listing = CategoryListing.objects.get(provider=self.provider)
+        self.assertEqual(
+            (listing.first_name, listing.email, listing.location),
+            ("Patricia", "pat@example.com", "Lalitpur"),
+        )
+
+    def test_deleted_provider_is_unlisted(self):
+        self.verify()
+        self.user.delete()
+        self.assertFalse(CategoryListing.objects.exists())
+
+    def test_rebuild_listings(self):
+        self.verify()
+        CategoryListing.objects.all().delete()
+        self.assertEqual(listings.rebuild_listings(), 1)
+        self.assertEqual(self.listed(), ["plumbing"])
+
+    def test_category_page_reads_listings(self):
+        self.verify()
+        cache.clear()
+        response = self.client.get(reverse("providers_by_category", args=["plumbing"]))
+        self.assertContains(response, "Pat")
+        self.assertEqual([p.provider_id for p in response.context["providers"]], [self.provider.id])
+
+
+# ==============================
+# SESSION STORE
+# ==============================
+
+class SessionCacheTests(SimpleTestCase):
+
+    def test_least_recently_used_is_evicted(self):
+        cache = sessions.SessionCache(size=2, ttl=60)
+        cache.put("a", "data-a", None)
+        cache.put("b", "data-b", None)
+        cache.get("a")
+        cache.put("c", "data-c", None)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), ("data-a", None))
+        self.assertEqual(cache.get("c"), ("data-c", None))
+
+    def test_entries_expire_after_ttl(self):
+        cache = sessions.SessionCache(size=2, ttl=5)
+        with mock.patch.object(sessions.time, "monotonic", return_value=100):
+            cache.put("a", "data-a", None)
+        with mock.patch.object(sessions.time, "monotonic", return_value=104):
+            self.assertEqual(cache.get("a"), ("data-a", None))
+        with mock.patch.object(sessions.time, "monotonic", return_value=106):
+            self.assertIsNone(cache.get("a"))
+
+
+@override_settings(SESSION_WRITE_BEHIND_INTERVAL=60)
+class SessionStoreTests(TestCase):
+
+    def setUp(self):
+        self.cache = sessions.SessionCache(size=100, ttl=60)
+        # Flushes are made by hand, not by a background thread
+        self.cache._flusher = object()
+        self.enterContext(mock.patch.object(sessions, "get_session_cache", return_value=self.cache))
+
+    def stored(self, session_key):
+        return Session.objects.filter(session_key=session_key).exists()
+
+    def saved_store(self):
+        store = sessions.SessionStore()
+        store["cart"] = 1
+        store.save()
+        return store
+
+    def test_writes_are_batched(self):
+        store = self.saved_store()
+        self.assertFalse(self.stored(store.session_key))
+        # Other requests read the pending write from the cache
+        self.assertEqual(sessions.SessionStore(store.session_key).load(), {"cart": 1})
+
+        self.cache.flush()
+        session = Session.objects.get(session_key=store.session_key)
+        self.assertEqual(session.get_decoded(), {"cart": 1})
+
+    @override_settings(SESSION_WRITE_BEHIND_INTERVAL=0)
+    def test_write_through(self):
+        store = self.saved_store()
+        self.assertTrue(self.stored(store.session_key))
+
+    def test_delete_is_written_at_once(self):
+        store = self.saved_store()
+        self.cache.flush()
+        session_key = store.session_key
+
+        store.delete()
+        self.assertFalse(self.stored(session_key))
+        self.assertEqual(sessions.SessionStore(session_key).load(), {})
+
+    def test_cycle_key_removes_the_old_key_at_once(self):
+        store = self.saved_store()
+        self.cache.flush()
+        old_key = store.session_key
+
+        store.cycle_key()
+        self.assertFalse(self.stored(old_key))
+        self.assertTrue(self.stored(store.session_key))
+        self.assertEqual(sessions.SessionStore(store.session_key).load(), {"cart": 1})
+
+
+class SessionEngineTests(TestCase):
+
+    def test_login_and_logout(self):
+        User.objects.create_user(username="cara@example.com", password="pw")
+        self.assertTrue(self.client.login(username="cara@example.com", password="pw"))
+        self.assertIsInstance(self.client.session, sessions.SessionStore)
+        session_key = self.client.session.session_key
+        self.assertTrue(Session.objects.filter(session_key=session_key).exists())
+
+        self.client.get(reverse("logout"))
+        self.assertFalse(Session.objects.filter(session_key=session_key).exists())
@@ -0,0 +1,180 @@
+"""
+Upload handler for provider certificates.
+
+Enforces the certificate limits while the request body is still being
+received: the file type is sniffed from the first bytes instead of
+trusting the extension, and an over-size file stops the upload
+mid-stream. Accepted files are streamed to temporary files next to
+certificate storage, so nothing is buffered in memory. store_uploads()
+moves them to their content-hash names inside the signup transaction;
+discard_uploads() removes whatever a rejected signup left staged.
+"""
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.core.files.uploadedfile import UploadedFile
+from django.http import QueryDict
+from django.core.files.uploadhandler import (
+    FileUploadHandler,
+    SkipFile,
+    StopFutureHandlers,
+    StopUpload,
+)
+from django.utils.datastructures import MultiValueDict
+
+from .forms import ProviderCertificateUploadForm
+from .models import ProviderCertificate
+from .storage import certificate_storage
+
+
+MAX_FILE_SIZE = ProviderCertificateUploadForm.MAX_FILE_SIZE
+
+# One certificate per category, plus room for the form fields
+MAX_CERTIFICATES = 6
+MAX_REQUEST_SIZE = MAX_CERTIFICATES * MAX_FILE_SIZE + 1024 * 1024
+
+# (magic bytes, stored extension, content type)
+SIGNATURES = [
+    (b"%PDF-", ".pdf", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", ".png", "image/png"),
+    (b"\xff\xd8\xff", ".jpg", "image/jpeg"),
+]
+
+UPLOAD_DIR = "certificates"
+
+
+def sniff(head):
+    """(extension, content_type) for the leading bytes of a file, or None."""
+    for magic, extension, content_type in SIGNATURES:
+        if head.startswith(magic):
+            return extension, content_type
+    return None
+
+
+class StagedUpload(UploadedFile):
+    """
+    An accepted upload, written to `temp_path`. Stored in certificate
+    storage as `stored_name` by store_uploads().
+    """
+
+    def __init__(self, temp_path, stored_name, name, content_type, size):
+        super().__init__(file=None, name=name, content_type=content_type, size=size)
+        self.temp_path = temp_path
+        self.stored_name = stored_name
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def store_uploads(uploads):
+    """
+    Move staged uploads into certificate storage for the duration of the
+    block that records them. Files this call added are deleted again if
+    the block raises, so a failed signup leaves no orphans.
+
+    Enter it outside the transaction of that block: the cleanup runs after
+    the rollback and keeps any file a concurrent signup with the same
+    content has recorded in the meantime.
+    """
+    added = []
+    try:
+        for upload in uploads:
+            if not certificate_storage.exists(upload.stored_name):
+                added.append(upload.stored_name)
+            certificate_storage.store_file(upload.temp_path, upload.stored_name)
+        yield
+    except BaseException:
+        referenced = set(
+            ProviderCertificate.objects
+            .filter(certificate__in=added)
+            .values_list("certificate", flat=True)
+        )
+        for name in added:
+            if name not in referenced:
+                certificate_storage.delete(name)
+        raise
+
+
+def discard_uploads(uploads):
+    """Remove the temporary files of uploads that were never stored."""
+    for upload in uploads:
+        if os.path.exists(upload.temp_path):
+            os.remove(upload.temp_path)
+
+
+class CertificateUploadHandler(FileUploadHandler):
+    """
+    Errors are collected on request.upload_errors for the view to show.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.storage = certificate_storage
+        self.temp_file = None
+        request.upload_errors = []
+
+    def _reject(self, message):
+        self.request.upload_errors.append(message)
+        self._discard()
+
+    def _discard(self):
+        if self.temp_file is not None:
+            self.temp_file.close()
+            os.remove(self.temp_file.name)
+            self.temp_file = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > MAX_REQUEST_SIZE:
+            # Decided from the Content-Length header alone: the body is
+            # never read, the view shows the error with empty form data
+            self._reject("Upload is too large. Each certificate must not exceed 5MB.")
+            return QueryDict(encoding=encoding), MultiValueDict()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.detected = None
+
+        incoming = self.storage.path(os.path.join(UPLOAD_DIR, ".incoming"))
+        os.makedirs(incoming, exist_ok=True)
+        self.temp_file = tempfile.NamedTemporaryFile(dir=incoming, delete=False)
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0:
+            self.detected = sniff(raw_data)
+            if self.detected is None:
+                allowed = ", ".join(ProviderCertificateUploadForm.ALLOWED_EXTENSIONS)
+                self._reject(f"{self.file_name}: only {allowed} files are allowed.")
+                raise SkipFile()
+
+        self.size += len(raw_data)
+        if self.size > MAX_FILE_SIZE:
+            self._reject(f"{self.file_name}: file size must not exceed 5MB.")
+            raise StopUpload(connection_reset=False)
+
+        self.digest.update(raw_data)
+        self.temp_file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if self.temp_file is None or self.detected is None:
+            # Empty file: nothing was received
+            self._discard()
+            return None
+
+        self.temp_file.close()
+        extension, content_type = self.detected
+        name = self.storage.hashed_name(UPLOAD_DIR, self.digest.hexdigest(), extension)
+        upload = StagedUpload(self.temp_file.name, name, self.file_name, content_type, file_size)
+        self.temp_file = None
+        return upload
+
+    def upload_interrupted(self):
+        self._discard()
+
+    def upload_complete(self):
+        self._discard()
@@ -1,6 +1,6 @@
 import random
-from django.core.mail import send_mail
-from django.conf import settings
+
+from .outbox import queue_email
 
 
 def generate_otp():
@@ -16,9 +16,4 @@ Your HomeService verification code is:
 
 Do not share this code with anyone.
 """
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [email],
-    )
+    queue_email(subject, message, [email])
@@ -1,23 +1,31 @@
-import random
-
 from .decorators import admin_only
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views.decorators.http import require_POST
-from django.core.mail import send_mail
-from django.conf import settings
-from django import forms
 
-from .models import Profile, ProviderCategory, ProviderCertificate
+from .models import Profile
+from .outbox import queue_email
+from .previews import schedule_previews
+from .registration import (
+    EMAIL_TAKEN_MESSAGE,
+    PHONE_TAKEN_MESSAGE,
+    EmailTaken,
+    PhoneTaken,
+    create_account,
+    verification_code,
+)
+from .uploads import CertificateUploadHandler, discard_uploads, store_uploads
 from booking.models import Booking, Service
+from booking import views as booking_views
 from .forms import (
     CustomerRegistrationForm,
     ProviderRegistrationForm,
-    ProviderCertificateUploadForm,
     LoginForm
 )
 
@@ -33,30 +41,24 @@ def register(request):
             phone = form.cleaned_data['phone']
             password = form.cleaned_data['password']
 
-            user = User.objects.create_user(
-                username=email,
-                email=email,
-                password=password,
-                first_name=full_name
-            )
-
-            code = f"{random.randint(100000, 999999)}"
-
-            Profile.objects.create(
-                user=user,
-                role="customer",
-                is_verified=False,
-                phone=phone,
-                email_token=code,
-            )
-
-            # store pending email in session for OTP verification
-            request.session['pending_email'] = email
+            code = verification_code()
 
             try:
-                send_mail(
-                    subject="Your HomeService verification code",
-                    message=f"""
+                # Account and its verification email commit together
+                with transaction.atomic():
+                    create_account(
+                        full_name=full_name,
+                        email=email,
+                        phone=phone,
+                        password=password,
+                        role="customer",
+                        email_token=code,
+                    )
+
+                    # Delivered in the background by the send_queued_email worker
+                    queue_email(
+                        subject="Your HomeService verification code",
+                        message=f"""
 Hello {full_name},
 
 Your one-time verification code is: {code}
@@ -68,14 +70,19 @@ If you did not sign up, you can ignore this email.
 Thanks,
 HomeService Team
 """,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[email],
-                    fail_silently=False,
-                )
-                messages.success(request, "Account created. Enter the code sent to your email.")
-            except Exception as e:
-                messages.warning(request, f"Account created. Email may have failed. Code: {code}")
-                print(f"Email send error: {str(e)}")
+                        recipient_list=[email],
+                    )
+            except EmailTaken:
+                messages.error(request, EMAIL_TAKEN_MESSAGE)
+                return render(request, "account/register.html", {'form': form})
+            except PhoneTaken:
+                messages.error(request, PHONE_TAKEN_MESSAGE)
+                return render(request, "account/register.html", {'form': form})
+
+            # store pending email in session for OTP verification
+            request.session['pending_email'] = email
+
+            messages.success(request, "Account created. Enter the code sent to your email.")
             
             return redirect("verify_email")
 
@@ -92,75 +99,77 @@ HomeService Team
 # ==========================
 # PROVIDER REGISTER (EMAIL + ADMIN VERIFICATION)
 # ==========================
+@csrf_exempt
 def provider_register(request):
+    # Certificates are checked and staged while the body streams in. The
+    # handler has to be installed before anything reads request.POST,
+    # so CSRF is checked afterwards by the csrf_protect'ed inner view.
+    request.upload_handlers = [CertificateUploadHandler(request)]
+    return _provider_register(request)
+
+
+@csrf_protect
+def _provider_register(request):
     if request.method == "POST":
-        form = ProviderRegistrationForm(request.POST)
         certificates = request.FILES.getlist("certificates")
+        try:
+            return _create_provider(request, certificates)
+        finally:
+            # Certificates a rejected signup never stored
+            discard_uploads(certificates)
 
-        if not form.is_valid():
-            for errors in form.errors.values():
-                for error in errors:
-                    messages.error(request, error)
-            return render(request, "account/provider_register.html", {'form': form})
-
-        service_categories = form.cleaned_data['service_categories']
+    form = ProviderRegistrationForm()
+    return render(request, "account/provider_register.html", {'form': form})
 
-        if not certificates or len(certificates) != len(service_categories):
-            messages.error(
-                request,
-                "Number of certificates must match number of selected categories."
-            )
-            return render(request, "account/provider_register.html", {'form': form})
 
-        certificate_form = ProviderCertificateUploadForm()
-        for cert in certificates:
-            certificate_form.cleaned_data = {'certificates': cert}
-            try:
-                certificate_form.clean_certificates()
-            except forms.ValidationError as e:
-                messages.error(request, e.message)
-                return render(request, "account/provider_register.html", {'form': form})
-
-        full_name = form.cleaned_data['full_name']
-        email = form.cleaned_data['email']
-        phone = form.cleaned_data['phone']
-        password = form.cleaned_data['password']
-
-        user = User.objects.create_user(
-            username=email,
-            email=email,
-            password=password,
-            first_name=full_name
-        )
+def _create_provider(request, certificates):
+    form = ProviderRegistrationForm(request.POST)
 
-        code = f"{random.randint(100000, 999999)}"
+    if request.upload_errors:
+        for error in request.upload_errors:
+            messages.error(request, error)
+        return render(request, "account/provider_register.html", {'form': form})
 
-        profile = Profile.objects.create(
-            user=user,
-            role="provider",
-            is_verified=False,
-            phone=phone,
-            email_token=code,
-        )
+    if not form.is_valid():
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(request, error)
+        return render(request, "account/provider_register.html", {'form': form})
 
-        for category in service_categories:
-            ProviderCategory.objects.create(
-                provider=profile,
-                category=category,
-                is_verified=False
-            )
+    service_categories = form.cleaned_data['service_categories']
 
-        for certificate in certificates:
-            ProviderCertificate.objects.create(
-                provider=profile,
-                certificate=certificate
+    if not certificates or len(certificates) != len(service_categories):
+        messages.error(
+            request,
+            "Number of certificates must match number of selected categories."
+        )
+        return render(request, "account/provider_register.html", {'form': form})
+
+    full_name = form.cleaned_data['full_name']
+    email = form.cleaned_data['email']
+    phone = form.cleaned_data['phone']
+    password = form.cleaned_data['password']
+
+    code = verification_code()
+
+    try:
+        # Account, categories, certificates and the verification email
+        # commit together; the certificate files are removed again if
+        # the signup fails
+        with store_uploads(certificates), transaction.atomic():
+            profile, uploaded = create_account(
+                full_name=full_name,
+                email=email,
+                phone=phone,
+                password=password,
+                role="provider",
+                email_token=code,
+                categories=service_categories,
+                certificates=[certificate.stored_name for certificate in certificates],
             )
 
-        # store pending email in session for OTP verification
-        request.session['pending_email'] = email
-
-        try:
-            send_mail(
+            # Delivered in the background by the send_queued_email worker
+            queue_email(
                 subject="Your HomeService provider verification code",
                 message=f"""
 Hello {full_name},
@@ -175,21 +184,24 @@ If you did not sign up, you can ignore this email.
 Thanks,
 HomeService Team
 """,
-                from_email=settings.DEFAULT_FROM_EMAIL,
                 recipient_list=[email],
-                fail_silently=False,
             )
-            messages.success(request, "Provider account created. Enter the code sent to your email.")
-        except Exception as e:
-            messages.warning(request, f"Provider account created. Email may have failed. Code: {code}")
-            print(f"Email send error: {str(e)}")
-        
-        return redirect("verify_email")
 
-    else:
-        form = ProviderRegistrationForm()
+            # Reviewer thumbnails are rendered in the background
+            schedule_previews(uploaded)
+    except EmailTaken:
+        messages.error(request, EMAIL_TAKEN_MESSAGE)
+        return render(request, "account/provider_register.html", {'form': form})
+    except PhoneTaken:
+        messages.error(request, PHONE_TAKEN_MESSAGE)
+        return render(request, "account/provider_register.html", {'form': form})
 
-    return render(request, "account/provider_register.html", {'form': form})
+    # store pending email in session for OTP verification
+    request.session['pending_email'] = email
+
+    messages.success(request, "Provider account created. Enter the code sent to your email.")
+
+    return redirect("verify_email")
 
 
 def verify_email(request):
@@ -268,7 +280,9 @@ def logout_view(request):
 # ==========================
 @login_required
 def customer_dashboard(request):
-    bookings = Booking.objects.filter(customer=request.user).order_by("-booking_date")
+    bookings = Booking.objects.filter(
+        customer=request.user
+    ).select_related("service__provider__user").order_by("-booking_date")
     return render(request, "account/customer_dashboard.html", {"bookings": bookings})
 
 
@@ -277,11 +291,8 @@ def customer_dashboard(request):
 # ==========================
 @login_required
 def provider_dashboard(request):
-    bookings = Booking.objects.filter(
-        service__provider__user=request.user
-    ).order_by("-booking_date")
-
-    return render(request, "account/provider_dashboard.html", {"bookings": bookings})
+    # Same page as booking's provider dashboard (stats + paginated requests)
+    return booking_views.provider_dashboard(request)
 
 
 
@@ -329,7 +340,7 @@ def admin_users(request):
 
 @admin_only
 def admin_providers(request):
-    providers = Profile.objects.filter(role="provider")
+    providers = Profile.objects.filter(role="provider").select_related("user")
     return render(request, "account/admin/providers.html", {"providers": providers})
 
 
@@ -338,7 +349,10 @@ def admin_providers(request):
 @admin_only
 def admin_provider_detail(request, provider_id):
     provider = get_object_or_404(Profile, id=provider_id, role="provider")
-    return render(request, "account/admin/provider_detail.html", {"provider": provider})
+    return render(request, "account/admin/provider_detail.html", {
+        "provider": provider,
+        "certificates": provider.certificates.all(),
+    })
 
 
 # ADMIN: APPROVE PROVIDER
@@ -368,5 +382,5 @@ def admin_reject_provider(request, provider_id):
 # ADMIN: SERVICES LIST
 @admin_only
 def admin_services(request):
-    services = Service.objects.select_related("provider").all()
+    services = Service.objects.select_related("provider__user").all()
     return render(request, "account/admin/services.html", {"services": services})
\ No newline at end of file
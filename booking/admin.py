@@ -1,6 +1,19 @@
 from django.contrib import admin
 from .models import Service, Booking, Message
 
-admin.site.register(Service)
-admin.site.register(Booking)
-admin.site.register(Message)
+
+# The changelists print each row's __str__, which follows these relations
+
+@admin.register(Service)
+class ServiceAdmin(admin.ModelAdmin):
+    list_select_related = ('provider__user',)
+
+
+@admin.register(Booking)
+class BookingAdmin(admin.ModelAdmin):
+    list_select_related = ('customer', 'service')
+
+
+@admin.register(Message)
+class MessageAdmin(admin.ModelAdmin):
+    list_select_related = ('sender',)
@@ -0,0 +1,81 @@
+"""
+Result cache for the public catalog pages.
+
+Cache keys embed a version number per namespace ("search", "categories",
+"category:<name>", "provider:<id>"). Signals bump the version of exactly
+the namespaces a write affects, which makes the old entries unreachable;
+they then simply expire. Version counters live in the cache itself, so
+every worker must share one cache backend for invalidation to reach all
+of them.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _timeout():
+    return getattr(settings, "CATALOG_CACHE_TIMEOUT", 300)
+
+
+def _version_key(namespace):
+    return f"catalog:version:{namespace}"
+
+
+def _fresh_version():
+    # A counter that was evicted restarts above every version handed out
+    # before it, so entries cached under an old version stay unreachable
+    return time.time_ns() // 1000
+
+
+def version(namespace):
+    return cache.get_or_set(_version_key(namespace), _fresh_version, timeout=None)
+
+
+def bump(*namespaces):
+    """Invalidate every cached result in the given namespaces."""
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            # Counter not set yet (or evicted): start a fresh version
+            cache.set(_version_key(namespace), _fresh_version(), timeout=None)
+
+
+def category_namespace(category):
+    return f"category:{category}"
+
+
+def provider_namespace(provider_id):
+    return f"provider:{provider_id}"
+
+
+def provider_versions(provider_ids):
+    """
+    Version of each provider's namespace, read in one round trip. The
+    provider card fragments in the catalog templates are keyed on it.
+    """
+    keys = {pk: _version_key(provider_namespace(pk)) for pk in provider_ids}
+    found = cache.get_many(keys.values())
+    for key in keys.values():
+        if key not in found:
+            # add() keeps a version bumped meanwhile by another request
+            cache.add(key, _fresh_version(), timeout=None)
+            found[key] = cache.get(key)
+    return {pk: found[key] for pk, key in keys.items()}
+
+
+def make_key(namespace, *parts):
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f"catalog:{namespace}:v{version(namespace)}:{digest}"
+
+
+def get_or_compute(namespace, parts, compute):
+    """Return the cached result for (namespace, parts), computing it on a miss."""
+    key = make_key(namespace, *parts)
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.set(key, result, _timeout())
+    return result
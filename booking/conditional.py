@@ -0,0 +1,74 @@
+"""
+Conditional GET for the public catalog pages.
+
+A page's ETag is built from the booking.caching version counters of what
+it shows (which the signals bump on every relevant write), the query
+parameters that select it (search terms, filters, page cursor), the kind of
+visitor, since the navigation differs by role, and the build: counters
+kept in a shared cache survive a deploy, and old HTML must not be
+revalidated once it links to static files that are gone. A request whose
+If-None-Match still matches gets 304 Not Modified before the view runs,
+so no queries beyond the version lookups and no template rendering.
+
+Anonymous responses may be kept by shared caches for
+CATALOG_PROXY_MAX_AGE seconds and revalidated with the ETag after that;
+responses for logged-in users are private.
+"""
+import hashlib
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+
+def viewer(request):
+    """What the page's navigation depends on: anonymous, or the user's role."""
+    user = request.user
+    if not user.is_authenticated:
+        return "anonymous"
+    profile = getattr(user, "profile", None)
+    return profile.role if profile else "user"
+
+
+@lru_cache(maxsize=None)
+def build_id():
+    """
+    What this deploy serves: the collectstatic manifest hash, which changes
+    with any static file, plus BUILD_ID (e.g. the release's commit) for
+    deploys that only change templates.
+    """
+    manifest_hash = getattr(staticfiles_storage, "manifest_hash", "")
+    return f"{getattr(settings, 'BUILD_ID', '')}:{manifest_hash}"
+
+
+def page_etag(request, *versions):
+    digest = hashlib.md5(repr((versions, viewer(request), build_id())).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def catalog_page(etag_func):
+    """
+    Decorate a catalog view: answer 304 when the ETag from
+    etag_func(request, *args, **kwargs) matches, and set Cache-Control.
+    """
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(
+                    response,
+                    public=True,
+                    max_age=0,
+                    s_maxage=getattr(settings, "CATALOG_PROXY_MAX_AGE", 60),
+                )
+            return response
+
+        return wrapper
+    return decorator
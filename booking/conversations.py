@@ -0,0 +1,44 @@
+"""
+Maintenance of ConversationSummary rows.
+"""
+from django.db.models import F
+
+from .models import ConversationSummary
+
+
+SNIPPET_LENGTH = 200
+
+
+def summary_for(booking):
+    """The booking's summary, created on first use."""
+    summary, _ = ConversationSummary.objects.get_or_create(
+        booking=booking,
+        defaults={
+            "customer_id": booking.customer_id,
+            "provider_id": booking.service.provider_id,
+            "booking_date": booking.booking_date,
+        },
+    )
+    return summary
+
+
+def record_message(message):
+    """Make a new message the latest one and count it as unread for the recipient."""
+    booking = message.booking
+    unread = "provider_unread" if message.sender_id == booking.customer_id else "customer_unread"
+
+    updated = ConversationSummary.objects.filter(booking=booking).update(
+        last_message=message,
+        last_message_snippet=message.content[:SNIPPET_LENGTH],
+        last_message_at=message.created_at,
+        **{unread: F(unread) + 1},
+    )
+    if not updated:
+        summary_for(booking)
+        record_message(message)
+
+
+def mark_read(booking, user):
+    """Reset the unread count of one participant."""
+    unread = "customer_unread" if user.id == booking.customer_id else "provider_unread"
+    ConversationSummary.objects.filter(booking=booking).exclude(**{unread: 0}).update(**{unread: 0})
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from booking import stats
+
+
+class Command(BaseCommand):
+    help = "Recount the per-provider booking stats from the bookings table"
+
+    def handle(self, *args, **options):
+        providers = stats.rebuild_stats()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt booking stats for {providers} providers."))
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_index(apps, schema_editor):
+    from booking.search import token_weights
+
+    Service = apps.get_model('booking', 'Service')
+    SearchToken = apps.get_model('booking', 'SearchToken')
+
+    services = Service.objects.filter(
+        is_active=True,
+        provider__is_verified=True,
+    ).select_related('provider')
+
+    SearchToken.objects.bulk_create(
+        [
+            SearchToken(
+                service_id=service.id,
+                provider_id=service.provider_id,
+                field=field,
+                token=token,
+                weight=weight,
+            )
+            for service in services.iterator(chunk_size=1000)
+            for (field, token), weight in token_weights(service, service.provider).items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0009_alter_profile_email_token'),
+        ('booking', '0005_alter_booking_status_message'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(choices=[('text', 'Text'), ('location', 'Location')], max_length=10)),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='account.profile')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='booking.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['field', 'token'], name='booking_sea_field_7f51a6_idx')],
+            },
+        ),
+        migrations.RunPython(fill_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_stats(apps, schema_editor):
+    Booking = apps.get_model('booking', 'Booking')
+    ProviderBookingStats = apps.get_model('booking', 'ProviderBookingStats')
+
+    counts = {}
+    rows = Booking.objects.values_list('service__provider_id', 'status').annotate(total=models.Count('id'))
+    for provider_id, status, total in rows.order_by():
+        stats = counts.setdefault(provider_id, ProviderBookingStats(provider_id=provider_id))
+        setattr(stats, f'{status}_count', total)
+
+    ProviderBookingStats.objects.bulk_create(counts.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0011_categorylisting'),
+        ('booking', '0006_searchtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderBookingStats',
+            fields=[
+                ('provider', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='booking_stats', serialize=False, to='account.profile')),
+                ('pending_count', models.PositiveIntegerField(default=0)),
+                ('approved_count', models.PositiveIntegerField(default=0)),
+                ('rejected_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('cancelled_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_summaries(apps, schema_editor):
+    Booking = apps.get_model('booking', 'Booking')
+    Message = apps.get_model('booking', 'Message')
+    ConversationSummary = apps.get_model('booking', 'ConversationSummary')
+
+    summaries = []
+    for booking in Booking.objects.select_related('service').iterator():
+        messages = Message.objects.filter(booking=booking)
+        last_message = messages.order_by('created_at', 'id').last()
+        unread = messages.filter(is_read=False)
+        summaries.append(ConversationSummary(
+            booking=booking,
+            customer_id=booking.customer_id,
+            provider_id=booking.service.provider_id,
+            booking_date=booking.booking_date,
+            last_message=last_message,
+            last_message_snippet=last_message.content[:200] if last_message else '',
+            last_message_at=last_message.created_at if last_message else None,
+            customer_unread=unread.exclude(sender_id=booking.customer_id).count(),
+            provider_unread=unread.filter(sender_id=booking.customer_id).count(),
+        ))
+
+    ConversationSummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0011_categorylisting'),
+        ('booking', '0007_providerbookingstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationSummary',
+            fields=[
+                ('booking', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='conversation', serialize=False, to='booking.booking')),
+                ('booking_date', models.DateTimeField()),
+                ('last_message_snippet', models.CharField(blank=True, max_length=200)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('customer_unread', models.PositiveIntegerField(default=0)),
+                ('provider_unread', models.PositiveIntegerField(default=0)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to=settings.AUTH_USER_MODEL)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='booking.message')),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to='account.profile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer', '-booking_date'], name='booking_con_custome_3cea54_idx'), models.Index(fields=['provider', '-booking_date'], name='booking_con_provide_06efc5_idx')],
+            },
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0013_certificate_storage'),
+        ('booking', '0008_conversationsummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['customer', '-booking_date'], name='booking_boo_custome_37d89b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['service', 'status'], name='booking_boo_service_d7b905_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['booking', 'created_at'], name='booking_mes_booking_322c89_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['booking', 'is_read', 'sender'], name='booking_mes_booking_0b582b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['is_active', 'category', 'provider'], name='booking_ser_is_acti_e912a8_idx'),
+        ),
+    ]
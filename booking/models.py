@@ -49,6 +49,11 @@ class Service(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["is_active", "category", "provider"]),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.provider.user.username})"
 
@@ -100,10 +105,61 @@ class Booking(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Customer dashboard: newest bookings of a customer
+            models.Index(fields=["customer", "-booking_date"]),
+            # Provider dashboard and stats: bookings of a service by status
+            models.Index(fields=["service", "status"]),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so status changes can update the stats
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
     def __str__(self):
         return f"{self.customer.username} → {self.service.name} ({self.status})"
 
 
+# ==============================
+# PROVIDER BOOKING STATS MODEL
+# ==============================
+
+class ProviderBookingStats(models.Model):
+    """
+    Per-provider booking counts by status, kept current by
+    booking.signals whenever a booking is created, changes status or is
+    deleted.
+    """
+    provider = models.OneToOneField(
+        Profile,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="booking_stats"
+    )
+
+    pending_count = models.PositiveIntegerField(default=0)
+    approved_count = models.PositiveIntegerField(default=0)
+    rejected_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    cancelled_count = models.PositiveIntegerField(default=0)
+
+    @staticmethod
+    def counter_for(status):
+        return f"{status}_count"
+
+    @classmethod
+    def for_provider(cls, provider):
+        """Stats of a provider, or an unsaved all-zero record if it has no bookings yet."""
+        return cls.objects.filter(provider=provider).first() or cls(provider=provider)
+
+    def __str__(self):
+        return f"Booking stats - {self.provider_id}"
+
+
 # ==============================
 # MESSAGE MODEL
 # ==============================
@@ -129,6 +185,118 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # A conversation in order
+            models.Index(fields=["booking", "created_at"]),
+            # Marking the other side's messages read
+            models.Index(fields=["booking", "is_read", "sender"]),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.username} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+# ==============================
+# SEARCH INDEX MODEL
+# ==============================
+
+class SearchToken(models.Model):
+    """
+    One row per (service, field, token) in the service search index.
+    Only active services of verified providers are indexed.
+    """
+    FIELD_CHOICES = [
+        ("text", "Text"),
+        ("location", "Location"),
+    ]
+
+    service = models.ForeignKey(
+        Service,
+        on_delete=models.CASCADE,
+        related_name="search_tokens"
+    )
+
+    provider = models.ForeignKey(
+        Profile,
+        on_delete=models.CASCADE,
+        related_name="search_tokens"
+    )
+
+    field = models.CharField(
+        max_length=10,
+        choices=FIELD_CHOICES
+    )
+
+    token = models.CharField(max_length=64)
+
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["field", "token"]),
+        ]
+
+    def __str__(self):
+        return f"{self.token} → service {self.service_id} ({self.field})"
+
+
+# ==============================
+# CONVERSATION SUMMARY MODEL
+# ==============================
+
+class ConversationSummary(models.Model):
+    """
+    Inbox row for a booking's conversation: the latest message and the
+    unread count of each participant. Kept current by booking.signals
+    and booking.conversations.
+    """
+    booking = models.OneToOneField(
+        Booking,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="conversation"
+    )
+
+    # Copied from the booking so each inbox is one indexed range read
+    customer = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="conversations"
+    )
+
+    provider = models.ForeignKey(
+        Profile,
+        on_delete=models.CASCADE,
+        related_name="conversations"
+    )
+
+    booking_date = models.DateTimeField()
+
+    last_message = models.ForeignKey(
+        Message,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+
+    last_message_snippet = models.CharField(max_length=200, blank=True)
+
+    last_message_at = models.DateTimeField(null=True, blank=True)
+
+    customer_unread = models.PositiveIntegerField(default=0)
+    provider_unread = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["customer", "-booking_date"]),
+            models.Index(fields=["provider", "-booking_date"]),
+        ]
+
+    def unread_for(self, user):
+        if user.id == self.customer_id:
+            return self.customer_unread
+        return self.provider_unread
+
+    def __str__(self):
+        return f"Conversation - booking {self.booking_id}"
@@ -0,0 +1,52 @@
+"""
+Keyset pagination for newest-first lists.
+
+Pages are ordered by (field, pk) descending and each page continues
+strictly before the last row of the previous one, so reading a page
+costs one index range read no matter how deep it is, and rows inserted
+meanwhile never shift later pages.
+"""
+from datetime import datetime, timedelta, timezone
+
+from django.db.models import Q
+
+
+PAGE_SIZE = 10
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode_cursor(value, pk):
+    """Opaque cursor for a (datetime, id) position."""
+    micros = (value - EPOCH) // timedelta(microseconds=1)
+    return f"{micros}.{pk}"
+
+
+def decode_cursor(value):
+    """Parse a cursor into (datetime, id), or None if missing or invalid."""
+    try:
+        micros, pk = value.split(".")
+        return EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def page_before(queryset, field, cursor=None, size=PAGE_SIZE):
+    """
+    Return (items, next_cursor): up to `size` rows ordered newest first by
+    (field, pk), strictly before `cursor`. next_cursor is None on the last page.
+    """
+    queryset = queryset.order_by(f"-{field}", "-pk")
+    if cursor:
+        value, pk = cursor
+        queryset = queryset.filter(
+            Q(**{f"{field}__lt": value}) | Q(**{field: value, "pk__lt": pk})
+        )
+
+    items = list(queryset[:size + 1])
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return items, next_cursor
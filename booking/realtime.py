@@ -0,0 +1,230 @@
+"""
+Real-time delivery of chat messages.
+
+New Message rows are published to a per-booking channel on a pub/sub
+broker, and the Server-Sent Events endpoint streams them to every open
+conversation. The broker backend is chosen by settings.MESSAGE_BROKER:
+
+- InProcessBackend: asyncio queues inside one worker process.
+- SQLiteBackend: a shared SQLite event log, a local stand-in for a
+  networked broker that lets several workers on one machine share
+  channels.
+
+A stream holds its connection open for as long as the chat is open, which
+only an ASGI server can do without tying up a worker. Under WSGI the chat
+page polls the messages_since endpoint instead.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.module_loading import import_string
+
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = 15
+
+# Seconds between messages_since requests of a chat page without a stream
+POLL_INTERVAL = 5
+
+
+def can_stream(request):
+    """Whether the request is served by ASGI, which can hold a stream open."""
+    return isinstance(request, ASGIRequest)
+
+
+def channel_for(booking_id):
+    return f"booking:{booking_id}"
+
+
+def serialize_message(message):
+    return {
+        "id": message.id,
+        "booking_id": message.booking_id,
+        "sender_id": message.sender_id,
+        "sender_name": message.sender.get_full_name(),
+        "content": message.content,
+        "created_at": message.created_at.isoformat(),
+    }
+
+
+def format_event(payload):
+    """One SSE frame for a message payload."""
+    return f"id: {payload['id']}\nevent: message\ndata: {json.dumps(payload)}\n\n"
+
+
+# ==============================
+# BACKENDS
+# ==============================
+
+class InProcessBackend:
+    """Channels shared by the streams of a single worker process."""
+
+    def __init__(self, **options):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, payload):
+        # Safe to call from sync code running in any thread
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, payload)
+
+    def subscribe(self, channel):
+        return InProcessSubscription(self, channel)
+
+    def _add(self, channel, entry):
+        with self._lock:
+            self._subscribers[channel].add(entry)
+
+    def _remove(self, channel, entry):
+        with self._lock:
+            self._subscribers[channel].discard(entry)
+            if not self._subscribers[channel]:
+                del self._subscribers[channel]
+
+
+class InProcessSubscription:
+    def __init__(self, backend, channel):
+        self.backend = backend
+        self.channel = channel
+        self.queue = asyncio.Queue()
+        self.entry = (asyncio.get_running_loop(), self.queue)
+        backend._add(channel, self.entry)
+
+    async def get(self, timeout):
+        """Next payload, or None if nothing arrived within timeout seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.backend._remove(self.channel, self.entry)
+
+
+class SQLiteBackend:
+    """
+    Channels shared through an append-only SQLite event log. Publishers
+    insert rows; subscribers poll for rows newer than the last one seen.
+    Events older than `retention` seconds are pruned.
+    """
+
+    def __init__(self, path=None, poll_interval=0.5, retention=300, **options):
+        self.path = str(path or settings.BASE_DIR / "broker.sqlite3")
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "channel TEXT NOT NULL, payload TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS events_channel ON events (channel, id)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def publish(self, channel, payload):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO events (channel, payload, created) VALUES (?, ?, ?)",
+            (channel, json.dumps(payload), now),
+        )
+        conn.execute("DELETE FROM events WHERE created < ?", (now - self.retention,))
+
+    def subscribe(self, channel):
+        return SQLiteSubscription(self, channel)
+
+    def _last_id(self):
+        row = self._connect().execute("SELECT MAX(id) FROM events").fetchone()
+        return row[0] or 0
+
+    def _read(self, channel, after):
+        return self._connect().execute(
+            "SELECT id, payload FROM events WHERE channel = ? AND id > ? ORDER BY id",
+            (channel, after),
+        ).fetchall()
+
+
+class SQLiteSubscription:
+    def __init__(self, backend, channel):
+        self.backend = backend
+        self.channel = channel
+        self.last_id = backend._last_id()
+        self.pending = []
+
+    async def get(self, timeout):
+        """Next payload, or None if nothing arrived within timeout seconds."""
+        deadline = time.monotonic() + timeout
+        while not self.pending:
+            rows = await asyncio.to_thread(self.backend._read, self.channel, self.last_id)
+            if rows:
+                self.last_id = rows[-1][0]
+                self.pending = [json.loads(payload) for _, payload in rows]
+                break
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(self.backend.poll_interval)
+        return self.pending.pop(0)
+
+    def close(self):
+        self.pending = []
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    config = getattr(settings, "MESSAGE_BROKER", {})
+    backend = import_string(config.get("BACKEND", "booking.realtime.InProcessBackend"))
+    return backend(**config.get("OPTIONS", {}))
+
+
+# ==============================
+# PUBLISH / STREAM
+# ==============================
+
+def publish_message(message):
+    get_broker().publish(channel_for(message.booking_id), serialize_message(message))
+
+
+async def message_events(booking_id, after=0):
+    """
+    SSE frames for a booking's conversation: first every message after
+    `after` from the database, then new messages as they are published.
+    """
+    from .models import Message
+
+    # Subscribe before catching up so nothing published in between is lost
+    subscription = get_broker().subscribe(channel_for(booking_id))
+    try:
+        missed = Message.objects.filter(
+            booking_id=booking_id,
+            id__gt=after
+        ).select_related("sender").order_by("id")
+        async for message in missed:
+            yield format_event(serialize_message(message))
+            after = message.id
+
+        while True:
+            payload = await subscription.get(HEARTBEAT_INTERVAL)
+            if payload is None:
+                yield ": keep-alive\n\n"
+            elif payload["id"] > after:
+                after = payload["id"]
+                yield format_event(payload)
+    finally:
+        subscription.close()
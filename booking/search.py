@@ -0,0 +1,236 @@
+"""
+Inverted token index for service search.
+
+Every active service of a verified provider is broken into lowercase
+alphanumeric tokens, in any script. Name, category and description tokens go into the
+"text" field (weighted by where they appear), service and provider
+locations go into the "location" field. Queries are answered from the
+(field, token) index with prefix range scans instead of LIKE '%q%'.
+"""
+import re
+import unicodedata
+
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Max, Q, Sum, Value, When
+
+from .models import SearchToken, Service
+
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+MAX_TOKEN_LENGTH = 64
+MAX_QUERY_TERMS = 8
+
+# Providers shown per page of search results
+PAGE_SIZE = 10
+
+# Relevance weight of a token by where it appears in the service
+NAME_WEIGHT = 3
+CATEGORY_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+LOCATION_WEIGHT = 1
+
+
+def _words(text):
+    """
+    Alphanumeric runs of non-ASCII text. Combining marks (e.g. Devanagari
+    vowel signs) are not alphanumeric but belong to the word they follow.
+    """
+    word = []
+    for char in text:
+        if char.isalnum() or (word and unicodedata.category(char).startswith("M")):
+            word.append(char)
+        elif word:
+            yield "".join(word)
+            word = []
+    if word:
+        yield "".join(word)
+
+
+def tokenize(text):
+    """Split text into lowercase alphanumeric tokens."""
+    if not text:
+        return []
+    text = str(text).lower()
+    words = TOKEN_RE.findall(text) if text.isascii() else _words(text)
+    return [token[:MAX_TOKEN_LENGTH] for token in words]
+
+
+def query_terms(text):
+    """Unique query terms in the order typed, capped at MAX_QUERY_TERMS."""
+    return list(dict.fromkeys(tokenize(text)))[:MAX_QUERY_TERMS]
+
+
+def normalize_query(text):
+    """Cache-key form of a query: None when blank, otherwise its terms."""
+    if not text.strip():
+        return None
+    return tuple(query_terms(text))
+
+
+def is_searchable(service, provider=None):
+    provider = provider or service.provider
+    return service.is_active and provider.is_verified
+
+
+def token_weights(service, provider):
+    """{(field, token): weight} of a single service."""
+    sources = [
+        ("text", service.name, NAME_WEIGHT),
+        ("text", f"{service.category} {service.get_category_display()}", CATEGORY_WEIGHT),
+        ("text", service.description, DESCRIPTION_WEIGHT),
+        ("location", service.location, LOCATION_WEIGHT),
+        ("location", provider.location, LOCATION_WEIGHT),
+    ]
+
+    weights = {}
+    for field, text, weight in sources:
+        for token in set(tokenize(text)):
+            weights[(field, token)] = weights.get((field, token), 0) + weight
+    return weights
+
+
+def build_tokens(service, provider=None):
+    """Build (unsaved) SearchToken rows for a single service."""
+    provider = provider or service.provider
+    return [
+        SearchToken(
+            service_id=service.id,
+            provider_id=provider.id,
+            field=field,
+            token=token,
+            weight=weight,
+        )
+        for (field, token), weight in token_weights(service, provider).items()
+    ]
+
+
+@transaction.atomic
+def index_service(service):
+    """Replace the index rows of one service."""
+    SearchToken.objects.filter(service_id=service.id).delete()
+    if is_searchable(service):
+        SearchToken.objects.bulk_create(build_tokens(service))
+
+
+@transaction.atomic
+def index_provider(profile):
+    """Replace the index rows of every service offered by a provider."""
+    SearchToken.objects.filter(provider_id=profile.id).delete()
+    if not profile.is_verified:
+        return
+
+    rows = []
+    for service in Service.objects.filter(provider_id=profile.id, is_active=True):
+        rows.extend(build_tokens(service, provider=profile))
+    SearchToken.objects.bulk_create(rows)
+
+
+@transaction.atomic
+def rebuild_index(batch_size=1000):
+    """Drop and rebuild the whole index. Returns the number of services indexed."""
+    SearchToken.objects.all().delete()
+
+    services = Service.objects.filter(
+        is_active=True,
+        provider__is_verified=True
+    ).select_related("provider").order_by("id")
+
+    indexed = 0
+    rows = []
+    for service in services.iterator(chunk_size=batch_size):
+        rows.extend(build_tokens(service))
+        indexed += 1
+        if len(rows) >= batch_size:
+            SearchToken.objects.bulk_create(rows, batch_size=batch_size)
+            rows = []
+
+    SearchToken.objects.bulk_create(rows, batch_size=batch_size)
+    return indexed
+
+
+def _term_q(field, term):
+    # Prefix match as an index range scan: term <= token < term + U+FFFF
+    return Q(field=field, token__gte=term, token__lt=term + "\uffff")
+
+
+def match_services(query="", location=""):
+    """
+    Return grouped rows of {service_id, provider_id, score} for services
+    matching every query term (in name/category/description) and every
+    location term (in service or provider location), best match first.
+
+    Returns None when both query and location are blank, and an empty
+    queryset (query.is_empty()) when they hold no terms, e.g. only
+    punctuation.
+    """
+    if not query.strip() and not location.strip():
+        return None
+
+    terms = [("text", term) for term in query_terms(query)]
+    terms += [("location", term) for term in query_terms(location)]
+    if not terms:
+        return SearchToken.objects.none().values("service_id", "provider_id")
+
+    condition = Q()
+    flags = {}
+    for i, (field, term) in enumerate(terms):
+        term_q = _term_q(field, term)
+        condition |= term_q
+        flags[f"term_{i}"] = Max(
+            Case(When(term_q, then=Value(1)), default=Value(0), output_field=IntegerField())
+        )
+
+    return (
+        SearchToken.objects
+        .filter(condition)
+        .values("service_id", "provider_id")
+        .annotate(score=Sum("weight"), **flags)
+        .filter(**{flag: 1 for flag in flags})
+        .order_by("-score", "service_id")
+    )
+
+
+def rank_sql(matches, after=None, limit=PAGE_SIZE):
+    """(sql, params) of the provider ranking query used by rank_providers()."""
+    sql, params = matches.query.sql_with_params()
+    params = list(params)
+
+    having = ""
+    if after is not None:
+        having = "HAVING (-MAX(matches.score), matches.provider_id) > (%s, %s)"
+        params += list(after)
+
+    return (
+        f"SELECT -MAX(matches.score), matches.provider_id "
+        f"FROM ({sql}) AS matches "
+        f"GROUP BY matches.provider_id {having} "
+        f"ORDER BY 1, 2 LIMIT %s",
+        params + [limit],
+    )
+
+
+def rank_providers(matches, after=None, limit=PAGE_SIZE):
+    """
+    Group matching services by provider in the database and return one
+    page of (sort_key, provider_id), ordered by the provider's best
+    service score. sort_key is the negated score so that pages always
+    continue strictly after the `after` cursor in ascending order.
+    """
+    sql, params = rank_sql(matches, after, limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(key, provider_id) for key, provider_id in cursor.fetchall()]
+
+
+def encode_cursor(key, provider_id):
+    """Opaque `after=` value pointing just past (key, provider_id)."""
+    return f"{key!r}:{provider_id}"
+
+
+def decode_cursor(value):
+    """Parse an `after=` value into (key, provider_id), or None if invalid."""
+    try:
+        key, provider_id = value.split(":")
+        return float(key), int(provider_id)
+    except (AttributeError, ValueError):
+        return None
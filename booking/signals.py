@@ -0,0 +1,134 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from account.models import Profile, ProviderCategory
+from .models import Booking, Message, Service
+from . import caching, conversations, realtime, search, stats
+
+
+# Keep the search index in sync with services and their providers.
+# Deletes need no handler: index rows cascade with the service/profile.
+
+@receiver(post_save, sender=Service)
+def reindex_service(sender, instance, **kwargs):
+    search.index_service(instance)
+
+
+@receiver(post_save, sender=Profile)
+def reindex_provider_services(sender, instance, created, **kwargs):
+    # A new unverified provider has nothing indexed yet
+    if created and not instance.is_verified:
+        return
+    if instance.role == "provider":
+        search.index_provider(instance)
+
+
+# Invalidate cached catalog results affected by a write.
+
+@receiver([post_save, post_delete], sender=Service)
+def invalidate_service_results(sender, instance, **kwargs):
+    caching.bump("search", caching.provider_namespace(instance.provider_id))
+
+
+@receiver([post_save, post_delete], sender=ProviderCategory)
+def invalidate_category_results(sender, instance, **kwargs):
+    caching.bump(
+        "categories",
+        caching.category_namespace(instance.category),
+        caching.provider_namespace(instance.provider_id),
+    )
+
+
+def _invalidate_provider(profile):
+    # "categories" too: verifying a provider changes the category counts
+    categories = profile.service_categories.values_list("category", flat=True)
+    caching.bump(
+        "search",
+        "categories",
+        caching.provider_namespace(profile.id),
+        *[caching.category_namespace(c) for c in categories],
+    )
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def invalidate_provider_results(sender, instance, created=False, **kwargs):
+    # Unverified providers appear on no catalog page until approved
+    if created and not instance.is_verified:
+        return
+    if instance.role == "provider":
+        _invalidate_provider(instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_provider_name(sender, instance, created, update_fields=None, **kwargs):
+    # A new user has no profile yet; logins only touch last_login,
+    # which no catalog page shows
+    if created:
+        return
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    profile = Profile.objects.filter(user=instance, role="provider").first()
+    if profile:
+        _invalidate_provider(profile)
+
+
+# Keep per-provider booking counters current.
+
+@receiver(post_save, sender=Booking)
+def count_booking_status(sender, instance, created, **kwargs):
+    old_status = None if created else getattr(instance, "_loaded_status", None)
+    if not created and (old_status is None or old_status == instance.status):
+        return
+    stats.move(instance.service.provider_id, old_status, instance.status)
+    instance._loaded_status = instance.status
+
+
+def _uncounted_services(origin):
+    """Services whose bookings were uncounted in bulk during this delete."""
+    if not hasattr(origin, "_uncounted_services"):
+        origin._uncounted_services = set()
+    return origin._uncounted_services
+
+
+@receiver(pre_delete, sender=Service)
+def uncount_service_bookings(sender, instance, origin=None, **kwargs):
+    stats.remove_service(instance.id, instance.provider_id)
+    if origin is not None:
+        _uncounted_services(origin).add(instance.id)
+
+
+@receiver(post_delete, sender=Booking)
+def uncount_booking(sender, instance, origin=None, **kwargs):
+    # Bookings cascading from a deleted service, provider or provider
+    # user were already uncounted with their service
+    if origin is not None and instance.service_id in _uncounted_services(origin):
+        return
+    provider_id = Service.objects.filter(
+        id=instance.service_id
+    ).values_list("provider_id", flat=True).first()
+    if provider_id:
+        stats.move(provider_id, instance.status, None)
+
+
+# Keep conversation summaries current for the messages inbox.
+
+@receiver(post_save, sender=Booking)
+def create_conversation_summary(sender, instance, created, **kwargs):
+    if created:
+        conversations.summary_for(instance)
+
+
+@receiver(post_save, sender=Message)
+def summarize_message(sender, instance, created, **kwargs):
+    if created:
+        conversations.record_message(instance)
+
+
+# Push new messages to open conversation streams once they are committed.
+
+@receiver(post_save, sender=Message)
+def publish_message(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: realtime.publish_message(instance))
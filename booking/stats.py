@@ -0,0 +1,71 @@
+"""
+Maintenance of ProviderBookingStats counters.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Booking, ProviderBookingStats
+
+
+def _added(field, delta):
+    # Never below zero: a queryset .update() of Booking.status bypasses the
+    # signals, so a counter can already be off when a later save moves it.
+    # rebuild_stats() puts such counters right again.
+    return Greatest(F(field) + delta, 0)
+
+
+def adjust(provider_id, status, delta):
+    """Add delta to one status counter of a provider."""
+    field = ProviderBookingStats.counter_for(status)
+    updated = ProviderBookingStats.objects.filter(
+        provider_id=provider_id
+    ).update(**{field: _added(field, delta)})
+
+    # First booking of this provider: create the record. Decrements never
+    # create one, the provider may be in the middle of being deleted.
+    if not updated and delta > 0:
+        ProviderBookingStats.objects.get_or_create(provider_id=provider_id)
+        ProviderBookingStats.objects.filter(
+            provider_id=provider_id
+        ).update(**{field: _added(field, delta)})
+
+
+@transaction.atomic
+def move(provider_id, old_status, new_status):
+    """Record a booking moving from old_status (None when new) to new_status."""
+    if old_status:
+        adjust(provider_id, old_status, -1)
+    if new_status:
+        adjust(provider_id, new_status, 1)
+
+
+def remove_service(service_id, provider_id):
+    """Uncount every booking of a service that is being deleted, in one update."""
+    totals = (
+        Booking.objects.filter(service_id=service_id)
+        .values_list('status')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    changes = {}
+    for status, total in totals:
+        field = ProviderBookingStats.counter_for(status)
+        changes[field] = _added(field, -total)
+    if changes:
+        ProviderBookingStats.objects.filter(provider_id=provider_id).update(**changes)
+
+
+@transaction.atomic
+def rebuild_stats():
+    """Recount every provider's bookings. Returns the number of providers."""
+    ProviderBookingStats.objects.all().delete()
+
+    counts = {}
+    rows = Booking.objects.values_list('service__provider_id', 'status').annotate(total=Count('id'))
+    for provider_id, status, total in rows.order_by():
+        stats = counts.setdefault(provider_id, ProviderBookingStats(provider_id=provider_id))
+        setattr(stats, ProviderBookingStats.counter_for(status), total)
+
+    ProviderBookingStats.objects.bulk_create(counts.values(), batch_size=1000)
+    return len(counts)
@@ -1,3 +1,890 @@
-from django.test import TestCase
+import asyncio
+import os
+import re
+import tempfile
+import uuid
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from account.models import Profile, ProviderCategory
+from . import caching, conditional, conversations, pagination, realtime, search, stats, views
+from .models import (
+    Booking,
+    ConversationSummary,
+    Message,
+    ProviderBookingStats,
+    SearchToken,
+    Service,
+)
+
+
+# ==============================
+# QUERY PLANS OF THE HOT VIEWS
+# ==============================
+
+# "SCAN <table>" with no index is a full table scan; "SCAN <table> USING
+# [COVERING] INDEX" reads an index instead and is allowed. SQLite before
+# 3.36 says "SCAN TABLE <table>"
+FULL_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)$")
+
+
+class QueryRecorder:
+    """execute_wrapper that keeps the (sql, params) of every read/update."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+class HotQueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(
+            username="customer@example.com", password="pw", first_name="Cara"
+        )
+        Profile.objects.create(user=cls.customer, role="customer", is_verified=True)
+
+        provider_user = User.objects.create_user(
+            username="provider@example.com", password="pw", first_name="Pat"
+        )
+        cls.provider = Profile.objects.create(
+            user=provider_user,
+            role="provider",
+            is_verified=True,
+            location="Kathmandu",
+            latitude=27.7172,
+            longitude=85.3240,
+        )
+        ProviderCategory.objects.create(provider=cls.provider, category="plumbing", is_verified=True)
+
+        cls.service = Service.objects.create(
+            provider=cls.provider,
+            name="Pipe repair",
+            description="Leaking pipes fixed",
+            category="plumbing",
+            price=500,
+            location="Kathmandu",
+        )
+        cls.booking = Booking.objects.create(customer=cls.customer, service=cls.service)
+        for sender in (cls.customer, provider_user, cls.customer):
+            Message.objects.create(booking=cls.booking, sender=sender, content="Hello")
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_no_full_scans(self, url, user=None, ordered_by_index=False):
+        if user is not None:
+            self.client.force_login(user)
+
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+
+        table_names = set(connection.introspection.table_names())
+        plan_rows = 0
+        with connection.cursor() as cursor:
+            for sql, params in recorder.queries:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                for row in cursor.fetchall():
+                    plan_rows += 1
+                    detail = row[-1]
+                    match = FULL_SCAN_RE.match(detail)
+                    if match and match.group(1) in table_names:
+                        self.fail(f"{url}: full scan of {match.group(1)} in\n{sql}")
+                    if ordered_by_index and detail == "USE TEMP B-TREE FOR ORDER BY":
+                        self.fail(f"{url}: sorts instead of reading an index in order\n{sql}")
+        # Nothing to check would make every page pass
+        self.assertGreater(plan_rows, 0, f"{url}: no query plans were read")
+
+    def test_public_pages(self):
+        self.assert_no_full_scans(reverse("search_services") + "?q=pipe&location=kathmandu")
+        self.assert_no_full_scans(reverse("search_services") + "?near=27.7,85.3&radius=5")
+        self.assert_no_full_scans(reverse("service_categories"))
+        self.assert_no_full_scans(reverse("providers_by_category", args=["plumbing"]))
+        self.assert_no_full_scans(
+            reverse("providers_by_category", args=["plumbing"]) + "?near=27.7,85.3"
+        )
+        self.assert_no_full_scans(reverse("provider_profile", args=[self.provider.id]))
+
+    def test_customer_pages(self):
+        self.assert_no_full_scans(reverse("customer_dashboard"), self.customer, ordered_by_index=True)
+        self.assert_no_full_scans(reverse("messages_inbox"))
+        self.assert_no_full_scans(reverse("view_messages", args=[self.booking.id]), ordered_by_index=True)
+        self.assert_no_full_scans(reverse("messages_since", args=[self.booking.id]))
+
+    def test_provider_pages(self):
+        self.assert_no_full_scans(reverse("provider_dashboard"), self.provider.user)
+        self.assert_no_full_scans(reverse("provider_services"))
+        self.assert_no_full_scans(reverse("messages_inbox"))
+        self.assert_no_full_scans(reverse("view_messages", args=[self.booking.id]))
+
+
+# ==============================
+# SEARCH
+# ==============================
+
+class SearchPageTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="provider@example.com", password="pw", first_name="Pat")
+        cls.provider = Profile.objects.create(
+            user=user, role="provider", is_verified=True, location="Kathmandu"
+        )
+        Service.objects.create(
+            provider=cls.provider, name="Pipe repair", description="Leaking pipes fixed",
+            category="plumbing", price=500, location="Kathmandu",
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_punctuation_only_terms_match_nothing(self):
+        for params in ("?q=!!!", "?q=%2B%2B", "?location=---", "?q=!!!&location=---"):
+            response = self.client.get(reverse("search_services") + params)
+            self.assertEqual(response.status_code, 200, params)
+            self.assertEqual(response.context["providers_with_services"], [], params)
+            self.assertIsNone(response.context["next_query"], params)
+
+
+class SearchIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="provider@example.com", password="pw", first_name="Pat")
+        cls.provider = Profile.objects.create(
+            user=user, role="provider", is_verified=True, location="Kathmandu"
+        )
+        cls.service = Service.objects.create(
+            provider=cls.provider, name="Pipe repair", description="Leaking pipes fixed",
+            category="plumbing", price=500, location="Thamel",
+        )
+
+    def matches(self, query="", location=""):
+        return [row["service_id"] for row in search.match_services(query, location)]
+
+    def test_tokenize(self):
+        self.assertEqual(search.tokenize("AC-Repair, 24/7!"), ["ac", "repair", "24", "7"])
+        self.assertEqual(search.query_terms("pipe PIPE leak"), ["pipe", "leak"])
+
+    def test_new_service_is_indexed(self):
+        self.assertEqual(self.matches("pipe"), [self.service.id])
+        # Prefix match on every term (AND), in text and location fields
+        self.assertEqual(self.matches("pip rep", "kath"), [self.service.id])
+        self.assertEqual(self.matches("pipe", "thamel"), [self.service.id])
+        self.assertEqual(self.matches("pipe paint"), [])
+
+    def test_service_changes_are_reindexed(self):
+        self.service.name = "Tap fitting"
+        self.service.save()
+        self.assertEqual(self.matches("tap"), [self.service.id])
+        self.assertEqual(self.matches("repair"), [])
+
+        self.service.is_active = False
+        self.service.save()
+        self.assertFalse(SearchToken.objects.filter(service=self.service).exists())
+
+    def test_provider_changes_are_reindexed(self):
+        self.provider.location = "Lalitpur"
+        self.provider.save()
+        self.assertEqual(self.matches(location="lalitpur"), [self.service.id])
+        self.assertEqual(self.matches(location="kathmandu"), [])
+
+        self.provider.is_verified = False
+        self.provider.save()
+        self.assertFalse(SearchToken.objects.filter(provider=self.provider).exists())
+
+        self.provider.is_verified = True
+        self.provider.save()
+        self.assertEqual(self.matches("pipe"), [self.service.id])
+
+    def test_deleted_service_leaves_no_tokens(self):
+        service_id = self.service.id
+        self.service.delete()
+        self.assertFalse(SearchToken.objects.filter(service_id=service_id).exists())
+
+    def test_rebuild_index(self):
+        SearchToken.objects.all().delete()
+        self.assertEqual(search.rebuild_index(), 1)
+        self.assertEqual(self.matches("pipe"), [self.service.id])
+
+    def test_migration_backfills_the_index(self):
+        SearchToken.objects.all().delete()
+        migration = import_module("booking.migrations.0006_searchtoken")
+        migration.fill_index(apps, None)
+        self.assertEqual(
+            sorted(SearchToken.objects.values_list("field", "token", "weight")),
+            sorted((t.field, t.token, t.weight) for t in search.build_tokens(self.service)),
+        )
+
+    def test_non_ascii_names_are_indexed(self):
+        # Devanagari vowel signs are combining marks and stay inside their word
+        self.assertEqual(search.tokenize("पाइप मर्मत, Café"), ["पाइप", "मर्मत", "café"])
+
+        self.service.name = "पाइप मर्मत"
+        self.service.save()
+        self.assertEqual(self.matches("पाइप"), [self.service.id])
+        self.assertEqual(self.matches("मर्"), [self.service.id])
+        self.assertEqual(self.matches("पा मत"), [])
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class SearchPagingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # More providers than fit on a page, with tied and untied scores
+        cls.provider_ids = []
+        for i in range(search.PAGE_SIZE * 2 + 5):
+            user = User.objects.create_user(username=f"provider{i}@example.com", password="pw")
+            provider = Profile.objects.create(
+                user=user, role="provider", is_verified=True, location="Kathmandu",
+                latitude=27.70 + i * 0.001, longitude=85.32,
+            )
+            Service.objects.create(
+                provider=provider,
+                name="Pipe repair" if i % 2 else "Leak fixing",
+                description="Pipes and taps",
+                category="plumbing", price=500, location="Kathmandu",
+            )
+            cls.provider_ids.append(provider.id)
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, query):
+        """Provider ids of every page, following the next-page links."""
+        seen = []
+        url = reverse("search_services") + query
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            page = [item["provider"].id for item in response.context["providers_with_services"]]
+            self.assertLessEqual(len(page), search.PAGE_SIZE)
+            seen += page
+            next_query = response.context["next_query"]
+            url = reverse("search_services") + "?" + next_query if next_query else None
+        return seen
+
+    def test_pages_cover_every_provider_once(self):
+        for query in ("?", "?q=pipe", "?location=kathmandu", "?near=27.70,85.32&radius=10"):
+            seen = self.walk(query)
+            self.assertEqual(len(seen), len(set(seen)), query)
+            self.assertEqual(sorted(seen), sorted(self.provider_ids), query)
+
+    def test_relevance_order_is_kept_across_pages(self):
+        seen = self.walk("?q=pipe")
+        # Providers with "pipe" in the service name outrank description-only matches
+        named = [pk for i, pk in enumerate(self.provider_ids) if i % 2]
+        self.assertEqual(sorted(seen[:len(named)]), sorted(named))
+
+    def test_nearest_first_across_pages(self):
+        self.assertEqual(self.walk("?near=27.70,85.32&radius=10"), self.provider_ids)
+
+    def test_cursor_round_trip(self):
+        for key, provider_id in ((-3.0, 7), (1.2345678901234, 42), (0, 1)):
+            cursor = search.decode_cursor(search.encode_cursor(key, provider_id))
+            self.assertEqual(cursor, (key, provider_id))
+        for value in ("", "junk", "1:2:3", "x:1", "1.5:y"):
+            self.assertIsNone(search.decode_cursor(value), value)
+
+
+# ==============================
+# CONDITIONAL GET
+# ==============================
+
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="provider@example.com", password="pw", first_name="Pat")
+        cls.provider = Profile.objects.create(
+            user=user, role="provider", is_verified=True, location="Kathmandu"
+        )
+        cls.category = ProviderCategory.objects.create(
+            provider=cls.provider, category="plumbing", is_verified=True
+        )
+        cls.service = Service.objects.create(
+            provider=cls.provider, name="Pipe repair", description="Leaking pipes fixed",
+            category="plumbing", price=500, location="Kathmandu",
+        )
+        cls.customer = User.objects.create_user(username="customer@example.com", password="pw")
+        Profile.objects.create(user=cls.customer, role="customer", is_verified=True)
+
+    def setUp(self):
+        cache.clear()
+        self.urls = [
+            reverse("service_categories"),
+            reverse("providers_by_category", args=["plumbing"]),
+            reverse("provider_profile", args=[self.provider.id]),
+            reverse("search_services") + "?q=pipe",
+        ]
+
+    def etags(self):
+        return {url: self.client.get(url)["ETag"] for url in self.urls}
+
+    def test_repeat_get_is_not_modified(self):
+        for url, etag in self.etags().items():
+            with self.assertNumQueries(0):
+                response = self.client.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response.content, b"", url)
+
+    def assert_changes(self, write, *urls):
+        before = self.etags()
+        write()
+        after = self.etags()
+        for url in urls:
+            self.assertNotEqual(before[url], after[url], url)
+
+    def test_service_write_changes_etag(self):
+        def write():
+            self.service.price = 600
+            self.service.save()
+        self.assert_changes(write, self.urls[2], self.urls[3])
+
+    def test_profile_write_changes_etag(self):
+        def write():
+            self.provider.location = "Lalitpur"
+            self.provider.save()
+        self.assert_changes(write, *self.urls)
+
+    def test_provider_category_write_changes_etag(self):
+        def write():
+            ProviderCategory.objects.create(provider=self.provider, category="painting", is_verified=True)
+        self.assert_changes(write, self.urls[0], self.urls[2])
+
+    def test_deploy_changes_etag(self):
+        before = self.etags()
+        with mock.patch.object(conditional, "build_id", return_value="next-release:0123"):
+            after = self.etags()
+        for url in self.urls:
+            self.assertNotEqual(before[url], after[url], url)
+
+    def test_each_search_gets_its_own_etag(self):
+        url = reverse("search_services")
+        etags = {
+            query: self.client.get(url + query)["ETag"]
+            for query in ["?q=pipe", "?q=zzz", "?q=pipe&location=kathmandu",
+                          "?q=pipe&after=-3.0:1", "?q=pipe&near=27.7,85.3"]
+        }
+        self.assertEqual(len(set(etags.values())), len(etags), etags)
+        # Queries with the same terms are the same page
+        self.assertEqual(self.client.get(url + "?q=+PIPE+")["ETag"], etags["?q=pipe"])
+
+        response = self.client.get(url + "?q=zzz", headers={"If-None-Match": etags["?q=pipe"]})
+        self.assertEqual(response.status_code, 200)
+
+        url = reverse("providers_by_category", args=["plumbing"])
+        self.assertNotEqual(self.client.get(url)["ETag"], self.client.get(url + "?near=27.7,85.3")["ETag"])
+
+    def test_viewers_get_their_own_etag_and_cache_control(self):
+        anonymous = {url: self.client.get(url) for url in self.urls}
+        self.client.force_login(self.customer)
+        for url, response in anonymous.items():
+            logged_in = self.client.get(url)
+            self.assertNotEqual(response["ETag"], logged_in["ETag"], url)
+            self.assertIn("public", response["Cache-Control"])
+            self.assertIn("s-maxage=60", response["Cache-Control"])
+            self.assertIn("private", logged_in["Cache-Control"])
+            self.assertIn("no-cache", logged_in["Cache-Control"])
+            # The anonymous ETag does not revalidate the logged-in page
+            revalidated = self.client.get(url, headers={"If-None-Match": response["ETag"]})
+            self.assertEqual(revalidated.status_code, 200, url)
+
+
+# ==============================
+# CATALOG CACHE
+# ==============================
+
+class CatalogCacheTests(SimpleTestCase):
+    # Namespaces are unique per test instead of clearing the cache, so
+    # entries left by other tests are part of what is checked
+
+    def setUp(self):
+        self.prefix = f"test:{uuid.uuid4().hex}"
+        self.calls = []
+
+    def compute(self, namespace, *parts):
+        def compute():
+            self.calls.append((namespace, parts))
+            return f"result {len(self.calls)}"
+        return caching.get_or_compute(namespace, parts, compute)
+
+    def test_results_are_cached_per_parts(self):
+        namespace = f"{self.prefix}:search"
+        self.assertEqual(self.compute(namespace, "pipe"), "result 1")
+        self.assertEqual(self.compute(namespace, "pipe"), "result 1")
+        self.assertEqual(self.compute(namespace, "paint"), "result 2")
+        self.assertEqual(len(self.calls), 2)
+
+    def test_bump_invalidates_only_its_namespaces(self):
+        search_ns, categories_ns, other_ns = (f"{self.prefix}:{n}" for n in ("search", "categories", "other"))
+        for namespace in (search_ns, categories_ns, other_ns):
+            self.compute(namespace, "q")
+
+        caching.bump(search_ns, categories_ns)
+        self.assertEqual(self.compute(search_ns, "q"), "result 4")
+        self.assertEqual(self.compute(categories_ns, "q"), "result 5")
+        self.assertEqual(self.compute(other_ns, "q"), "result 3")
+
+    def test_category_namespaces_are_independent(self):
+        plumbing = caching.category_namespace(f"{self.prefix}-plumbing")
+        painting = caching.category_namespace(f"{self.prefix}-painting")
+        self.compute(plumbing, "page")
+        self.compute(painting, "page")
+
+        caching.bump(plumbing)
+        self.compute(plumbing, "page")
+        self.compute(painting, "page")
+        self.assertEqual([ns for ns, _ in self.calls], [plumbing, painting, plumbing])
+
+    def test_evicted_version_does_not_revive_old_entries(self):
+        namespace = f"{self.prefix}:search"
+        self.compute(namespace, "q")
+        before = caching.version(namespace)
+
+        cache.delete(f"catalog:version:{namespace}")
+        self.assertGreater(caching.version(namespace), before)
+        self.assertEqual(self.compute(namespace, "q"), "result 2")
+
+    def test_provider_versions(self):
+        # Ids no real provider has
+        first, second = -1, -2
+        versions = caching.provider_versions([first, second])
+        self.assertEqual(caching.provider_versions([first, second]), versions)
+
+        caching.bump(caching.provider_namespace(first))
+        bumped = caching.provider_versions([first, second])
+        self.assertGreater(bumped[first], versions[first])
+        self.assertEqual(bumped[second], versions[second])
+
+
+# ==============================
+# PROVIDER CARD FRAGMENTS
+# ==============================
+
+STALE_CARD = "<p>stale card</p>"
+
+
+class ProviderCardCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="provider@example.com", password="pw", first_name="Pat")
+        cls.provider = Profile.objects.create(
+            user=user, role="provider", is_verified=True, location="Kathmandu"
+        )
+        ProviderCategory.objects.create(provider=cls.provider, category="plumbing", is_verified=True)
+        cls.service = Service.objects.create(
+            provider=cls.provider, name="Pipe repair", description="Leaking pipes fixed",
+            category="plumbing", price=500, location="Kathmandu",
+        )
+        other_user = User.objects.create_user(username="other@example.com", password="pw")
+        cls.other = Profile.objects.create(user=other_user, role="provider", is_verified=True)
+
+    def setUp(self):
+        cache.clear()
+        caches["template_fragments"].clear()
+
+    def version(self, provider):
+        return caching.provider_versions([provider.id])[provider.id]
+
+    def test_writes_bump_the_provider_version(self):
+        def rename():
+            self.provider.user.first_name = "Patricia"
+            self.provider.user.save()
+
+        def relocate():
+            self.provider.location = "Lalitpur"
+            self.provider.save()
+
+        def reprice():
+            self.service.price = 600
+            self.service.save()
+
+        def add_category():
+            ProviderCategory.objects.create(provider=self.provider, category="painting")
+
+        for write in (rename, relocate, reprice, add_category):
+            before, other = self.version(self.provider), self.version(self.other)
+            write()
+            self.assertNotEqual(self.version(self.provider), before, write.__name__)
+            self.assertEqual(self.version(self.other), other, write.__name__)
+
+    def assert_cached_until_bumped(self, url, fragment, *vary_on):
+        """The page shows its cached card until the provider's version changes."""
+        self.client.get(url)
+        key = make_template_fragment_key(fragment, [self.provider.id, self.version(self.provider), *vary_on])
+        self.assertIsNotNone(caches["template_fragments"].get(key), fragment)
+        caches["template_fragments"].set(key, STALE_CARD)
+        self.assertContains(self.client.get(url), STALE_CARD)
+
+        self.provider.user.first_name = "Patricia"
+        self.provider.user.save()
+        response = self.client.get(url)
+        self.assertNotContains(response, STALE_CARD)
+        self.assertContains(response, "Patricia")
+
+    def test_search_card(self):
+        self.assert_cached_until_bumped(
+            reverse("search_services") + "?q=pipe", "search_provider_card", self.service.id, ""
+        )
+
+    def test_category_card(self):
+        self.assert_cached_until_bumped(
+            reverse("providers_by_category", args=["plumbing"]), "category_provider_card", ""
+        )
+
+    def test_profile_header(self):
+        self.assert_cached_until_bumped(
+            reverse("provider_profile", args=[self.provider.id]), "profile_provider_header"
+        )
+
+    def test_profile_services_are_not_queried_on_a_hit(self):
+        url = reverse("provider_profile", args=[self.provider.id])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertContains(self.client.get(url), "Pipe repair")
+        self.assertFalse(any('FROM "booking_service"' in q["sql"] for q in queries))
+
+
+# ==============================
+# BOOKING STATS
+# ==============================
+
+class BookingStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.provider_user, (cls.booking,) = create_conversation()
+        cls.provider = cls.provider_user.profile
+
+    def counts(self):
+        stats = ProviderBookingStats.for_provider(self.provider)
+        return {
+            status: getattr(stats, ProviderBookingStats.counter_for(status))
+            for status, _ in Booking.STATUS_CHOICES
+            if getattr(stats, ProviderBookingStats.counter_for(status))
+        }
+
+    def set_status(self, booking, status):
+        booking.status = status
+        booking.save()
+
+    def test_status_transitions(self):
+        self.assertEqual(self.counts(), {"pending": 1})
+
+        self.set_status(self.booking, "approved")
+        self.assertEqual(self.counts(), {"approved": 1})
+        self.set_status(self.booking, "completed")
+        self.assertEqual(self.counts(), {"completed": 1})
+
+        cancelled = Booking.objects.create(customer=self.customer, service=self.booking.service)
+        self.set_status(cancelled, "cancelled")
+        self.assertEqual(self.counts(), {"completed": 1, "cancelled": 1})
+
+        # Saving without a status change counts nothing
+        self.booking.location = "Lalitpur"
+        self.booking.save()
+        self.assertEqual(self.counts(), {"completed": 1, "cancelled": 1})
+
+        cancelled.delete()
+        self.assertEqual(self.counts(), {"completed": 1})
+
+    def test_deleting_the_service_uncounts_its_bookings(self):
+        Booking.objects.create(customer=self.customer, service=self.booking.service)
+        self.booking.service.delete()
+        self.assertEqual(self.counts(), {})
+
+    def test_bulk_update_does_not_break_later_saves(self):
+        # .update() skips the signals, so the counters drift
+        Booking.objects.filter(pk=self.booking.pk).update(status="approved")
+        booking = Booking.objects.get(pk=self.booking.pk)
+        self.set_status(booking, "completed")
+        self.assertEqual(self.counts(), {"pending": 1, "completed": 1})
+
+        stats.rebuild_stats()
+        self.assertEqual(self.counts(), {"completed": 1})
+
+    def test_rebuild_stats(self):
+        other = Booking.objects.create(customer=self.customer, service=self.booking.service)
+        Booking.objects.filter(pk=other.pk).update(status="rejected")
+        ProviderBookingStats.objects.all().delete()
+
+        self.assertEqual(stats.rebuild_stats(), 1)
+        self.assertEqual(self.counts(), {"pending": 1, "rejected": 1})
+
+
+# ==============================
+# MESSAGING
+# ==============================
+
+def create_conversation(bookings=1):
+    """A customer, a provider and `bookings` bookings between them."""
+    customer = User.objects.create_user(username="customer@example.com", password="pw", first_name="Cara")
+    Profile.objects.create(user=customer, role="customer", is_verified=True)
+    provider_user = User.objects.create_user(username="provider@example.com", password="pw", first_name="Pat")
+    provider = Profile.objects.create(user=provider_user, role="provider", is_verified=True)
+    service = Service.objects.create(
+        provider=provider, name="Pipe repair", description="Leaking pipes fixed",
+        category="plumbing", price=500, location="Kathmandu",
+    )
+    created = [Booking.objects.create(customer=customer, service=service) for _ in range(bookings)]
+    return customer, provider_user, created
+
+
+class ConversationSummaryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.provider_user, (cls.booking,) = create_conversation()
+
+    def summary(self):
+        return ConversationSummary.objects.get(booking=self.booking)
+
+    def test_new_booking_has_an_empty_summary(self):
+        summary = self.summary()
+        self.assertIsNone(summary.last_message_id)
+        self.assertEqual((summary.customer_unread, summary.provider_unread), (0, 0))
+
+    def test_messages_update_the_summary(self):
+        Message.objects.create(booking=self.booking, sender=self.customer, content="Hello")
+        Message.objects.create(booking=self.booking, sender=self.customer, content="x" * 300)
+        Message.objects.create(booking=self.booking, sender=self.provider_user, content="Hi")
+
+        summary = self.summary()
+        self.assertEqual(summary.last_message_snippet, "Hi")
+        self.assertEqual((summary.customer_unread, summary.provider_unread), (1, 2))
+
+        Message.objects.create(booking=self.booking, sender=self.provider_user, content="y" * 300)
+        self.assertEqual(len(self.summary().last_message_snippet), conversations.SNIPPET_LENGTH)
+
+    def test_reading_the_conversation_clears_unread(self):
+        Message.objects.create(booking=self.booking, sender=self.customer, content="Hello")
+        self.client.force_login(self.provider_user)
+        self.client.get(reverse("view_messages", args=[self.booking.id]))
+        summary = self.summary()
+        self.assertEqual((summary.customer_unread, summary.provider_unread), (0, 0))
+        self.assertFalse(Message.objects.filter(is_read=False).exists())
+
+    def test_inbox_shows_summaries(self):
+        Message.objects.create(booking=self.booking, sender=self.customer, content="Hello")
+        for user, unread in ((self.customer, 0), (self.provider_user, 1)):
+            self.client.force_login(user)
+            response = self.client.get(reverse("messages_inbox"))
+            (conversation,) = response.context["conversations"]
+            self.assertEqual(conversation["booking"], self.booking)
+            self.assertEqual(conversation["last_message"]["content"], "Hello")
+            self.assertEqual(conversation["unread_count"], unread)
+
+
+class InboxQueryTests(TestCase):
+
+    def inbox_queries(self, user):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("messages_inbox"))
+        return len(queries)
+
+    def test_inbox_query_count_does_not_grow_with_conversations(self):
+        customer, provider_user, bookings = create_conversation(bookings=2)
+        for booking in bookings:
+            Message.objects.create(booking=booking, sender=customer, content="Hello")
+        few = self.inbox_queries(customer), self.inbox_queries(provider_user)
+
+        service = bookings[0].service
+        for _ in range(6):
+            booking = Booking.objects.create(customer=customer, service=service)
+            Message.objects.create(booking=booking, sender=provider_user, content="Hi")
+        self.assertEqual((self.inbox_queries(customer), self.inbox_queries(provider_user)), few)
+
+    def test_inbox_pages(self):
+        customer, _, bookings = create_conversation(bookings=pagination.PAGE_SIZE + 3)
+        self.client.force_login(customer)
+
+        first = self.client.get(reverse("messages_inbox"))
+        cursor = first.context["next_cursor"]
+        self.assertIsNotNone(cursor)
+        second = self.client.get(reverse("messages_inbox") + f"?before={cursor}")
+        self.assertIsNone(second.context["next_cursor"])
+
+        seen = [c["booking"].id for c in first.context["conversations"] + second.context["conversations"]]
+        self.assertEqual(seen, [booking.id for booking in reversed(bookings)])
+
+
+class RealtimeBackendTests(SimpleTestCase):
+
+    def exchange(self, backend):
+        """Publish to two channels and read what one subscriber receives."""
+        async def run():
+            subscription = backend.subscribe("booking:1")
+            try:
+                # Published from another thread, as sync views do
+                await asyncio.to_thread(backend.publish, "booking:2", {"id": 1})
+                await asyncio.to_thread(backend.publish, "booking:1", {"id": 2})
+                received = await subscription.get(timeout=2)
+                idle = await subscription.get(timeout=0.1)
+            finally:
+                subscription.close()
+            return received, idle
+        return asyncio.run(run())
+
+    def test_in_process_backend(self):
+        self.assertEqual(self.exchange(realtime.InProcessBackend()), ({"id": 2}, None))
+
+    def test_sqlite_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            backend = realtime.SQLiteBackend(path=os.path.join(directory, "broker.sqlite3"), poll_interval=0.01)
+            self.assertEqual(self.exchange(backend), ({"id": 2}, None))
+
+    def test_format_event(self):
+        frame = realtime.format_event({"id": 7, "content": "Hi"})
+        self.assertEqual(frame, 'id: 7\nevent: message\ndata: {"id": 7, "content": "Hi"}\n\n')
+
+
+class MessageStreamTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.provider_user, (cls.booking,) = create_conversation()
+
+    def test_new_messages_are_published_on_commit(self):
+        with mock.patch.object(realtime, "get_broker") as get_broker:
+            with self.captureOnCommitCallbacks(execute=True):
+                message = Message.objects.create(booking=self.booking, sender=self.customer, content="Hi")
+                get_broker.return_value.publish.assert_not_called()
+
+        get_broker.return_value.publish.assert_called_once_with(
+            realtime.channel_for(self.booking.id), realtime.serialize_message(message)
+        )
+
+    async def test_stream_catches_up_then_follows(self):
+        first = await Message.objects.acreate(booking=self.booking, sender=self.customer, content="One")
+        second = await Message.objects.acreate(booking=self.booking, sender=self.customer, content="Two")
+        second = await Message.objects.select_related("sender").aget(pk=second.pk)
+
+        events = realtime.message_events(self.booking.id, after=first.id)
+        try:
+            # Missed messages come from the database
+            self.assertEqual(await anext(events), realtime.format_event(realtime.serialize_message(second)))
+
+            # Then published ones, skipping any already sent
+            channel = realtime.channel_for(self.booking.id)
+            realtime.get_broker().publish(channel, {"id": second.id})
+            realtime.get_broker().publish(channel, {"id": second.id + 1})
+            self.assertEqual(await anext(events), realtime.format_event({"id": second.id + 1}))
+
+            with mock.patch.object(realtime, "HEARTBEAT_INTERVAL", 0.01):
+                self.assertEqual(await anext(events), ": keep-alive\n\n")
+        finally:
+            await events.aclose()
+
+    async def test_stream_view(self):
+        url = reverse("message_stream", args=[self.booking.id])
+
+        await self.async_client.aforce_login(self.provider_user)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+
+        stranger = await User.objects.acreate_user(username="stranger@example.com", password="pw")
+        await self.async_client.aforce_login(stranger)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 403)
+
+        response = await self.async_client.get(reverse("message_stream", args=[self.booking.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_no_stream_under_wsgi(self):
+        # The sync client is a WSGI request: the stream is refused at once
+        # instead of holding the worker, and the chat page polls instead
+        self.client.force_login(self.customer)
+        response = self.client.get(reverse("message_stream", args=[self.booking.id]))
+        self.assertEqual(response.status_code, 501)
+        self.assertFalse(response.streaming)
+
+        response = self.client.get(reverse("view_messages", args=[self.booking.id]))
+        self.assertFalse(response.context["live_stream"])
+        self.assertNotContains(response, reverse("message_stream", args=[self.booking.id]))
+        self.assertContains(response, reverse("messages_since", args=[self.booking.id]))
+
+    async def test_chat_page_streams_under_asgi(self):
+        await self.async_client.aforce_login(self.customer)
+        response = await self.async_client.get(reverse("view_messages", args=[self.booking.id]))
+        self.assertTrue(response.context["live_stream"])
+
+
+class ConversationPagingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.provider_user, (cls.booking,) = create_conversation()
+        Message.objects.bulk_create(
+            Message(booking=cls.booking, sender=cls.customer, content=f"Message {i}")
+            for i in range(views.MESSAGES_PAGE_SIZE * 2 + 5)
+        )
+        # Ties on created_at are broken by id
+        Message.objects.filter(id__gt=Message.objects.order_by("id")[20].id).update(
+            created_at=timezone.now()
+        )
+        cls.message_ids = list(Message.objects.order_by("id").values_list("id", flat=True))
+
+    def setUp(self):
+        self.client.force_login(self.provider_user)
+
+    def test_cursor_round_trip(self):
+        created_at = timezone.now()
+        cursor = pagination.encode_cursor(created_at, 42)
+        self.assertEqual(pagination.decode_cursor(cursor), (created_at, 42))
+        for value in ("", "junk", "1.2.3", "x.1", "99999999999999999999.1"):
+            self.assertIsNone(pagination.decode_cursor(value), value)
+
+    def test_paging_back_through_the_conversation(self):
+        url = reverse("view_messages", args=[self.booking.id])
+        response = self.client.get(url)
+        self.assertTrue(response.context["is_latest_page"])
+        self.assertEqual(response.context["last_message_id"], self.message_ids[-1])
+
+        pages = []
+        while response is not None:
+            page = [message.id for message in response.context["conversation"]]
+            self.assertLessEqual(len(page), views.MESSAGES_PAGE_SIZE)
+            pages.insert(0, page)
+            cursor = response.context["older_cursor"]
+            response = self.client.get(url + f"?before={cursor}") if cursor else None
+
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(sum(pages, []), self.message_ids)
+
+    def test_messages_since(self):
+        url = reverse("messages_since", args=[self.booking.id])
+
+        data = self.client.get(url + f"?after={self.message_ids[-3]}").json()
+        self.assertEqual([m["id"] for m in data["messages"]], self.message_ids[-2:])
+        self.assertFalse(data["has_more"])
+
+        data = self.client.get(url + "?after=junk").json()
+        self.assertEqual([m["id"] for m in data["messages"]], self.message_ids[:views.MESSAGES_PAGE_SIZE])
+        self.assertTrue(data["has_more"])
+
+        stranger = User.objects.create_user(username="stranger@example.com", password="pw")
+        self.client.force_login(stranger)
+        self.assertEqual(self.client.get(url).status_code, 403)
@@ -37,6 +37,9 @@ urlpatterns = [
     # =====================
     path("messages/", views.messages_inbox, name="messages_inbox"),
     path("messages/<int:booking_id>/", views.view_messages, name="view_messages"),
+    path("messages/<int:booking_id>/since/", views.messages_since, name="messages_since"),
+    path("messages/<int:booking_id>/send/", views.send_message, name="send_message"),
+    path("messages/<int:booking_id>/stream/", views.message_stream, name="message_stream"),
 
 
 ]
@@ -2,41 +2,75 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.views.decorators.http import require_POST
-from django.db.models import Q
+from django.db.models import Count, Q
+from django.http import Http404, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 
-from .models import Service, Booking, Message
-from account.models import Profile
+from .models import Service, Booking, Message, ProviderBookingStats, ConversationSummary
+from . import caching, conversations, pagination, realtime, search
+from .conditional import catalog_page, page_etag
+from account.models import CategoryListing, Profile
+from account import geo
 
 
 
 # PUBLIC: SEARCH SERVICES (No Login Required)
 
-def search_services(request):
-    """Search services by name/category and location, grouped by provider"""
-    search_query = request.GET.get('q', '').strip()
-    location_query = request.GET.get('location', '').strip()
-    
+def _search_page(search_query, location_query, near, after):
+    """
+    One page of search results as (providers_with_services, next_cursor).
+    next_cursor is None on the last page.
+    """
     # Start with active services from verified providers
     services = Service.objects.filter(
         is_active=True,
         provider__is_verified=True
     ).select_related('provider__user')
-    
-    # Filter by search query (service name or category)
-    if search_query:
-        services = services.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(category__icontains=search_query)
-        )
-    
-    # Filter by location
-    if location_query:
-        services = services.filter(
-            Q(location__icontains=location_query) |
-            Q(provider__location__icontains=location_query)
-        )
-    
+
+    # Match query and location terms against the search index
+    matches = search.match_services(search_query, location_query)
+    if matches is not None and matches.query.is_empty():
+        # Only punctuation was typed: no terms, so nothing can match
+        return [], None
+
+    # Pick one page of providers as (sort key, provider id), continuing
+    # after the cursor so pages stay stable while providers are added
+    distances = None
+    if near:
+        # Nearest first: the candidate set is bounded by the radius
+        distances = dict(geo.providers_near(*near))
+        if matches is not None:
+            candidate_ids = {row['provider_id'] for row in matches.filter(provider_id__in=distances)}
+        else:
+            candidate_ids = set(services.filter(
+                provider_id__in=distances
+            ).values_list('provider_id', flat=True))
+        page = sorted((distances[pk], pk) for pk in candidate_ids)
+        if after:
+            page = [entry for entry in page if entry > after]
+        page = page[:search.PAGE_SIZE + 1]
+    elif matches is not None:
+        # Most relevant first, grouped and limited by the database
+        page = search.rank_providers(matches, after, search.PAGE_SIZE + 1)
+    else:
+        providers = Profile.objects.filter(
+            is_verified=True,
+            services__is_active=True
+        ).distinct().order_by('id')
+        if after:
+            providers = providers.filter(id__gt=after[1])
+        page = [(0, pk) for pk in providers.values_list('id', flat=True)[:search.PAGE_SIZE + 1]]
+
+    has_next = len(page) > search.PAGE_SIZE
+    page = page[:search.PAGE_SIZE]
+    page_ids = [pk for _, pk in page]
+
+    # Fetch only the services of the providers on this page
+    services = services.filter(provider_id__in=page_ids)
+    if matches is not None:
+        ranked_ids = [row['service_id'] for row in matches.filter(provider_id__in=page_ids)]
+        services_by_id = services.in_bulk(ranked_ids)
+        services = [services_by_id[pk] for pk in ranked_ids if pk in services_by_id]
+
     # Group services by provider
     providers_dict = {}
     for service in services:
@@ -48,14 +82,77 @@ def search_services(request):
             }
         providers_dict[provider_id]['services'].append(service)
     
-    # Convert to list for template
-    providers_with_services = list(providers_dict.values())
+    # Convert to list for template, in page order
+    providers_with_services = [providers_dict[pk] for pk in page_ids if pk in providers_dict]
+
+    if distances is not None:
+        for item in providers_with_services:
+            item['distance'] = distances[item['provider'].id]
+
+    next_cursor = search.encode_cursor(*page[-1]) if has_next else None
+    return providers_with_services, next_cursor
+
+
+def _search_params(request):
+    """(search_query, location_query, near, after) of a search request."""
+    return (
+        request.GET.get('q', '').strip(),
+        request.GET.get('location', '').strip(),
+        geo.parse_near(request.GET.get('near', ''), request.GET.get('radius')),
+        search.decode_cursor(request.GET.get('after', '')),
+    )
+
+
+def _search_key(search_query, location_query, near, after):
+    """What a search page depends on, besides the index itself."""
+    return (search.normalize_query(search_query), search.normalize_query(location_query), near, after)
+
+
+def _search_etag(request):
+    return page_etag(request, caching.version("search"), _search_key(*_search_params(request)))
+
+
+@catalog_page(_search_etag)
+def search_services(request):
+    """Search services by name/category and location, grouped by provider"""
+    search_query, location_query, near, after = _search_params(request)
+
+    # Identical searches share one cached result until a service or
+    # provider changes
+    providers_with_services, next_cursor = caching.get_or_compute(
+        "search",
+        _search_key(search_query, location_query, near, after),
+        lambda: _search_page(search_query, location_query, near, after),
+    )
+
+    # Provider cards are cached fragments, keyed on the provider's version
+    # and on what this search shows of it
+    versions = caching.provider_versions(item['provider'].id for item in providers_with_services)
+    cards = [
+        dict(
+            item,
+            version=versions[item['provider'].id],
+            service_ids=",".join(str(service.id) for service in item['services']),
+        )
+        for item in providers_with_services
+    ]
+
+    # Link to the next page, keeping the other search parameters
+    next_query = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['after'] = next_cursor
+        next_query = params.urlencode()
     
     context = {
-        'providers_with_services': providers_with_services,
+        'providers_with_services': cards,
         'search_query': search_query,
         'location_query': location_query,
-        'total_results': len(providers_with_services)
+        'near': request.GET.get('near', '') if near else '',
+        'radius': near[2] if near else '',
+        'total_results': len(providers_with_services),
+        'next_query': next_query,
+        'is_first_page': after is None,
     }
     
     return render(request, "booking/search_results.html", context)
@@ -64,6 +161,17 @@ def search_services(request):
 # =====================================================
 # PUBLIC: SERVICE CATEGORIES PAGE (No Login Required)
 # 
+def _category_counts():
+    return dict(
+        CategoryListing.objects.values_list('category').annotate(count=Count('id'))
+    )
+
+
+def _categories_etag(request):
+    return page_etag(request, caching.version("categories"))
+
+
+@catalog_page(_categories_etag)
 def service_categories(request):
     """Public view - anyone can browse service categories"""
     categories = [
@@ -75,28 +183,57 @@ def service_categories(request):
         ("ac_repair", "AC Repair"),
     ]
 
+    # Verified providers per category
+    category_counts = caching.get_or_compute("categories", (), _category_counts)
+
     return render(request, "booking/service_categories.html", {
-        "categories": categories
+        "categories": categories,
+        "category_counts": category_counts,
     })
 
 
 # PUBLIC: PROVIDERS BY CATEGORY (No Login Required)
+def _category_providers(category, near):
+    # Listings only hold verified providers, with their display fields
+    listings = CategoryListing.objects.filter(category=category).order_by('provider_id')
+
+    if not near:
+        return list(listings)
+
+    # Only providers within the requested radius, nearest first
+    nearby = geo.providers_near(*near)
+    listings_by_provider = {
+        listing.provider_id: listing
+        for listing in listings.filter(provider_id__in=[pk for pk, _ in nearby])
+    }
+    nearest = []
+    for pk, distance in nearby:
+        if pk in listings_by_provider:
+            listing = listings_by_provider[pk]
+            listing.distance = distance
+            nearest.append(listing)
+    return nearest
+
+
+def _category_etag(request, category):
+    near = geo.parse_near(request.GET.get('near', ''), request.GET.get('radius'))
+    return page_etag(request, caching.version(caching.category_namespace(category)), near)
+
+
+@catalog_page(_category_etag)
 def providers_by_category(request, category):
     """Public view - anyone can view providers in a category"""
-    from account.models import ProviderCategory
-    
-    # Get provider IDs that have THIS CATEGORY
-    # Filter by both category and is_verified status
-    provider_ids = ProviderCategory.objects.filter(
-        category=category,
-    ).values_list('provider_id', flat=True)
-    
-    # Get VERIFIED providers with this verified category
-    providers = Profile.objects.filter(
-        id__in=provider_ids,
-        role="provider",
-        is_verified=True  # Only show verified providers
-    ).distinct()
+    near = geo.parse_near(request.GET.get('near', ''), request.GET.get('radius'))
+    providers = caching.get_or_compute(
+        caching.category_namespace(category),
+        (near,),
+        lambda: _category_providers(category, near),
+    )
+
+    # Keys of the cached provider card fragments
+    versions = caching.provider_versions(listing.provider_id for listing in providers)
+    for listing in providers:
+        listing.version = versions[listing.provider_id]
 
     return render(request, "booking/providers_by_category.html", {
         "providers": providers,
@@ -136,7 +273,7 @@ def book_service(request, service_id):
 def customer_dashboard(request):
     bookings = Booking.objects.filter(
         customer=request.user
-    ).order_by("-booking_date")
+    ).select_related("service__provider__user").order_by("-booking_date")
 
     return render(request, "account/customer_dashboard.html", {
         "bookings": bookings
@@ -150,15 +287,23 @@ def customer_dashboard(request):
 def provider_dashboard(request):
     provider = request.user.profile
 
-    bookings = Booking.objects.filter(
-        service__provider=provider
-    ).order_by("-booking_date")
+    # Newest requests first, one page at a time
+    bookings, next_cursor = pagination.page_before(
+        Booking.objects.filter(
+            service__provider=provider
+        ).exclude(status="cancelled").select_related("service", "customer"),
+        "booking_date",
+        pagination.decode_cursor(request.GET.get("before", "")),
+    )
+
+    stats = ProviderBookingStats.for_provider(provider)
 
     context = {
         "bookings": bookings,
-        "pending_count": bookings.filter(status="pending").count(),
-        "active_count": bookings.filter(status="approved").count(),
-        "completed_count": bookings.filter(status="completed").count(),
+        "next_cursor": next_cursor,
+        "pending_count": stats.pending_count,
+        "active_count": stats.approved_count,
+        "completed_count": stats.completed_count,
     }
 
     return render(request, "account/provider_dashboard.html", context)
@@ -308,15 +453,21 @@ def delete_service(request, service_id):
 # =====================================================
 # PUBLIC: VIEW PROVIDER PROFILE (No Login Required)
 # =====================================================
+def _provider_etag(request, provider_id):
+    return page_etag(request, caching.provider_versions([provider_id])[provider_id])
+
+
+@catalog_page(_provider_etag)
 def provider_profile(request, provider_id):
     """Public view - anyone can view provider profile"""
     provider = get_object_or_404(
-        Profile,
+        Profile.objects.select_related("user"),
         id=provider_id,
         role="provider",
         is_verified=True
     )
 
+    # Only evaluated when the cached fragments of the page are missing
     services = Service.objects.filter(
         provider=provider,
         is_active=True
@@ -325,6 +476,7 @@ def provider_profile(request, provider_id):
     return render(request, "booking/provider_profile.html", {
         "provider": provider,
         "services": services,
+        "version": caching.provider_versions([provider.id])[provider.id],
         "is_authenticated": request.user.is_authenticated
     })
 
@@ -334,43 +486,53 @@ def provider_profile(request, provider_id):
 # =====================================================
 @login_required
 def messages_inbox(request):
-    # Get all bookings for the current user
+    # Conversations of the current user, read from their summaries
     if hasattr(request.user, 'profile') and request.user.profile.role == 'provider':
         # Provider: show bookings where they are the service provider
-        bookings = Booking.objects.filter(
-            service__provider=request.user.profile
-        ).order_by('-booking_date').distinct()
+        summaries = ConversationSummary.objects.filter(provider=request.user.profile)
     else:
         # Customer: show their bookings
-        bookings = Booking.objects.filter(
-            customer=request.user
-        ).order_by('-booking_date')
-    
-    # Add last message info to each booking
+        summaries = ConversationSummary.objects.filter(customer=request.user)
+
+    summaries, next_cursor = pagination.page_before(
+        summaries.select_related('booking__service__provider__user'),
+        "booking_date",
+        pagination.decode_cursor(request.GET.get("before", "")),
+    )
+
     conversations = []
-    for booking in bookings:
-        last_message = booking.messages.last()
-        unread_count = booking.messages.filter(
-            is_read=False
-        ).exclude(sender=request.user).count()
-        
+    for summary in summaries:
+        last_message = None
+        if summary.last_message_at:
+            last_message = {
+                'content': summary.last_message_snippet,
+                'created_at': summary.last_message_at,
+            }
+
         conversations.append({
-            'booking': booking,
+            'booking': summary.booking,
             'last_message': last_message,
-            'unread_count': unread_count,
+            'unread_count': summary.unread_for(request.user),
         })
     
     return render(request, "booking/messages_inbox.html", {
         "conversations": conversations,
+        "next_cursor": next_cursor,
     })
 
 
 # =====================================================
 # MESSAGING: VIEW CONVERSATION
 # =====================================================
+MESSAGES_PAGE_SIZE = 50
+
+
 @login_required
 def view_messages(request, booking_id):
-    booking = get_object_or_404(Booking, id=booking_id)
+    booking = get_object_or_404(
+        Booking.objects.select_related("service__provider__user", "customer"),
+        id=booking_id
+    )
     
     # Security check: only customer or provider can view messages
     if request.user != booking.customer and request.user != booking.service.provider.user:
@@ -382,6 +544,7 @@ def view_messages(request, booking_id):
     
     # Mark messages as read for the current user
     conversation.filter(~Q(sender=request.user), is_read=False).update(is_read=True)
+    conversations.mark_read(booking, request.user)
     
     # Handle new message submission
     if request.method == "POST":
@@ -395,12 +558,109 @@ def view_messages(request, booking_id):
             messages.success(request, "Message sent successfully.")
             return redirect("view_messages", booking_id=booking_id)
     
+    # Latest page of the conversation, or an older one when paging back
+    cursor = pagination.decode_cursor(request.GET.get("before", ""))
+    page, older_cursor = pagination.page_before(
+        conversation.select_related("sender"),
+        "created_at",
+        cursor,
+        size=MESSAGES_PAGE_SIZE,
+    )
+    page.reverse()
+
     context = {
         "booking": booking,
-        "conversation": conversation,
+        "conversation": page,
         "is_customer": request.user == booking.customer,
+        "older_cursor": older_cursor,
+        "is_latest_page": cursor is None,
+        "last_message_id": page[-1].id if page else 0,
+        # New messages are streamed under ASGI and polled for under WSGI
+        "live_stream": realtime.can_stream(request),
+        "poll_interval": realtime.POLL_INTERVAL,
     }
     
     return render(request, "booking/messages.html", context)
 
 
+
+
+# =====================================================
+# MESSAGING: NEW MESSAGES SINCE ID (JSON)
+# =====================================================
+@login_required
+def messages_since(request, booking_id):
+    booking = get_object_or_404(Booking.objects.select_related("service__provider"), id=booking_id)
+
+    if request.user.id not in (booking.customer_id, booking.service.provider.user_id):
+        return JsonResponse({"error": "Unauthorized access."}, status=403)
+
+    after = request.GET.get("after", "")
+    after = int(after) if after.isdigit() else 0
+
+    new_messages = list(
+        Message.objects.filter(
+            booking=booking,
+            id__gt=after
+        ).select_related("sender").order_by("id")[:MESSAGES_PAGE_SIZE + 1]
+    )
+
+    return JsonResponse({
+        "messages": [realtime.serialize_message(m) for m in new_messages[:MESSAGES_PAGE_SIZE]],
+        "has_more": len(new_messages) > MESSAGES_PAGE_SIZE,
+    })
+
+
+# =====================================================
+# MESSAGING: SEND WITHOUT RELOAD (JSON)
+# =====================================================
+@login_required
+@require_POST
+def send_message(request, booking_id):
+    booking = get_object_or_404(Booking.objects.select_related("service__provider"), id=booking_id)
+
+    if request.user.id not in (booking.customer_id, booking.service.provider.user_id):
+        return JsonResponse({"error": "Unauthorized access."}, status=403)
+
+    content = request.POST.get("content", "").strip()
+    if not content:
+        return JsonResponse({"error": "Message cannot be empty."}, status=400)
+
+    message = Message.objects.create(
+        booking=booking,
+        sender=request.user,
+        content=content
+    )
+    return JsonResponse(realtime.serialize_message(message), status=201)
+
+
+# =====================================================
+# MESSAGING: LIVE STREAM (SERVER-SENT EVENTS, ASGI)
+# =====================================================
+@login_required
+async def message_stream(request, booking_id):
+    try:
+        booking = await Booking.objects.select_related("service__provider").aget(id=booking_id)
+    except Booking.DoesNotExist:
+        raise Http404("Booking not found.")
+
+    user = await request.auser()
+    if user.id not in (booking.customer_id, booking.service.provider.user_id):
+        return HttpResponseForbidden("Unauthorized access.")
+
+    # A WSGI worker would be held by the endless stream and never send it
+    if not realtime.can_stream(request):
+        return JsonResponse(
+            {"error": "Live updates need the ASGI server; poll messages_since instead."},
+            status=501,
+        )
+
+    # Resume after the last message the client has (reconnects send Last-Event-ID)
+    after = request.headers.get("Last-Event-ID") or request.GET.get("after", "")
+    after = int(after) if after.isdigit() else 0
+
+    return StreamingHttpResponse(
+        realtime.message_events(booking.id, after),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
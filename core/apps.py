@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from .metrics import install_query_timer
+        from .nplusone import install_detector
+        from .slowlog import install_slow_query_log
+        connection_created.connect(install_query_timer)
+        connection_created.connect(install_detector)
+        connection_created.connect(install_slow_query_log)
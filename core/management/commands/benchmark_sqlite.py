@@ -0,0 +1,257 @@
+"""
+Concurrent read/write benchmark for the SQLite database profile.
+
+The database is copied to scratch files, once per profile:
+
+- default: rollback journal, stock pragmas, a new connection per
+  operation (Django's defaults before the production profile);
+- production: settings.SQLITE_PRAGMAS (WAL), BEGIN IMMEDIATE and one
+  persistent connection per thread.
+
+Writer threads alternately create a booking (with its stats counter)
+and post a message (with its conversation summary) while reader threads
+run the service search ranking query. Throughput, p50/p95 latency and
+"database is locked" errors are reported per profile and operation.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from booking import search
+from booking.models import Booking, ConversationSummary, Message, ProviderBookingStats
+
+
+PROFILES = {
+    "default": {
+        "pragmas": {"journal_mode": "DELETE"},
+        "begin": "BEGIN",
+        "persistent": False,
+    },
+    "production": {
+        "pragmas": settings.SQLITE_PRAGMAS,
+        "begin": "BEGIN IMMEDIATE",
+        "persistent": True,
+    },
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Worker(threading.Thread):
+
+    def __init__(self, path, profile, deadline, operation):
+        super().__init__(daemon=True)
+        self.path = path
+        self.profile = profile
+        self.deadline = deadline
+        self.operation = operation
+        self.latencies = {}
+        self.errors = {}
+        self.conn = None
+
+    def connect(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, timeout=5, isolation_level=None,
+                                        check_same_thread=False)
+            for name, value in self.profile["pragmas"].items():
+                self.conn.execute(f"PRAGMA {name}={value}")
+        return self.conn
+
+    def release(self):
+        if not self.profile["persistent"] and self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def run(self):
+        step = 0
+        while time.monotonic() < self.deadline:
+            name, statements = self.operation(step)
+            step += 1
+            started = time.perf_counter()
+            try:
+                conn = self.connect()
+                if len(statements) > 1:
+                    conn.execute(self.profile["begin"])
+                for sql, params in statements:
+                    conn.execute(sql, params).fetchall()
+                if len(statements) > 1:
+                    conn.execute("COMMIT")
+            except sqlite3.OperationalError:
+                if self.conn is not None and self.conn.in_transaction:
+                    self.conn.execute("ROLLBACK")
+                self.errors[name] = self.errors.get(name, 0) + 1
+            else:
+                self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+            finally:
+                self.release()
+        if self.conn is not None:
+            self.conn.close()
+
+
+class Command(BaseCommand):
+    help = "Measure concurrent booking/message writes and search reads per SQLite profile"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=10.0,
+                            help="Duration of each profile run")
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--query", default="",
+                            help="Search terms for readers (default: the most common indexed token)")
+        parser.add_argument("--profile", choices=list(PROFILES), action="append",
+                            help="Profile(s) to run (default: all)")
+        parser.add_argument("--json", dest="json_path",
+                            help="Also write the results to this file as JSON")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The default database is not SQLite.")
+
+        booking = Booking.objects.select_related("service").order_by("-id").first()
+        if booking is None:
+            raise CommandError("The database has no bookings to write messages to; load some data first.")
+
+        query = options["query"] or self.common_token()
+        read_sql, read_params = search.rank_sql(search.match_services(query))
+        read_sql = read_sql.replace("%s", "?")
+
+        writes = self.write_operations(booking)
+
+        def write(step):
+            return writes[step % len(writes)]()
+
+        def read(step):
+            return "search", [(read_sql, read_params)]
+
+        source = str(settings.DATABASES["default"]["NAME"])
+        scratch = tempfile.mkdtemp(prefix="sqlite-bench-")
+        report = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "seconds": options["seconds"],
+            "writers": options["writers"],
+            "readers": options["readers"],
+            "query": query,
+            "profiles": {},
+        }
+        try:
+            for name in options["profile"] or list(PROFILES):
+                path = os.path.join(scratch, f"{name}.sqlite3")
+                self.copy_database(source, path, PROFILES[name])
+                report["profiles"][name] = self.run_profile(path, PROFILES[name], write, read, options)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+        self.print_report(report)
+        if options["json_path"]:
+            with open(options["json_path"], "w") as f:
+                json.dump(report, f, indent=2)
+
+    def common_token(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT token FROM booking_searchtoken WHERE field = 'text' "
+                "GROUP BY token ORDER BY COUNT(*) DESC LIMIT 1"
+            )
+            row = cursor.fetchone()
+        if row is None:
+            raise CommandError("The search index is empty; run rebuild_search_index first.")
+        return row[0]
+
+    def write_operations(self, booking):
+        service = booking.service
+        booking_table = Booking._meta.db_table
+        message_table = Message._meta.db_table
+        stats_table = ProviderBookingStats._meta.db_table
+        summary_table = ConversationSummary._meta.db_table
+
+        def create_booking():
+            now = datetime.now(timezone.utc).isoformat(" ")
+            return "booking", [
+                (f"INSERT INTO {booking_table} (customer_id, service_id, booking_date, "
+                 f"location, status, created_at) VALUES (?, ?, ?, ?, 'pending', ?)",
+                 (booking.customer_id, service.id, now, "Benchmark", now)),
+                (f"UPDATE {stats_table} SET pending_count = pending_count + 1 "
+                 f"WHERE provider_id = ?", (service.provider_id,)),
+            ]
+
+        def send_message():
+            now = datetime.now(timezone.utc).isoformat(" ")
+            return "message", [
+                (f"INSERT INTO {message_table} (booking_id, sender_id, content, is_read, created_at) "
+                 f"VALUES (?, ?, ?, 0, ?)", (booking.id, booking.customer_id, "Benchmark", now)),
+                (f"UPDATE {summary_table} SET last_message_at = ?, "
+                 f"provider_unread = provider_unread + 1 WHERE booking_id = ?", (now, booking.id)),
+            ]
+
+        return [create_booking, send_message]
+
+    def copy_database(self, source, path, profile):
+        src = sqlite3.connect(source)
+        dst = sqlite3.connect(path)
+        try:
+            src.backup(dst)
+            dst.execute(f"PRAGMA journal_mode={profile['pragmas'].get('journal_mode', 'DELETE')}")
+        finally:
+            src.close()
+            dst.close()
+
+    def run_profile(self, path, profile, write, read, options):
+        deadline = time.monotonic() + options["seconds"]
+        workers = (
+            [Worker(path, profile, deadline, write) for _ in range(options["writers"])]
+            + [Worker(path, profile, deadline, read) for _ in range(options["readers"])]
+        )
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        results = {}
+        for worker in workers:
+            for name, latencies in worker.latencies.items():
+                results.setdefault(name, {"latencies": [], "errors": 0})["latencies"] += latencies
+            for name, errors in worker.errors.items():
+                results.setdefault(name, {"latencies": [], "errors": 0})["errors"] += errors
+
+        return {
+            name: {
+                "ops": len(result["latencies"]),
+                "ops_per_second": round(len(result["latencies"]) / options["seconds"], 1),
+                "errors": result["errors"],
+                "p50_ms": self.ms(percentile(result["latencies"], 50)),
+                "p95_ms": self.ms(percentile(result["latencies"], 95)),
+                "mean_ms": self.ms(statistics.fmean(result["latencies"]) if result["latencies"] else None),
+            }
+            for name, result in sorted(results.items())
+        }
+
+    def ms(self, seconds):
+        return None if seconds is None else round(seconds * 1000, 2)
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{report['writers']} writer(s), {report['readers']} reader(s), "
+            f"{report['seconds']}s per profile, query {report['query']!r}"
+        )
+        self.stdout.write(f"{'profile':<12}{'op':<10}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+        for profile, results in report["profiles"].items():
+            for op, result in results.items():
+                self.stdout.write(
+                    f"{profile:<12}{op:<10}{result['ops_per_second']:>10}"
+                    f"{str(result['p50_ms']):>10}{str(result['p95_ms']):>10}{result['errors']:>8}"
+                )
@@ -0,0 +1,311 @@
+"""
+Generate a synthetic dataset for capacity planning.
+
+Rows are built in memory and written with bulk_create, one transaction
+per batch, so the signal handlers that maintain the derived tables do
+not run. Conversation summaries are written alongside their messages;
+the search index, category listings and booking stats are rebuilt once
+at the end. The same --seed on the same starting database produces the
+same data.
+"""
+import math
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from account import geo, listings
+from account.models import Profile, ProviderCategory
+from booking import caching, search, stats
+from booking.conversations import SNIPPET_LENGTH
+from booking.models import CATEGORY_CHOICES, Booking, ConversationSummary, Message, Service
+
+
+CATEGORIES = [category for category, _ in CATEGORY_CHOICES]
+STATUSES = [status for status, _ in Booking.STATUS_CHOICES]
+
+AREAS = ["Kathmandu", "Lalitpur", "Bhaktapur", "Kirtipur", "Thimi", "Budhanilkantha"]
+SERVICE_WORDS = {
+    "plumbing": ["Pipe repair", "Leak fixing", "Tap installation", "Drain cleaning"],
+    "electrical": ["Wiring", "Fan installation", "Switch repair", "Inverter setup"],
+    "cleaning": ["Deep cleaning", "Sofa cleaning", "Kitchen cleaning", "Office cleaning"],
+    "carpentry": ["Furniture repair", "Door fitting", "Cabinet making", "Shelf installation"],
+    "painting": ["Wall painting", "Waterproofing", "Texture painting", "Wood polish"],
+    "ac_repair": ["AC servicing", "Gas refill", "AC installation", "Cooling repair"],
+}
+MESSAGES = [
+    "Hello, is this time still available?",
+    "Yes, I can come then.",
+    "Please bring the tools for the job.",
+    "I will be there in 30 minutes.",
+    "Thank you, the work is done.",
+    "Can we move it to tomorrow?",
+]
+
+
+def parse_weights(value, names):
+    """Parse "a=3,b=1" into weights in the order of `names` (missing names weigh 0)."""
+    weights = dict.fromkeys(names, 0.0)
+    try:
+        for part in value.split(","):
+            name, weight = part.split("=")
+            if name.strip() not in weights:
+                raise ValueError(name)
+            weights[name.strip()] = float(weight)
+    except ValueError:
+        raise CommandError(f"Invalid weights {value!r}; expected e.g. {names[0]}=3,{names[1]}=1")
+    return [weights[name] for name in names]
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep the given auto_now_add values instead of using now()."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = "Fill the database with synthetic users, providers, services, bookings and messages"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=1000)
+        parser.add_argument("--providers", type=int, default=100)
+        parser.add_argument("--bookings", type=int, default=10000)
+        parser.add_argument("--services-per-provider", type=int, default=3,
+                            help="Maximum services per provider (each has 1 to this many)")
+        parser.add_argument("--messages-per-booking", type=float, default=3.0,
+                            help="Average message thread length")
+        parser.add_argument("--verified-ratio", type=float, default=0.9,
+                            help="Share of providers that are verified")
+        parser.add_argument("--status-weights",
+                            default="pending=20,approved=20,rejected=10,completed=40,cancelled=10",
+                            help="Relative frequency of each booking status")
+        parser.add_argument("--popularity-skew", type=float, default=1.2,
+                            help="Pareto shape of service popularity (lower = more skewed)")
+        parser.add_argument("--center", default="27.7172,85.3240",
+                            help="lat,lng around which profiles are placed")
+        parser.add_argument("--spread-km", type=float, default=10.0,
+                            help="Standard deviation of profile distance from --center")
+        parser.add_argument("--days", type=int, default=365,
+                            help="Bookings are spread over this many past days")
+        parser.add_argument("--batch-size", type=int, default=5000,
+                            help="Rows per bulk insert and per transaction")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.options = options
+        self.batch_size = options["batch_size"]
+        self.status_weights = parse_weights(options["status_weights"], STATUSES)
+        center = geo.parse_near(options["center"])
+        if center is None:
+            raise CommandError("--center must be lat,lng")
+        self.center = center[:2]
+        self.now = timezone.now()
+        self.offset = (User.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+        started = time.monotonic()
+
+        customers = self.create_users("customer", options["customers"])
+        providers = self.create_users("provider", options["providers"])
+        services = self.create_services(providers)
+        if not customers or not services:
+            raise CommandError("Bookings need at least one customer and one active service.")
+
+        bookings = self.create_bookings(customers, services, options["bookings"])
+
+        self.stdout.write("Rebuilding search index, listings and booking stats...")
+        search.rebuild_index()
+        listings.rebuild_listings()
+        stats.rebuild_stats()
+        caching.bump("search", "categories", *[caching.category_namespace(c) for c in CATEGORIES])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(customers)} customers, {len(providers)} providers, "
+            f"{len(services)} services and {bookings} bookings "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
+
+    # ==============================
+    # USERS AND PROFILES
+    # ==============================
+
+    def random_point(self):
+        distance = abs(self.rng.gauss(0, self.options["spread_km"]))
+        bearing = math.radians(self.rng.uniform(0, 360))
+        lat = self.center[0] + distance * math.cos(bearing) / geo.KM_PER_DEGREE_LAT
+        cos_lat = max(math.cos(math.radians(lat)), 0.01)
+        lng = self.center[1] + distance * math.sin(bearing) / (geo.KM_PER_DEGREE_LAT * cos_lat)
+        return round(lat, 6), round(lng, 6)
+
+    def create_users(self, role, count):
+        """Create users with profiles; returns [(user_id, profile), ...]."""
+        # Hashing once keeps the run fast; every seeded user's password is "password"
+        password = make_password("password")
+        created = []
+        for start in range(0, count, self.batch_size):
+            numbers = range(self.offset + start, self.offset + min(start + self.batch_size, count))
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(
+                        username=f"{role}{n}@seed.example.com",
+                        email=f"{role}{n}@seed.example.com",
+                        first_name=f"{role.title()} {n}",
+                        password=password,
+                    )
+                    for n in numbers
+                ])
+                profiles = []
+                for user, n in zip(users, numbers):
+                    lat, lng = self.random_point()
+                    profiles.append(Profile(
+                        user=user,
+                        role=role,
+                        phone=f"+977{n:010d}",
+                        location=self.rng.choice(AREAS),
+                        latitude=lat,
+                        longitude=lng,
+                        geohash=geo.encode(lat, lng),
+                        is_verified=(
+                            role != "provider"
+                            or self.rng.random() < self.options["verified_ratio"]
+                        ),
+                    ))
+                Profile.objects.bulk_create(profiles)
+            created.extend((user.id, profile) for user, profile in zip(users, profiles))
+        self.offset += count
+        self.stdout.write(f"{len(created)} {role}s")
+        return created
+
+    # ==============================
+    # CATEGORIES AND SERVICES
+    # ==============================
+
+    def create_services(self, providers):
+        """
+        Create categories and services. Returns the bookable services as
+        [(service_id, provider_id, provider_user_id, popularity), ...].
+        """
+        categories = []
+        services = []
+        for user_id, profile in providers:
+            chosen = self.rng.sample(CATEGORIES, self.rng.randint(1, 3))
+            categories.extend(
+                ProviderCategory(provider=profile, category=category, is_verified=profile.is_verified)
+                for category in chosen
+            )
+            for _ in range(self.rng.randint(1, self.options["services_per_provider"])):
+                category = self.rng.choice(chosen)
+                services.append((user_id, Service(
+                    provider=profile,
+                    name=self.rng.choice(SERVICE_WORDS[category]),
+                    description=f"{self.rng.choice(SERVICE_WORDS[category])} by a trained professional.",
+                    category=category,
+                    price=self.rng.randrange(500, 10000, 50),
+                    location=profile.location,
+                    is_active=self.rng.random() < 0.95,
+                )))
+
+        with transaction.atomic():
+            ProviderCategory.objects.bulk_create(categories, batch_size=self.batch_size)
+            Service.objects.bulk_create([service for _, service in services], batch_size=self.batch_size)
+
+        self.stdout.write(f"{len(categories)} provider categories, {len(services)} services")
+        skew = self.options["popularity_skew"]
+        return [
+            (service.id, service.provider_id, user_id, self.rng.paretovariate(skew))
+            for user_id, service in services
+            if service.is_active and service.provider.is_verified
+        ]
+
+    # ==============================
+    # BOOKINGS AND MESSAGES
+    # ==============================
+
+    def create_bookings(self, customers, services, count):
+        customer_ids = [user_id for user_id, _ in customers]
+        weights = [weight for *_, weight in services]
+        span = timedelta(days=self.options["days"]).total_seconds()
+
+        with explicit_timestamps(
+            Booking._meta.get_field("booking_date"),
+            Booking._meta.get_field("created_at"),
+            Message._meta.get_field("created_at"),
+        ):
+            for start in range(0, count, self.batch_size):
+                size = min(self.batch_size, count - start)
+                chosen = self.rng.choices(services, weights=weights, k=size)
+                statuses = self.rng.choices(STATUSES, weights=self.status_weights, k=size)
+
+                bookings = []
+                providers = []
+                for (service_id, provider_id, provider_user_id, _), status in zip(chosen, statuses):
+                    booked_at = self.now - timedelta(seconds=self.rng.uniform(0, span))
+                    bookings.append(Booking(
+                        customer_id=self.rng.choice(customer_ids),
+                        service_id=service_id,
+                        booking_date=booked_at,
+                        created_at=booked_at,
+                        location=self.rng.choice(AREAS),
+                        status=status,
+                    ))
+                    providers.append((provider_id, provider_user_id))
+
+                with transaction.atomic():
+                    Booking.objects.bulk_create(bookings)
+                    self.create_threads(bookings, providers)
+
+                self.stdout.write(f"{start + size}/{count} bookings")
+        return count
+
+    def create_threads(self, bookings, providers):
+        """Message threads for a batch of bookings, plus their conversation summaries."""
+        mean = self.options["messages_per_booking"]
+        threads = []
+        messages = []
+        for booking, (_, provider_user_id) in zip(bookings, providers):
+            length = self.rng.randint(0, round(2 * mean))
+            sent_at = booking.booking_date
+            thread = []
+            for i in range(length):
+                sent_at += timedelta(minutes=self.rng.randint(1, 600))
+                thread.append(Message(
+                    booking=booking,
+                    sender_id=booking.customer_id if i % 2 == 0 else provider_user_id,
+                    content=self.rng.choice(MESSAGES),
+                    # Everything but the last message or two has been read
+                    is_read=i < length - self.rng.randint(0, 2),
+                    created_at=min(sent_at, self.now),
+                ))
+            threads.append(thread)
+            messages.extend(thread)
+
+        Message.objects.bulk_create(messages, batch_size=self.batch_size)
+
+        summaries = []
+        for booking, thread, (provider_id, _) in zip(bookings, threads, providers):
+            last = thread[-1] if thread else None
+            unread = [message for message in thread if not message.is_read]
+            summaries.append(ConversationSummary(
+                booking=booking,
+                customer_id=booking.customer_id,
+                provider_id=provider_id,
+                booking_date=booking.booking_date,
+                last_message=last,
+                last_message_snippet=last.content[:SNIPPET_LENGTH] if last else "",
+                last_message_at=last.created_at if last else None,
+                customer_unread=sum(1 for m in unread if m.sender_id != booking.customer_id),
+                provider_unread=sum(1 for m in unread if m.sender_id == booking.customer_id),
+            ))
+        ConversationSummary.objects.bulk_create(summaries, batch_size=self.batch_size)
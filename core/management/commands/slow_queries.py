@@ -0,0 +1,95 @@
+import glob
+import json
+import os
+import re
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import slowlog
+from core.nplusone import fingerprint
+
+
+class Offender:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = None
+        self.views = Counter()
+
+    def add(self, entry):
+        self.count += 1
+        self.total += entry["duration_ms"]
+        if self.slowest is None or entry["duration_ms"] > self.slowest["duration_ms"]:
+            self.slowest = entry
+        self.views[entry.get("view") or "-"] += 1
+
+
+class Command(BaseCommand):
+    help = "Summarize the slow-query log: top offenders by total time"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--log", default=None, help="Log file (default: SLOW_QUERY_LOG)")
+        parser.add_argument(
+            "--by",
+            choices=["shape", "view"],
+            default="shape",
+            help="Group queries by normalized SQL or by the view that ran them",
+        )
+        parser.add_argument("--limit", type=int, default=10, help="Offenders to show")
+        parser.add_argument("--no-plans", action="store_true", help="Leave out query plans")
+
+    def rotated(self, path):
+        """Rotated log files, oldest (highest suffix) first. Other siblings are ignored."""
+        suffixes = {}
+        for filename in glob.glob(f"{glob.escape(path)}.*"):
+            suffix = filename[len(path) + 1:]
+            if re.fullmatch(r"\d+", suffix):
+                suffixes[filename] = int(suffix)
+        return sorted(suffixes, key=suffixes.get, reverse=True)
+
+    def entries(self, path):
+        # Rotated files first, then the live one
+        for filename in self.rotated(path) + [path]:
+            if not os.path.exists(filename):
+                continue
+            with open(filename, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+    def handle(self, *args, **options):
+        path = options["log"] or slowlog.log_path()
+        if not os.path.exists(path) and not self.rotated(path):
+            raise CommandError(f"No slow-query log at {path}.")
+
+        offenders = {}
+        for entry in self.entries(path):
+            key = fingerprint(entry["sql"]) if options["by"] == "shape" else entry.get("view") or "-"
+            offenders.setdefault(key, Offender()).add(entry)
+
+        ranked = sorted(offenders.items(), key=lambda item: -item[1].total)[:options["limit"]]
+        total = sum(offender.total for offender in offenders.values())
+        self.stdout.write(
+            f"{sum(o.count for o in offenders.values())} slow queries, {total:.0f} ms in total\n"
+        )
+
+        for rank, (key, offender) in enumerate(ranked, 1):
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"#{rank}  {offender.total:.0f} ms total  {offender.count} queries  "
+                f"{offender.total / offender.count:.1f} ms mean  "
+                f"{offender.slowest['duration_ms']:.1f} ms max"
+            ))
+            self.stdout.write(f"  {key}")
+            if options["by"] == "shape":
+                views = ", ".join(f"{view} ({count})" for view, count in offender.views.most_common(5))
+                self.stdout.write(f"  views: {views}")
+            else:
+                self.stdout.write(f"  slowest: {offender.slowest['sql']}")
+            if not options["no_plans"] and offender.slowest.get("plan"):
+                self.stdout.write("  plan of the slowest:")
+                for step in offender.slowest["plan"]:
+                    self.stdout.write(f"    {step}")
+            self.stdout.write("")
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+MODES = ["PASSIVE", "FULL", "RESTART", "TRUNCATE"]
+
+
+class Command(BaseCommand):
+    help = "Checkpoint the SQLite write-ahead log into the database file"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--mode",
+            choices=MODES,
+            default="TRUNCATE",
+            help="PASSIVE never waits; TRUNCATE waits for readers and empties the WAL",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running and checkpoint every --interval seconds",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=300.0,
+            help="Seconds between checkpoints with --loop",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The default database is not SQLite.")
+
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(f"PRAGMA wal_checkpoint({options['mode']})")
+                busy, log_frames, checkpointed = cursor.fetchone()
+
+            if busy:
+                self.stderr.write("Checkpoint could not complete: database is busy.")
+            else:
+                self.stdout.write(
+                    f"Checkpointed {checkpointed} of {log_frames} WAL frame(s)."
+                )
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,170 @@
+"""
+Per-request performance metrics.
+
+PerformanceMiddleware (core/middleware.py) starts a RequestTimings for
+every request. SQL is timed by an execute_wrapper installed on each new
+database connection and templates by the instrumented template backend
+(core/templating.py); both add to the timings of the request running in
+the current context, so they also see work done in sync_to_async threads.
+
+Finished requests are added to in-process histograms keyed by URL name
+and served in the Prometheus text format at /metrics. Like the session
+cache, the histograms belong to one process: scrape every worker.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+
+# Upper bounds (seconds) of the latency buckets
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Label for requests that matched no URL pattern, e.g. 404s
+UNMATCHED = "<unmatched>"
+
+
+# ==============================
+# PER-REQUEST TIMINGS
+# ==============================
+
+class RequestTimings:
+    """Time spent in SQL and in templates while handling one request."""
+
+    def __init__(self, request):
+        self.request = request
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total):
+        """Value of the Server-Timing header, durations in milliseconds."""
+        return (
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries", '
+            f'tpl;dur={self.template * 1000:.1f}, '
+            f'view;dur={total * 1000:.1f}'
+        )
+
+
+_current = ContextVar("request_timings", default=None)
+
+
+def start_request(request):
+    """Begin timing a request; returns the token for finish_request()."""
+    return _current.set(RequestTimings(request))
+
+
+def current_timings():
+    return _current.get()
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else UNMATCHED
+
+
+def finish_request(token):
+    timings = _current.get()
+    _current.reset(token)
+    return timings
+
+
+def time_queries(execute, sql, params, many, context):
+    """execute_wrapper adding each query's time to the current request."""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db += time.perf_counter() - started
+        timings.queries += 1
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created receiver: time every query on this connection."""
+    if time_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_queries)
+
+
+# ==============================
+# HISTOGRAMS
+# ==============================
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """A Prometheus histogram with one series per `view` label."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # view -> [count per bucket (last one is +Inf), sum]
+        self._series = {}
+
+    def observe(self, view, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(view)
+            if series is None:
+                series = self._series[view] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def expose(self):
+        with self._lock:
+            snapshot = {view: (list(counts), total) for view, (counts, total) in self._series.items()}
+
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for view, (counts, total) in sorted(snapshot.items()):
+            label = f'view="{_escape(view)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return "\n".join(lines)
+
+
+REQUEST_DURATION = Histogram(
+    "homeservice_request_duration_seconds", "Time to produce a response, per URL name.",
+    DURATION_BUCKETS,
+)
+DB_DURATION = Histogram(
+    "homeservice_db_duration_seconds", "Time spent in SQL queries per request, per URL name.",
+    DURATION_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    "homeservice_db_queries", "SQL queries per request, per URL name.",
+    QUERY_COUNT_BUCKETS,
+)
+TEMPLATE_DURATION = Histogram(
+    "homeservice_template_duration_seconds", "Time spent rendering templates per request, per URL name.",
+    DURATION_BUCKETS,
+)
+HISTOGRAMS = (REQUEST_DURATION, DB_DURATION, DB_QUERIES, TEMPLATE_DURATION)
+
+
+def record(view, timings, total):
+    REQUEST_DURATION.observe(view, total)
+    DB_DURATION.observe(view, timings.db)
+    DB_QUERIES.observe(view, timings.queries)
+    TEMPLATE_DURATION.observe(view, timings.template)
+
+
+def exposition():
+    """Every histogram in the Prometheus text format."""
+    return "\n".join(histogram.expose() for histogram in HISTOGRAMS) + "\n"
@@ -0,0 +1,97 @@
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics, nplusone
+
+
+logger = logging.getLogger("core.nplusone")
+
+
+class PerformanceMiddleware:
+    """
+    Time SQL, templates and the whole response of every request. Adds a
+    Server-Timing header and feeds the /metrics histograms. Put it first
+    in MIDDLEWARE so the view time covers the other middleware too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = metrics.start_request(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            timings = metrics.finish_request(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        token = metrics.start_request(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            timings = metrics.finish_request(token)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        total = timings.elapsed()
+        metrics.record(metrics.view_name(request), timings, total)
+        response["Server-Timing"] = timings.server_timing(total)
+        return response
+
+
+class NPlusOneMiddleware:
+    """
+    Report queries repeated with the same shape within one request (see
+    core/nplusone.py). Only active with NPLUSONE_ENABLED, which defaults
+    to DEBUG.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "NPLUSONE_ENABLED", settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = nplusone.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            reports = nplusone.finish_request(token)
+        self.report(request, reports)
+        return response
+
+    async def __acall__(self, request):
+        token = nplusone.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            reports = nplusone.finish_request(token)
+        self.report(request, reports)
+        return response
+
+    def report(self, request, reports):
+        if not reports:
+            return
+        nplusone.nplusone_detected.send(sender=self.__class__, request=request, reports=reports)
+        message = f"N+1 queries in {request.method} {request.path}:\n" + "\n".join(
+            f"  {report}" for report in reports
+        )
+        if getattr(settings, "NPLUSONE_STRICT", False):
+            raise nplusone.NPlusOneError(message)
+        logger.warning(message)
@@ -0,0 +1,146 @@
+"""
+N+1 query detection.
+
+While a request is handled, every SELECT is reduced to its shape: literals,
+placeholders and IN lists are blanked out, so the queries an N+1 sends
+for each row of a list all share one fingerprint. A shape run
+NPLUSONE_THRESHOLD times or more in one request is reported along with
+where the repeated query came from: the template line being rendered, if
+any, and the innermost frame of project code.
+
+NPlusOneMiddleware (core/middleware.py) logs the reports, or raises
+NPlusOneError when NPLUSONE_STRICT is set. The test runner in
+core/testrunner.py turns detection on for the test suite.
+"""
+import os
+import re
+import sys
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.dispatch import Signal
+from django.template.base import Node
+
+
+# Sent with request and reports ([Report, ...]) when a request ends with N+1s
+nplusone_detected = Signal()
+
+_LITERALS_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+_LISTS_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+_RENDER_CODE = Node.render_annotated.__code__
+_PROJECT_DIR = str(settings.BASE_DIR) + os.sep
+# Frames of the instrumentation itself are never the origin of a query
+_INSTRUMENTATION = {
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ("metrics.py", "middleware.py", "nplusone.py", "templating.py")
+}
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """The shape of a query: the same SQL with its values blanked out."""
+    sql = _LITERALS_RE.sub("?", sql)
+    sql = _LISTS_RE.sub("(...)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+def threshold():
+    return getattr(settings, "NPLUSONE_THRESHOLD", 3)
+
+
+# ==============================
+# ORIGIN OF A QUERY
+# ==============================
+
+def _is_project_code(filename):
+    return (
+        filename.startswith(_PROJECT_DIR)
+        and "site-packages" not in filename
+        and filename not in _INSTRUMENTATION
+    )
+
+
+def find_origin():
+    """(template location or None, python location or None) of the running query."""
+    template = None
+    python = None
+    frame = sys._getframe(1)
+    while frame is not None and (template is None or python is None):
+        code = frame.f_code
+        if template is None and code is _RENDER_CODE:
+            node = frame.f_locals.get("self")
+            if node is not None and node.token is not None:
+                template = f"{node.origin.template_name}:{node.token.lineno}"
+        elif python is None and _is_project_code(code.co_filename):
+            filename = os.path.relpath(code.co_filename, settings.BASE_DIR)
+            python = f"{filename}:{frame.f_lineno} in {code.co_name}"
+        frame = frame.f_back
+    return template, python
+
+
+# ==============================
+# PER-REQUEST DETECTOR
+# ==============================
+
+class Report:
+    def __init__(self, shape, template, python):
+        self.shape = shape
+        self.template = template
+        self.python = python
+        self.count = 0
+
+    def __str__(self):
+        where = " from ".join(filter(None, (self.template, self.python))) or "unknown origin"
+        return f"{self.count} queries of the same shape at {where}: {self.shape}"
+
+
+class Detector:
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.counts = Counter()
+        self.reports = {}
+
+    def saw(self, sql):
+        shape = fingerprint(sql)
+        self.counts[shape] += 1
+        if self.counts[shape] == self.threshold:
+            # Only repeated shapes pay for walking the stack
+            self.reports[shape] = Report(shape, *find_origin())
+
+    def results(self):
+        for shape, report in self.reports.items():
+            report.count = self.counts[shape]
+        return list(self.reports.values())
+
+
+_current = ContextVar("nplusone_detector", default=None)
+
+
+def start_request():
+    return _current.set(Detector(threshold()))
+
+
+def finish_request(token):
+    detector = _current.get()
+    _current.reset(token)
+    return detector.results()
+
+
+def detect_queries(execute, sql, params, many, context):
+    """execute_wrapper feeding each SELECT to the current request's detector."""
+    detector = _current.get()
+    if detector is not None and not many and sql.lstrip()[:6].upper() == "SELECT":
+        detector.saw(sql)
+    return execute(sql, params, many, context)
+
+
+def install_detector(sender, connection, **kwargs):
+    """connection_created receiver: check every query on this connection."""
+    if detect_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(detect_queries)
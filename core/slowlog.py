@@ -0,0 +1,134 @@
+"""
+Slow-query log.
+
+An execute_wrapper on every database connection times each query. Queries
+slower than SLOW_QUERY_THRESHOLD_MS are written as one JSON object per
+line to SLOW_QUERY_LOG, which rotates at SLOW_QUERY_LOG_MAX_BYTES. Each
+record has the SQL, its parameters, the view that ran it (when inside a
+request) and SQLite's EXPLAIN QUERY PLAN for it. Summarize the log with
+`manage.py slow_queries`.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+
+from . import metrics
+
+
+# Statements EXPLAIN QUERY PLAN can describe
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+# Plans are cached per SQL string so a hot slow query is explained once
+PLAN_CACHE_SIZE = 256
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def threshold():
+    """Seconds, or None when the log is off."""
+    threshold_ms = _setting("SLOW_QUERY_THRESHOLD_MS", 100)
+    return None if threshold_ms is None else threshold_ms / 1000
+
+
+def log_path():
+    return str(_setting("SLOW_QUERY_LOG", settings.BASE_DIR / "slow-queries.jsonl"))
+
+
+@lru_cache(maxsize=None)
+def get_logger():
+    logger = logging.getLogger("core.slowlog")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = RotatingFileHandler(
+        log_path(),
+        maxBytes=_setting("SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024),
+        backupCount=_setting("SLOW_QUERY_LOG_BACKUPS", 5),
+        encoding="utf-8",
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    return logger
+
+
+# ==============================
+# QUERY PLANS
+# ==============================
+
+_plans = OrderedDict()
+_plans_lock = threading.Lock()
+
+
+def explain(connection, sql, params):
+    """EXPLAIN QUERY PLAN rows as strings, or None if it cannot be explained."""
+    if connection.vendor != "sqlite" or not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    with _plans_lock:
+        if sql in _plans:
+            _plans.move_to_end(sql)
+            return _plans[sql]
+
+    # A bare backend cursor: EXPLAIN is not itself timed or logged
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        plan = [row[-1] for row in cursor.fetchall()]
+    except Exception:
+        return None
+    finally:
+        cursor.close()
+
+    with _plans_lock:
+        _plans[sql] = plan
+        while len(_plans) > PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+    return plan
+
+
+# ==============================
+# EXECUTE WRAPPER
+# ==============================
+
+def record(connection, sql, params, duration):
+    timings = metrics.current_timings()
+    request = timings.request if timings else None
+    entry = {
+        "time": datetime.now(timezone.utc).isoformat(),
+        "duration_ms": round(duration * 1000, 3),
+        "sql": sql,
+        "params": list(params) if params is not None else None,
+        "view": metrics.view_name(request) if request else None,
+        "path": request.path if request else None,
+        "plan": explain(connection, sql, params),
+    }
+    get_logger().info(json.dumps(entry, default=str))
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    """execute_wrapper logging every query slower than the threshold."""
+    limit = threshold()
+    if limit is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - started
+    if duration >= limit:
+        try:
+            record(context["connection"], sql, None if many else params, duration)
+        except Exception:
+            logging.getLogger(__name__).exception("Could not log a slow query")
+    return result
+
+
+def install_slow_query_log(sender, connection, **kwargs):
+    """connection_created receiver: log slow queries on this connection."""
+    if log_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(log_slow_queries)
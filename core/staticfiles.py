@@ -0,0 +1,145 @@
+"""
+Static asset pipeline.
+
+- ResponsiveImageFinder adds WebP and AVIF copies of RESPONSIVE_IMAGES
+  at the widths listed for each, e.g. core/images/background.jpg ->
+  core/images/background-480w.webp. They are rendered once into
+  RESPONSIVE_IMAGE_DIR and found like any other static file, so
+  runserver serves them and collectstatic collects them. The CSS points
+  at every variant, so a Pillow build that cannot encode one of the
+  formats fails the staticfiles system check instead of the deploy.
+- CompressedManifestStorage stores every collected file under a
+  content-hashed name (so it can be cached forever) and writes .gz, and
+  .br when the optional brotli package is installed, next to each text
+  asset for the front-end server to send as-is.
+"""
+import gzip
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core import checks
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from PIL import Image, features
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# ==============================
+# RESPONSIVE IMAGES
+# ==============================
+
+IMAGE_FORMATS = {
+    "webp": {"format": "WEBP", "quality": 75, "method": 6},
+    "avif": {"format": "AVIF", "quality": 50},
+}
+
+
+def variant_name(name, width, extension):
+    """core/images/background.jpg, 960, "webp" -> core/images/background-960w.webp"""
+    return f"{os.path.splitext(name)[0]}-{width}w.{extension}"
+
+
+def render_variant(source_path, target_path, width, options):
+    """Resize (never enlarge) source_path to `width` and save it to target_path."""
+    with Image.open(source_path) as image:
+        image = image.convert("RGB")
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        image.save(target_path, **options)
+
+
+class ResponsiveImageFinder(finders.BaseFinder):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.storage = FileSystemStorage(location=settings.RESPONSIVE_IMAGE_DIR)
+
+    def check(self, **kwargs):
+        if not getattr(settings, "RESPONSIVE_IMAGES", ()):
+            return []
+        return [
+            checks.Error(
+                f"The installed Pillow cannot write {extension.upper()} images, "
+                f"which RESPONSIVE_IMAGES are rendered to.",
+                hint=f"Install a Pillow build with {extension.upper()} support.",
+                id="core.E001",
+            )
+            for extension in IMAGE_FORMATS
+            if not features.check(extension)
+        ]
+
+    def variants(self):
+        """{variant name: (source name, width, format options)}"""
+        return {
+            variant_name(source, width, extension): (source, width, options)
+            for source, widths in getattr(settings, "RESPONSIVE_IMAGES", {}).items()
+            for width in widths
+            for extension, options in IMAGE_FORMATS.items()
+        }
+
+    def build(self, name, source, width, options):
+        """Path of the variant, rendered first if missing or older than its source."""
+        source_path = finders.find(source)
+        if source_path is None:
+            return None
+        path = self.storage.path(name)
+        if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(source_path):
+            render_variant(source_path, path, width, options)
+        return path
+
+    def find(self, path, find_all=False, **kwargs):
+        variant = self.variants().get(path)
+        found = self.build(path, *variant) if variant else None
+        if find_all:
+            return [found] if found else []
+        return found
+
+    def list(self, ignore_patterns):
+        for name, variant in self.variants().items():
+            if self.build(name, *variant):
+                yield name, self.storage
+
+
+# ==============================
+# HASHED, PRECOMPRESSED STORAGE
+# ==============================
+
+COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".txt", ".xml", ".map", ".ico")
+
+# Compressed copies that save less than this are not worth keeping
+MIN_SAVING = 0.05
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if not dry_run:
+            yield from self.compress(set(self.hashed_files.values()))
+
+    def compress(self, names):
+        for name in sorted(names):
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            with self.open(name) as f:
+                data = f.read()
+
+            encoded = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                encoded.append((".br", brotli.compress(data, quality=11)))
+
+            for suffix, compressed in encoded:
+                if len(compressed) > len(data) * (1 - MIN_SAVING):
+                    continue
+                target = name + suffix
+                if self.exists(target):
+                    self.delete(target)
+                self._save(target, ContentFile(compressed))
+                yield name, target, True
@@ -0,0 +1,33 @@
+"""
+Django template backend that reports render time to core.metrics.
+
+Only the top-level render of a template is timed; {% include %} and
+{% extends %} are part of it.
+"""
+import time
+
+from django.template.backends import django as django_backend
+
+from .metrics import current_timings
+
+
+class Template(django_backend.Template):
+
+    def render(self, context=None, request=None):
+        timings = current_timings()
+        if timings is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
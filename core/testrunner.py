@@ -0,0 +1,68 @@
+"""
+Test runner that checks every test request for N+1 queries.
+
+Detection is on for the whole run. Reports are printed after the
+results; with --nplusone-strict (or NPLUSONE_STRICT) the request raises
+NPlusOneError instead, failing the test that made it.
+
+The run also leaves the slow-query log alone, writes sessions through
+instead of from a background thread and serves static files without the
+collectstatic manifest.
+"""
+import sys
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from .nplusone import nplusone_detected
+
+
+class NPlusOneTestRunner(DiscoverRunner):
+
+    def __init__(self, nplusone_strict=False, **kwargs):
+        super().__init__(**kwargs)
+        self.nplusone_strict = nplusone_strict or getattr(settings, "NPLUSONE_STRICT", False)
+        self.detected = []
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--nplusone-strict", action="store_true",
+            help="Fail tests whose requests run N+1 queries.",
+        )
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._nplusone_settings = override_settings(
+            NPLUSONE_ENABLED=True,
+            NPLUSONE_STRICT=self.nplusone_strict,
+            # Test queries do not belong in the production slow-query log
+            SLOW_QUERY_THRESHOLD_MS=None,
+            # Sessions are written by the request, inside the test transaction
+            SESSION_WRITE_BEHIND_INTERVAL=0,
+            # Tests run without DEBUG but also without a collectstatic manifest
+            STORAGES=dict(
+                settings.STORAGES,
+                staticfiles={"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+            ),
+        )
+        self._nplusone_settings.enable()
+        nplusone_detected.connect(self.collect)
+
+    def teardown_test_environment(self, **kwargs):
+        nplusone_detected.disconnect(self.collect)
+        self._nplusone_settings.disable()
+        super().teardown_test_environment(**kwargs)
+
+    def collect(self, sender, request, reports, **kwargs):
+        self.detected.append((f"{request.method} {request.path}", reports))
+
+    def suite_result(self, suite, result, **kwargs):
+        if self.detected and not self.nplusone_strict:
+            sys.stderr.write(f"\nN+1 queries in {len(self.detected)} requests:\n")
+            for request, reports in self.detected:
+                for report in reports:
+                    sys.stderr.write(f"  {request}: {report}\n")
+        return super().suite_result(suite, result, **kwargs)
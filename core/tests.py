@@ -1,3 +1,672 @@
-from django.test import TestCase
+import inspect
+import json
+import os
+import re
+import runpy
+import tempfile
+import time
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+
+from account.models import CategoryListing, Profile, ProviderCategory, ProviderCertificate
+from booking.models import (
+    Booking,
+    ConversationSummary,
+    Message,
+    ProviderBookingStats,
+    SearchToken,
+    Service,
+)
+from PIL import Image
+
+from . import metrics, nplusone, staticfiles
+from .middleware import NPlusOneMiddleware
+
+
+# ==============================
+# VIEW BUDGET BENCHMARK
+# ==============================
+# Every URL of the account and booking apps is requested on a seeded
+# dataset, then again after the dataset has grown. The query count of a
+# view must stay within its budget and must not change with data size
+# (an N+1 shows up as a growing count). p50/p95 latency per view is
+# written to BENCHMARK_REPORT (JSON) so runs can be compared across
+# commits.
+
+ITERATIONS = int(os.environ.get("BENCHMARK_ITERATIONS", 10))
+REPORT_PATH = os.environ.get(
+    "BENCHMARK_REPORT", os.path.join(settings.BASE_DIR, "benchmark-report.json")
+)
+
+# Maximum queries per view (URL name, plus the role requesting it)
+QUERY_BUDGETS = {
+    "search_services": 5,
+    "service_categories": 2,
+    "providers_by_category": 2,
+    "book_service": 4,
+    "book_service:post": 10,
+    "cancel_booking": 8,
+    "customer_dashboard": 2,
+    "provider_dashboard": 3,
+    "provider_services": 3,
+    "add_service": 1,
+    "edit_service": 2,
+    "delete_service": 12,
+    "update_booking_status": 10,
+    "provider_profile": 4,
+    "messages_inbox:customer": 2,
+    "messages_inbox:provider": 2,
+    "view_messages": 5,
+    "messages_since": 3,
+    "send_message": 4,
+    "login": 1,
+    "register": 1,
+    "provider_register": 1,
+    "logout": 4,
+    "account:customer_dashboard": 2,
+    "account:provider_dashboard": 3,
+    "profile": 1,
+    "save_location": 5,
+    "verify_email": 1,
+    "admin_dashboard": 5,
+    "admin_users": 2,
+    "admin_providers": 2,
+    "admin_provider_detail": 4,
+    "admin_approve_provider": 16,
+    "admin_reject_provider": 10,
+    "admin_services": 2,
+}
+
+# URLs left out of the benchmark, with the reason
+SKIPPED = {
+    "message_stream": "Server-Sent Events stream that never completes",
+}
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ViewBudgetBenchmark(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = cls.make_user("admin@example.com", "Ada", role="admin")
+        cls.customer = cls.make_user("customer@example.com", "Cara", role="customer")
+        cls.provider = cls.make_user(
+            "provider@example.com", "Pat", role="provider", location="Kathmandu",
+            latitude=27.7172, longitude=85.3240,
+        ).profile
+        ProviderCategory.objects.create(provider=cls.provider, category="plumbing", is_verified=True)
+        cls.service = Service.objects.create(
+            provider=cls.provider, name="Pipe repair", description="Leaking pipes fixed",
+            category="plumbing", price=500, location="Kathmandu",
+        )
+        cls.booking = Booking.objects.create(customer=cls.customer, service=cls.service)
+        Message.objects.create(booking=cls.booking, sender=cls.customer, content="Hello")
+
+        cls.seeded = 0
+        cls.seed(5)
+
+    @classmethod
+    def make_user(cls, email, name, role, **profile_fields):
+        user = User.objects.create_user(username=email, email=email, password="pw", first_name=name)
+        Profile.objects.create(user=user, role=role, is_verified=True, phone=f"98{user.id:08d}", **profile_fields)
+        return user
+
+    @classmethod
+    def seed(cls, count):
+        """Add `count` providers and customers, with services, bookings and messages."""
+        statuses = [status for status, _ in Booking.STATUS_CHOICES]
+        categories = [category for category, _ in ProviderCategory.CATEGORY_CHOICES]
+
+        for i in range(cls.seeded, cls.seeded + count):
+            category = categories[i % len(categories)]
+            provider = cls.make_user(
+                f"provider{i}@example.com", f"Provider {i}", role="provider",
+                location="Lalitpur", latitude=27.66 + i / 1000, longitude=85.32,
+            ).profile
+            ProviderCategory.objects.create(provider=provider, category=category, is_verified=True)
+            ProviderCertificate.objects.create(provider=provider, certificate=f"certificates/{i}.pdf")
+            service = Service.objects.create(
+                provider=provider, name=f"{category.title()} service {i}", description="Pipe work",
+                category=category, price=100 + i, location="Lalitpur",
+            )
+            customer = cls.make_user(f"customer{i}@example.com", f"Customer {i}", role="customer")
+
+            # Grow the main customer's and main provider's pages too
+            for booker, booked in ((customer, service), (cls.customer, service), (customer, cls.service)):
+                booking = Booking.objects.create(
+                    customer=booker, service=booked, status=statuses[i % len(statuses)],
+                    location="Lalitpur",
+                )
+                for sender in (booker, booked.provider.user, booker):
+                    Message.objects.create(booking=booking, sender=sender, content=f"Message {i}")
+        cls.seeded += count
+
+    def setUp(self):
+        cache.clear()
+        caches["template_fragments"].clear()
+        self.clients = {"anonymous": Client()}
+        for role, user in (("customer", self.customer), ("provider", self.provider.user), ("admin", self.admin)):
+            self.clients[role] = Client()
+            self.clients[role].force_login(user)
+
+    def cases(self):
+        """(budget key, URL name, role, method, url, data) for every benchmarked request."""
+        booking_id = self.booking.id
+        service_id = self.service.id
+        provider_id = self.provider.id
+        return [
+            ("search_services", "search_services", "anonymous", "get",
+             reverse("search_services") + "?q=pipe&location=lalitpur", None),
+            ("service_categories", "service_categories", "anonymous", "get",
+             reverse("service_categories"), None),
+            ("providers_by_category", "providers_by_category", "anonymous", "get",
+             reverse("providers_by_category", args=["plumbing"]), None),
+            ("book_service", "book_service", "customer", "get",
+             reverse("book_service", args=[service_id]), None),
+            ("book_service:post", "book_service", "customer", "post",
+             reverse("book_service", args=[service_id]), {"location": "Lalitpur"}),
+            ("cancel_booking", "cancel_booking", "customer", "post",
+             reverse("cancel_booking", args=[booking_id]), {}),
+            ("customer_dashboard", "customer_dashboard", "customer", "get",
+             reverse("customer_dashboard"), None),
+            ("provider_dashboard", "provider_dashboard", "provider", "get",
+             reverse("provider_dashboard"), None),
+            ("provider_services", "provider_services", "provider", "get",
+             reverse("provider_services"), None),
+            ("add_service", "add_service", "provider", "get", reverse("add_service"), None),
+            ("edit_service", "edit_service", "provider", "get",
+             reverse("edit_service", args=[service_id]), None),
+            ("delete_service", "delete_service", "provider", "post",
+             reverse("delete_service", args=[service_id]), {}),
+            ("update_booking_status", "update_booking_status", "provider", "post",
+             reverse("update_booking_status", args=[booking_id]), {"action": "approve"}),
+            ("provider_profile", "provider_profile", "anonymous", "get",
+             reverse("provider_profile", args=[provider_id]), None),
+            ("messages_inbox:customer", "messages_inbox", "customer", "get",
+             reverse("messages_inbox"), None),
+            ("messages_inbox:provider", "messages_inbox", "provider", "get",
+             reverse("messages_inbox"), None),
+            ("view_messages", "view_messages", "customer", "get",
+             reverse("view_messages", args=[booking_id]), None),
+            ("messages_since", "messages_since", "customer", "get",
+             reverse("messages_since", args=[booking_id]) + "?after=0", None),
+            ("send_message", "send_message", "customer", "post",
+             reverse("send_message", args=[booking_id]), {"content": "On my way"}),
+            ("login", "login", "anonymous", "get", reverse("login"), None),
+            ("register", "register", "anonymous", "get", reverse("register"), None),
+            ("provider_register", "provider_register", "anonymous", "get",
+             reverse("provider_register"), None),
+            ("logout", "logout", "logout", "get", reverse("logout"), None),
+            ("account:customer_dashboard", "customer_dashboard", "customer", "get",
+             "/account/dashboard/customer/", None),
+            ("account:provider_dashboard", "provider_dashboard", "provider", "get",
+             "/account/dashboard/provider/", None),
+            ("profile", "profile", "customer", "get", reverse("profile"), None),
+            ("save_location", "save_location", "customer", "post",
+             reverse("save_location"), {"lat": "27.7", "lng": "85.3", "address": "Kathmandu"}),
+            ("verify_email", "verify_email", "anonymous", "get", reverse("verify_email"), None),
+            ("admin_dashboard", "admin_dashboard", "admin", "get", reverse("admin_dashboard"), None),
+            ("admin_users", "admin_users", "admin", "get", reverse("admin_users"), None),
+            ("admin_providers", "admin_providers", "admin", "get", reverse("admin_providers"), None),
+            ("admin_provider_detail", "admin_provider_detail", "admin", "get",
+             reverse("admin_provider_detail", args=[provider_id]), None),
+            ("admin_approve_provider", "admin_approve_provider", "admin", "get",
+             reverse("admin_approve_provider", args=[provider_id]), None),
+            ("admin_reject_provider", "admin_reject_provider", "admin", "get",
+             reverse("admin_reject_provider", args=[provider_id]), None),
+            ("admin_services", "admin_services", "admin", "get", reverse("admin_services"), None),
+        ]
+
+    def client_for(self, role):
+        if role == "logout":
+            # Logging out ends the session, so every request needs a new one
+            client = Client()
+            client.force_login(self.customer)
+            return client
+        return self.clients[role]
+
+    def request(self, role, method, url, data):
+        """Run one request and undo its writes. Returns (query count, seconds)."""
+        client = self.client_for(role)
+        if role != "anonymous":
+            # Steady state: the session user is cached by an earlier request
+            client.get(reverse("profile"))
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = getattr(client, method)(url, data)
+                elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        self.assertLess(response.status_code, 400, url)
+        return len(queries), elapsed
+
+    def measure(self, iterations=1):
+        # Start cold: catalog results and card fragments cached by an
+        # earlier round would hide queries
+        cache.clear()
+        caches["template_fragments"].clear()
+        results = {}
+        for key, name, role, method, url, data in self.cases():
+            runs = [self.request(role, method, url, data) for _ in range(iterations)]
+            latencies = [elapsed for _, elapsed in runs]
+            results[key] = {
+                "url_name": name,
+                # First request: nothing cached yet
+                "queries": runs[0][0],
+                "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            }
+        return results
+
+    def test_every_url_is_benchmarked(self):
+        covered = {name for _, name, *rest in self.cases()} | set(SKIPPED)
+        for app in ("account.urls", "booking.urls"):
+            names = {pattern.name for pattern in get_resolver(app).url_patterns}
+            self.assertEqual(names - covered, set(), f"{app} URLs missing from the benchmark")
+
+    def test_query_budgets(self):
+        small = self.measure()
+        self.seed(15)
+        large = self.measure(ITERATIONS)
+
+        for key, result in large.items():
+            self.assertLessEqual(
+                result["queries"], QUERY_BUDGETS[key],
+                f"{key}: {result['queries']} queries, budget {QUERY_BUDGETS[key]}",
+            )
+            self.assertEqual(
+                result["queries"], small[key]["queries"],
+                f"{key}: query count grows with data size",
+            )
+
+        with open(REPORT_PATH, "w") as f:
+            json.dump({
+                "generated_at": datetime.now(timezone.utc).isoformat(),
+                "iterations": ITERATIONS,
+                "rows": {
+                    "users": User.objects.count(),
+                    "services": Service.objects.count(),
+                    "bookings": Booking.objects.count(),
+                    "messages": Message.objects.count(),
+                },
+                "views": {
+                    key: dict(result, budget=QUERY_BUDGETS[key], queries_small=small[key]["queries"])
+                    for key, result in large.items()
+                },
+            }, f, indent=2)
+
+
+# ==============================
+# STATIC PIPELINE
+# ==============================
+
+class ResponsiveImageTests(SimpleTestCase):
+
+    def test_variant_name(self):
+        self.assertEqual(
+            staticfiles.variant_name("core/images/background.jpg", 960, "webp"),
+            "core/images/background-960w.webp",
+        )
+
+    def test_render_variant_never_enlarges(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "source.png")
+            Image.new("RGB", (200, 100), "red").save(source)
+
+            for width, expected in ((480, (200, 100)), (50, (50, 25))):
+                target = os.path.join(tmp, "variants", f"{width}.webp")
+                staticfiles.render_variant(source, target, width, staticfiles.IMAGE_FORMATS["webp"])
+                with Image.open(target) as image:
+                    self.assertEqual(image.format, "WEBP")
+                    self.assertEqual(image.size, expected)
+
+    def test_variants_are_the_ones_the_css_references(self):
+        referenced = set()
+        for app in ("core", "booking", "account"):
+            # Stylesheets (image-set) and templates (srcset)
+            for directory, _, names in os.walk(os.path.join(settings.BASE_DIR, app)):
+                for name in names:
+                    if name.endswith((".css", ".html")):
+                        with open(os.path.join(directory, name)) as f:
+                            referenced.update(re.findall(r"images/([\w-]+-\d+w\.(?:avif|webp))", f.read()))
+        variants = {os.path.basename(name) for name in staticfiles.ResponsiveImageFinder().variants()}
+        self.assertEqual(variants, referenced)
+
+    @override_settings(RESPONSIVE_IMAGES={"core/images/background.jpg": [480]})
+    def test_missing_encoder_fails_the_check(self):
+        finder = staticfiles.ResponsiveImageFinder()
+        with mock.patch.object(staticfiles.features, "check", lambda feature: feature != "avif"):
+            errors = finder.check()
+        self.assertEqual([error.id for error in errors], ["core.E001"])
+        self.assertIn("AVIF", errors[0].msg)
+
+
+class CompressedStorageTests(SimpleTestCase):
+
+    def test_compress_skips_small_savings(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = staticfiles.CompressedManifestStorage(location=tmp)
+            files = {
+                "app.css": b"body { color: red; }\n" * 200,
+                # Random bytes do not compress
+                "noise.js": os.urandom(4096),
+                "photo.jpg": b"x" * 4096,
+            }
+            for name, data in files.items():
+                with open(os.path.join(tmp, name), "wb") as f:
+                    f.write(data)
+
+            written = [target for _, target, _ in storage.compress(files)]
+
+            self.assertIn("app.css.gz", written)
+            self.assertNotIn("noise.js.gz", written)
+            self.assertFalse(any(target.startswith("photo.jpg") for target in written))
+            self.assertFalse(os.path.exists(os.path.join(tmp, "noise.js.gz")))
+
+
+# ==============================
+# SLOW-QUERY LOG
+# ==============================
+
+class SlowQuerySummaryTests(SimpleTestCase):
+
+    def test_reads_rotated_files_and_skips_other_siblings(self):
+        entry = {"duration_ms": 150.0, "sql": "SELECT 1", "view": "search_services", "plan": []}
+        with tempfile.TemporaryDirectory() as tmp:
+            log = os.path.join(tmp, "slow.jsonl")
+            for filename in (log, f"{log}.1", f"{log}.2"):
+                with open(filename, "w") as f:
+                    f.write(json.dumps(entry) + "\n")
+            for sibling in (f"{log}.gz", f"{log}.bak"):
+                with open(sibling, "wb") as f:
+                    f.write(b"\x1f\x8b not a log")
+
+            out = StringIO()
+            call_command("slow_queries", log=log, stdout=out)
+
+        self.assertIn("3 slow queries, 450 ms in total", out.getvalue())
+
+
+# ==============================
+# SEED DATA
+# ==============================
+
+class SeedDataTests(TestCase):
+
+    def seed(self, **options):
+        options = dict(
+            customers=12, providers=7, bookings=40, batch_size=5, seed=7, stdout=StringIO(), **options
+        )
+        call_command("seed_data", **options)
+
+    def snapshot(self):
+        return (
+            list(User.objects.order_by("id").values_list("username", "profile__latitude", "profile__is_verified")),
+            list(Service.objects.order_by("id").values_list("provider_id", "name", "price", "is_active")),
+            list(Booking.objects.order_by("id").values_list("customer_id", "service_id", "status", "booking_date")),
+            list(Message.objects.order_by("id").values_list("booking_id", "sender_id", "content", "is_read")),
+        )
+
+    def test_creates_rows_and_derived_tables(self):
+        self.seed()
+
+        self.assertEqual(Profile.objects.filter(role="customer").count(), 12)
+        self.assertEqual(Profile.objects.filter(role="provider").count(), 7)
+        self.assertEqual(Booking.objects.count(), 40)
+        self.assertFalse(Profile.objects.filter(geohash="").exists())
+
+        # Derived tables are rebuilt as if every row had been saved normally
+        verified = ProviderCategory.objects.filter(provider__is_verified=True).count()
+        self.assertEqual(CategoryListing.objects.count(), verified)
+        self.assertEqual(ConversationSummary.objects.count(), 40)
+        for summary in ConversationSummary.objects.all():
+            last = Message.objects.filter(booking_id=summary.booking_id).order_by("created_at", "id").last()
+            self.assertEqual(summary.last_message_id, last.id if last else None)
+        self.assertEqual(
+            sum(
+                sum(getattr(row, f"{status}_count") for status, _ in Booking.STATUS_CHOICES)
+                for row in ProviderBookingStats.objects.all()
+            ),
+            40,
+        )
+        indexed = set(SearchToken.objects.values_list("service_id", flat=True))
+        searchable = Service.objects.filter(is_active=True, provider__is_verified=True)
+        self.assertEqual(indexed, set(searchable.values_list("id", flat=True)))
+
+    def test_same_seed_gives_same_data(self):
+        snapshots = []
+        now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        for _ in range(2):
+            # Roll back so the second run starts from the same database;
+            # booking dates count back from the current time
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                with mock.patch("django.utils.timezone.now", return_value=now):
+                    self.seed()
+                snapshots.append(self.snapshot())
+                raise RuntimeError
+        self.assertEqual(snapshots[0], snapshots[1])
+        self.assertTrue(snapshots[0][2])
+
+    def test_status_weights(self):
+        self.seed(status_weights="completed=1")
+        self.assertEqual(set(Booking.objects.values_list("status", flat=True)), {"completed"})
+
+        with self.assertRaises(CommandError):
+            self.seed(status_weights="finished=1")
+
+
+# ==============================
+# REQUEST METRICS
+# ==============================
+
+SERVER_TIMING_RE = re.compile(
+    r'^db;dur=([\d.]+);desc="(\d+) queries", tpl;dur=([\d.]+), view;dur=([\d.]+)$'
+)
+
+
+class RequestMetricsTests(TestCase):
+
+    def test_server_timing_header(self):
+        user = User.objects.create_user(username="customer@example.com", password="pw")
+        Profile.objects.create(user=user, role="customer", is_verified=True)
+        self.client.force_login(user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("messages_inbox"))
+
+        match = SERVER_TIMING_RE.match(response["Server-Timing"])
+        self.assertIsNotNone(match, response["Server-Timing"])
+        db, count, template, view = match.groups()
+        self.assertEqual(int(count), len(queries))
+        self.assertGreater(float(template), 0)
+        self.assertLessEqual(float(db), float(view))
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_metrics_endpoint(self):
+        self.client.get(reverse("home"))
+        self.client.get("/no-such-page/")
+
+        response = self.client.get(reverse("metrics"), headers={"Authorization": "Bearer s3cret"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        for histogram in metrics.HISTOGRAMS:
+            self.assertIn(f"# TYPE {histogram.name} histogram", body)
+        self.assertIn('homeservice_request_duration_seconds_count{view="home"}', body)
+        self.assertIn(f'homeservice_request_duration_seconds_count{{view="{metrics.UNMATCHED}"}}', body)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_metrics_endpoint_needs_the_token(self):
+        # Behind the reverse proxy every request arrives from 127.0.0.1
+        proxied = {"REMOTE_ADDR": "127.0.0.1", "HTTP_X_FORWARDED_FOR": "203.0.113.5"}
+        for headers in ({}, {"Authorization": "Bearer wrong"}, {"Authorization": "s3cret"}):
+            response = self.client.get(reverse("metrics"), headers=headers, **proxied)
+            self.assertEqual(response.status_code, 403, headers)
+
+    def test_metrics_endpoint_is_off_without_a_token(self):
+        response = self.client.get(reverse("metrics"), headers={"Authorization": "Bearer "})
+        self.assertEqual(response.status_code, 404)
+
+    def test_histogram_exposition(self):
+        histogram = metrics.Histogram("test_seconds", "Test.", (0.1, 1))
+        for value in (0.05, 0.5, 0.5, 3):
+            histogram.observe('say "hi"', value)
+
+        self.assertEqual(histogram.expose().splitlines(), [
+            "# HELP test_seconds Test.",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{view="say \\"hi\\"",le="0.1"} 1',
+            'test_seconds_bucket{view="say \\"hi\\"",le="1"} 3',
+            'test_seconds_bucket{view="say \\"hi\\"",le="+Inf"} 4',
+            'test_seconds_sum{view="say \\"hi\\""} 4.05',
+            'test_seconds_count{view="say \\"hi\\""} 4',
+        ])
+
+
+# ==============================
+# N+1 DETECTION
+# ==============================
+
+def profile_names(request):
+    """A view with an N+1: one user query per profile."""
+    names = [profile.user.username for profile in Profile.objects.order_by("id")]
+    return HttpResponse(",".join(names))
+
+
+class NPlusOneTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(4):
+            user = User.objects.create_user(username=f"user{i}@example.com", password="pw")
+            Profile.objects.create(user=user, role="customer")
+
+    def run_view(self, view):
+        # The signal is patched so the test runner does not collect these reports
+        middleware = NPlusOneMiddleware(view)
+        with mock.patch.object(nplusone.nplusone_detected, "send") as send:
+            middleware(RequestFactory().get("/profiles/"))
+        return send.call_args.kwargs["reports"] if send.called else []
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            nplusone.fingerprint("SELECT *  FROM t WHERE id = 12 AND name = 'it''s'"),
+            "SELECT * FROM t WHERE id = ? AND name = ?",
+        )
+        self.assertEqual(
+            nplusone.fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s)"),
+            nplusone.fingerprint("SELECT * FROM t WHERE id IN (%s)"),
+        )
+
+    def test_repeated_queries_are_reported(self):
+        with self.assertLogs("core.nplusone", "WARNING") as logs:
+            (report,) = self.run_view(profile_names)
+
+        self.assertEqual(report.count, 4)
+        self.assertIn('FROM "auth_user"', report.shape)
+        # Points at the view's loop, not at Django or the detector
+        line = inspect.getsourcelines(profile_names)[1] + 2
+        self.assertTrue(report.python.startswith(f"core/tests.py:{line} in "), report.python)
+        self.assertIn("GET /profiles/", logs.output[0])
+
+    def test_queries_below_threshold_are_not_reported(self):
+        with override_settings(NPLUSONE_THRESHOLD=5):
+            self.assertEqual(self.run_view(profile_names), [])
+
+        def joined(request):
+            names = [p.user.username for p in Profile.objects.select_related("user")]
+            return HttpResponse(",".join(names))
+        self.assertEqual(self.run_view(joined), [])
+
+    @override_settings(NPLUSONE_STRICT=True)
+    def test_strict_mode_raises(self):
+        with self.assertRaisesMessage(nplusone.NPlusOneError, "4 queries of the same shape"):
+            self.run_view(profile_names)
+
+
+# ==============================
+# SQLITE PROFILE
+# ==============================
+
+SETTINGS_PATH = os.path.join(settings.BASE_DIR, "homeservice", "settings.py")
+
+
+class SQLiteProfileTests(SimpleTestCase):
+
+    def database(self, path, profile):
+        """A new connection to path, configured as settings.py would with the profile on or off."""
+        environ = {"SQLITE_PRODUCTION_PROFILE": "1" if profile else ""}
+        with mock.patch.dict(os.environ, environ):
+            database = runpy.run_path(SETTINGS_PATH)["DATABASES"]["default"]
+        # Under its own alias: the test case guards the "default" connection
+        connections = ConnectionHandler({"default": {}, "profile": dict(database, NAME=path)})
+        self.addCleanup(connections.close_all)
+        return connections["profile"]
+
+    def pragmas(self, database):
+        with database.cursor() as cursor:
+            return {
+                name: cursor.execute(f"PRAGMA {name}").fetchone()[0]
+                for name in ("journal_mode", "synchronous", "busy_timeout")
+            }
+
+    def test_production_profile(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            database = self.database(os.path.join(tmp, "db.sqlite3"), profile=True)
+            # synchronous: 1 is NORMAL
+            self.assertEqual(
+                self.pragmas(database), {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 5000}
+            )
+            self.assertEqual(database.settings_dict["CONN_MAX_AGE"], 600)
+
+    def test_stock_pragmas_by_default(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            database = self.database(os.path.join(tmp, "db.sqlite3"), profile=False)
+            # synchronous: 2 is FULL
+            self.assertEqual(self.pragmas(database)["journal_mode"], "delete")
+            self.assertEqual(self.pragmas(database)["synchronous"], 2)
+            self.assertEqual(database.settings_dict["CONN_MAX_AGE"], 0)
+
+    def test_checkpoint_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            database = self.database(os.path.join(tmp, "db.sqlite3"), profile=True)
+            with database.cursor() as cursor:
+                cursor.execute("CREATE TABLE t (x INTEGER)")
+                cursor.execute("INSERT INTO t VALUES (1)")
+
+            wal = os.path.join(tmp, "db.sqlite3-wal")
+            with mock.patch("core.management.commands.sqlite_checkpoint.connection", database):
+                out = StringIO()
+                call_command("sqlite_checkpoint", mode="PASSIVE", stdout=out)
+                frames = re.fullmatch(r"Checkpointed (\d+) of (\d+) WAL frame\(s\)\.\n", out.getvalue())
+                self.assertIsNotNone(frames, out.getvalue())
+                self.assertGreater(int(frames[2]), 0)
+                self.assertEqual(frames[1], frames[2])
+                self.assertGreater(os.path.getsize(wal), 0)
+
+                # TRUNCATE, the default, also empties the WAL file
+                call_command("sqlite_checkpoint", stdout=StringIO())
+                self.assertEqual(os.path.getsize(wal), 0)
+
+    def test_checkpoint_needs_sqlite(self):
+        with mock.patch("core.management.commands.sqlite_checkpoint.connection") as database:
+            database.vendor = "postgresql"
+            with self.assertRaises(CommandError):
+                call_command("sqlite_checkpoint")
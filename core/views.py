@@ -1,6 +1,25 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
 
+from . import metrics
+
 def home(request):
    
     return render(request, "core/home.html")
 
+
+# ==============================
+# METRICS
+# ==============================
+
+def metrics_view(request):
+    # Scrapers call this directly, so it needs a token, not a login
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if not token:
+        raise Http404("Metrics are not enabled.")
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.exposition(), content_type="text/plain; version=0.0.4; charset=utf-8")
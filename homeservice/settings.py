@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack (core/metrics.py)
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,13 +53,36 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.NPlusOneMiddleware',
 ]
 
 ROOT_URLCONF = 'homeservice.urls'
 
+# Bearer token a scraper must send to read the Prometheus histograms at
+# /metrics. The endpoint answers 404 until one is set; behind a reverse
+# proxy every request comes from 127.0.0.1, so addresses cannot be trusted.
+METRICS_TOKEN = None
+
+# N+1 detection (core/nplusone.py): report a query shape repeated this many
+# times in one request. Strict mode raises instead of logging; run the
+# tests with `manage.py test --nplusone-strict` to fail on any N+1.
+NPLUSONE_ENABLED = DEBUG
+NPLUSONE_THRESHOLD = 3
+NPLUSONE_STRICT = False
+TEST_RUNNER = 'core.testrunner.NPlusOneTestRunner'
+
+# Slow-query log (core/slowlog.py): queries slower than this many ms are
+# written with their parameters, view and query plan to a rotating JSONL
+# file (None = off). Summarize it with `slow_queries`.
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_LOG = BASE_DIR / 'slow-queries.jsonl'
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates plus render timing for core.metrics
+        'BACKEND': 'core.templating.DjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -71,17 +97,92 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'homeservice.wsgi.application'
 
+# Live chat streams (booking.views.message_stream) are async and need an
+# ASGI server, e.g. `uvicorn homeservice.asgi:application`. Under WSGI the
+# chat page polls booking.views.messages_since instead.
+ASGI_APPLICATION = 'homeservice.asgi.application'
+
+# Pub/sub broker for live chat. InProcessBackend serves one worker; with
+# several workers on one machine use 'booking.realtime.SQLiteBackend',
+# which shares channels through a local SQLite event log.
+MESSAGE_BROKER = {
+    'BACKEND': 'booking.realtime.InProcessBackend',
+    'OPTIONS': {},
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite production profile, opt-in with SQLITE_PRODUCTION_PROFILE=1 in
+# the environment: WAL lets readers run alongside the single writer, the
+# pragmas are applied to every new connection and connections are reused
+# across requests. Checkpoint the WAL with `sqlite_checkpoint`; compare
+# profiles with `benchmark_sqlite`.
+SQLITE_PRODUCTION_PROFILE = os.environ.get('SQLITE_PRODUCTION_PROFILE') == '1'
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,       # KiB, i.e. a 20MB page cache
+    'mmap_size': 134217728,     # 128MB
+    'busy_timeout': 5000,       # ms
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 5,
+        },
     }
 }
 
+if SQLITE_PRODUCTION_PROFILE:
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    })
+    DATABASES['default']['OPTIONS'].update({
+        'init_command': ';'.join(
+            f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()
+        ),
+        # Take the write lock at BEGIN so writers wait on busy_timeout
+        # instead of failing when a read transaction upgrades
+        'transaction_mode': 'IMMEDIATE',
+    })
+
+
+# Cache
+# Catalog result caching (booking.caching) keeps its version counters in
+# this cache, so multi-process deployments must use a shared backend
+# such as Redis or Memcached here.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'homeservice',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Provider card fragments ({% cache %} in the catalog templates), kept
+    # apart so they cannot evict the version counters in 'default'
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'homeservice-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+# Seconds a cached search/category result is kept
+CATALOG_CACHE_TIMEOUT = 300
+# Seconds a shared proxy may serve an anonymous catalog page before
+# revalidating it with its ETag (booking/conditional.py)
+CATALOG_PROXY_MAX_AGE = 60
+# Release identifier (e.g. the deployed commit) mixed into those ETags with
+# the collectstatic manifest hash, so a template-only deploy changes them too
+BUILD_ID = ''
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -119,6 +220,35 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# `collectstatic` writes content-hashed files plus .gz/.br copies here
+# (core/staticfiles.py). Serve STATIC_ROOT from the front-end server with
+# far-future expiry and precompressed files enabled, e.g. nginx
+# `expires max; gzip_static on; brotli_static on;`.
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'core.staticfiles.CompressedManifestStorage',
+    },
+}
+
+STATICFILES_FINDERS = [
+    'django.contrib.staticfiles.finders.FileSystemFinder',
+    'django.contrib.staticfiles.finders.AppDirectoriesFinder',
+    'core.staticfiles.ResponsiveImageFinder',
+]
+
+# WebP/AVIF copies of these images at the listed widths (never enlarged),
+# named e.g. core/images/background-480w.webp. Only list widths the
+# stylesheets reference in image-set()/srcset (core/static/core/css/home.css).
+RESPONSIVE_IMAGES = {
+    'core/images/background.jpg': [480, 1600],
+}
+RESPONSIVE_IMAGE_DIR = BASE_DIR / 'build' / 'images'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -126,10 +256,28 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Processes rendering certificate previews after upload (0 = render inline)
+CERTIFICATE_PREVIEW_WORKERS = 2
 AUTHENTICATION_BACKENDS = [
     'account.backends.EmailBackend',
     'django.contrib.auth.backends.ModelBackend',
 ]
+# Sessions: an in-process LRU with write-behind to django_session
+# (account/sessions.py). Purge expired rows with `purge_sessions`. With
+# several workers, a logout or key change on one of them can stay
+# invisible to the others for up to SESSION_CACHE_TTL seconds.
+SESSION_ENGINE = 'account.sessions'
+SESSION_CACHE_SIZE = 10000
+SESSION_CACHE_TTL = 5
+# Seconds between batched session writes (0 = write through)
+SESSION_WRITE_BEHIND_INTERVAL = 1.0
+SESSION_WRITE_BATCH_SIZE = 500
+
+# Seconds the session user and profile are cached between requests (0 = off).
+# Also how long another worker may still accept a deactivated user or an
+# old password while the default cache is per process (account/backends.py).
+AUTH_USER_CACHE_TIMEOUT = 5
 LOGIN_URL = '/account/login/'
 LOGIN_REDIRECT_URL = '/account/dashboard/customer/'
 LOGOUT_REDIRECT_URL = '/account/login/'